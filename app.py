@@ -1,7 +1,9 @@
 import streamlit as st
 import time
-import os
+import uuid
+import logging
 from src.pipeline import RAGPipeline
+from src import telemetry
 import config
 
 # Page Config
@@ -15,9 +17,10 @@ st.set_page_config(
 # Initialize Pipeline (Cached to avoid reloading model)
 # Initialize Pipeline (Cached to avoid reloading model)
 # Renamed to force cache invalidation after code updates
+# Models load on background threads (BACKGROUND_INIT); the page renders right away
 @st.cache_resource
 def get_pipeline_v3():
-    return RAGPipeline()
+    return RAGPipeline(background=config.BACKGROUND_INIT)
 
 try:
     rag_pipeline = get_pipeline_v3()
@@ -35,15 +38,23 @@ with st.sidebar:
     
     st.markdown("---")
     st.markdown("### System Status")
-    if rag_pipeline.retriever.vector_store:
-        st.success("Vector DB Loaded")
-    else:
-        st.error("Vector DB Not Found")
-        
-    if rag_pipeline.generator.llm:
-        st.success("LLM Loaded")
-    else:
-        st.warning("LLM Not Loaded (Check models/)")
+    status = rag_pipeline.status
+    labels = {"retriever": "Vector DB", "generator": "LLM"}
+    for name, label in labels.items():
+        state = status[name]["state"]
+        if state == "ready":
+            st.success(f"{label} Loaded ({status[name]['seconds']:.1f}s)")
+        elif state == "failed":
+            st.error(f"{label} Not Available: {status[name]['error']}")
+        else:
+            st.info(f"{label} Loading...")
+    if status["generator"]["state"] in ("pending", "loading"):
+        st.caption("Until the LLM is ready, answers show the most relevant textbook passages.")
+        st.button("Refresh status")
+    if rag_pipeline.scheduler:
+        queue_stats = rag_pipeline.scheduler.stats()
+        st.caption(f"Generation queue: {queue_stats['queue_depth']}/{queue_stats['queue_capacity']} waiting, "
+                   f"{queue_stats['active']}/{queue_stats['workers']} busy | p95 wait {queue_stats['wait_p95']:.1f}s")
 
     st.markdown("---")
     st.info("Note: Ensure NCERT PDFs are in `data/raw` and `ingestion.py` has been run.")
@@ -55,13 +66,18 @@ st.markdown("Ask questions from your NCERT textbooks. Answers are strictly groun
 # Chat History
 if "messages" not in st.session_state:
     st.session_state.messages = []
+if "session_id" not in st.session_state:
+    # Lets the pipeline treat "explain it more simply" as a follow-up to the last answer
+    st.session_state.session_id = uuid.uuid4().hex
 
 # Display Chat
 for message in st.session_state.messages:
     with st.chat_message(message["role"]):
         st.markdown(message["content"])
         if "latency" in message:
-            st.caption(f"Latency: {message['latency']:.2f}s | Language: {message.get('language', 'Unknown')}")
+            st.caption(f"Latency: {message['latency']:.2f}s | First token: {message.get('ttft', message['latency']):.2f}s | Language: {message.get('language', 'Unknown')}"
+                       + (f" | Cached ({message['cache_hit']} match)" if message.get("cache_hit") else "")
+                       + (f" | Follow-up to \"{message['follow_up']['topic']}\"" if message.get("follow_up") else ""))
         if "sources" in message:
             with st.expander("View Sources"):
                 for i, doc in enumerate(message["sources"]):
@@ -87,23 +103,37 @@ if prompt := st.chat_input("What is your doubt?"):
         if selected_subject != "All":
             filters["subject"] = selected_subject
             
-        # Run Pipeline
+        # Run Pipeline (streamed: the answer is rendered as tokens arrive)
         try:
-            result = rag_pipeline.process_query(prompt, filters=filters)
-            answer = result["answer"]
-            sources = result["source_documents"]
-            latency = result["latency"]
-            lang = result["language"]
-            
-            message_placeholder.markdown(answer)
-            
-            # Feedback
-            # Use small columns for buttons to keep them close
-            col1, col2, col3 = st.columns([1, 1, 10])
-            with col1:
-                st.button("👍", key=f"up_{len(st.session_state.messages)}")
-            with col2:
-                st.button("👎", key=f"down_{len(st.session_state.messages)}")
+            # Root span of the request trace; the pipeline's spans nest under it
+            with telemetry.span("app.request"):
+                result = None
+                partial = ""
+                for event in rag_pipeline.process_query_stream(prompt, filters=filters,
+                                                                  session_id=st.session_state.session_id):
+                    if event["type"] == "token":
+                        partial += event["text"]
+                        message_placeholder.markdown(partial + "▌")
+                    else:
+                        result = event["result"]
+                answer = result["answer"]
+                sources = result["source_documents"]
+                latency = result["latency"]
+                ttft = result["ttft"]
+                cache_hit = (result.get("cache") or {}).get("hit")
+                follow_up = result.get("follow_up")
+                lang = result["language"]
+
+                with telemetry.span("app.render"):
+                    message_placeholder.markdown(answer)
+
+                    # Feedback
+                    # Use small columns for buttons to keep them close
+                    col1, col2, col3 = st.columns([1, 1, 10])
+                    with col1:
+                        st.button("👍", key=f"up_{len(st.session_state.messages)}")
+                    with col2:
+                        st.button("👎", key=f"down_{len(st.session_state.messages)}")
 
             # Update history
             st.session_state.messages.append({
@@ -111,8 +141,18 @@ if prompt := st.chat_input("What is your doubt?"):
                 "content": answer,
                 "sources": sources,
                 "latency": latency,
+                "ttft": ttft,
+                "cache_hit": cache_hit,
+                "follow_up": follow_up,
                 "language": lang
             })
             
         except Exception as e:
             message_placeholder.error(f"An error occurred: {e}")
+
+# Cold start: time from pipeline creation to the first fully rendered page
+if rag_pipeline.first_interactive is None:
+    rag_pipeline.first_interactive = time.time() - rag_pipeline.init_started
+    logging.info(f"First interactive page after {rag_pipeline.first_interactive:.2f}s")
+with st.sidebar:
+    st.caption(f"Page ready {rag_pipeline.first_interactive:.1f}s after start")
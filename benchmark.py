@@ -0,0 +1,296 @@
+import os
+import sys
+import time
+import logging
+import argparse
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional
+import numpy as np
+import pandas as pd
+import config
+
+# Per-query stage timings; the first three keep the column names of older
+# benchmark_50_results.csv files so those can serve as baselines.
+STAGES = {
+    "retrieval": "Retrieval Time (s)",
+    "generation": "Generation Time (s)",
+    "total": "Total Latency (s)",
+    "queue_wait": "Queue Wait (s)",
+    "ttft": "TTFT (s)",
+    "prefill": "Prefill (s)",
+    "decode": "Decode (s)",
+}
+# Stages that only exist for answers generated by the LLM
+LLM_STAGES = {"queue_wait", "prefill", "decode"}
+
+
+def load_workload(path: str) -> List[str]:
+    """Questions from a .txt file (one per line, '#' comments) or a CSV with a Query column."""
+    if path.endswith(".csv"):
+        return pd.read_csv(path)["Query"].dropna().tolist()
+    with open(path, "r", encoding="utf-8") as f:
+        return [line.strip() for line in f if line.strip() and not line.lstrip().startswith("#")]
+
+
+def peak_rss_mb() -> Optional[float]:
+    """Peak resident set size of this process in MB (None where it cannot be read)."""
+    try:
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # KB on Linux, bytes on macOS
+        return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+    except ImportError:
+        pass
+    try:
+        import ctypes
+        from ctypes import wintypes
+
+        class ProcessMemoryCounters(ctypes.Structure):
+            _fields_ = [("cb", wintypes.DWORD), ("PageFaultCount", wintypes.DWORD)] + [
+                (name, ctypes.c_size_t) for name in (
+                    "PeakWorkingSetSize", "WorkingSetSize", "QuotaPeakPagedPoolUsage", "QuotaPagedPoolUsage",
+                    "QuotaPeakNonPagedPoolUsage", "QuotaNonPagedPoolUsage", "PagefileUsage", "PeakPagefileUsage")
+            ]
+
+        counters = ProcessMemoryCounters()
+        counters.cb = ctypes.sizeof(counters)
+        process = ctypes.windll.kernel32.GetCurrentProcess()
+        if ctypes.windll.psapi.GetProcessMemoryInfo(process, ctypes.byref(counters), counters.cb):
+            return counters.PeakWorkingSetSize / (1024 * 1024)
+    except (AttributeError, OSError):
+        pass
+    return None
+
+
+def build_fake_corpus(directory: str, questions: List[str], chunks_per_question: int = 4):
+    """
+    Writes a small synthetic vector DB (index, chunk store, facet and BM25 indexes)
+    with a few chunks per workload question, embedded with the fake embedder, and
+    points config at it.
+    """
+    from langchain_core.documents import Document
+    from src.chunk_store import ChunkStore, write_index
+    from src.fake_backends import FakeEmbeddings
+    from src.index_factory import build_index
+    from src.metadata import FacetIndex
+    from src.sparse_index import SparseIndex
+
+    rng = np.random.default_rng(0)
+    vocabulary = sorted({word.strip("?.,'").lower() for q in questions for word in q.split()} - {""})
+    rows = []
+    for i, question in enumerate(questions):
+        topic = question.rstrip("?.")
+        for j in range(chunks_per_question):
+            filler = " ".join(rng.choice(vocabulary, size=60))
+            text = f"{topic}. This part of the chapter covers {topic.lower()} in detail. {filler.capitalize()}."
+            rows.append((f"fake-{i}-{j}", Document(page_content=text, metadata={
+                "source": f"synthetic_{i // 10}.pdf", "page": i % 10 * chunks_per_question + j + 1,
+                "language": "en"
+            })))
+
+    vectors = np.asarray(FakeEmbeddings().embed_documents([doc.page_content for _, doc in rows]), dtype=np.float32)
+    index = build_index("flat", vectors.shape[1], len(rows))
+    index.add(vectors)
+
+    config.VECTOR_DB_DIR = directory
+    config.FACET_INDEX_PATH = os.path.join(directory, "facets.npz")
+    config.SPARSE_INDEX_PATH = os.path.join(directory, "sparse.npz")
+    write_index(directory, index)
+    ChunkStore.write(directory, rows)
+    FacetIndex.build([doc.metadata for _, doc in rows]).save(config.FACET_INDEX_PATH)
+    SparseIndex.build([doc.page_content for _, doc in rows]).save(config.SPARSE_INDEX_PATH)
+    print(f"Synthetic corpus: {len(rows)} chunks in {directory}")
+
+
+def run_query(pipeline, query: str) -> Dict:
+    """One query through the full pipeline, flattened into a result row."""
+    from src.pipeline import answer_path
+    start = time.time()
+    try:
+        result = pipeline.process_query(query)
+    except Exception as e:
+        return {"Query": query, "Path": "error", "Error": str(e), STAGES["total"]: time.time() - start}
+
+    stats = result.get("generation") or {}
+    retrieval = result.get("retrieval_time", 0.0)
+    answer = result["answer"]
+    return {
+        "Query": query,
+        "Path": answer_path(result),
+        STAGES["retrieval"]: retrieval,
+        STAGES["generation"]: result["latency"] - retrieval,
+        STAGES["total"]: result["latency"],
+        STAGES["queue_wait"]: result.get("queue_wait", 0.0),
+        STAGES["ttft"]: result["ttft"],
+        STAGES["prefill"]: stats.get("prefill_time", 0.0),
+        STAGES["decode"]: stats.get("decode_time", 0.0),
+        "Prompt Tokens": stats.get("prompt_tokens", 0),
+        "Prefix Tokens Reused": stats.get("prefix_tokens_reused", 0),
+        "Completion Tokens": stats.get("completion_tokens", 0),
+        "Tokens/Sec": stats.get("tokens_per_sec", 0.0),
+        "Draft Acceptance": stats.get("draft_acceptance_rate"),
+        "Tier": stats.get("tier", "large") if stats else None,
+        "Escalated": stats.get("escalated"),
+        "Context Tokens Saved": stats.get("context", {}).get("tokens_saved", 0),
+        "Docs Retrieved": len(result["source_documents"]),
+        "Answer Preview": answer[:50] + "..." if len(answer) > 50 else answer
+    }
+
+
+def run_level(pipeline, questions: List[str], concurrency: int, repeat: int) -> pd.DataFrame:
+    """Runs the workload `repeat` times with `concurrency` queries in flight."""
+    workload = questions * repeat
+    print(f"\nConcurrency {concurrency}: {len(workload)} queries...")
+    start = time.time()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        rows = list(pool.map(lambda query: run_query(pipeline, query), workload))
+    elapsed = time.time() - start
+
+    df = pd.DataFrame(rows)
+    df["Concurrency"] = concurrency
+    ok = df[df["Path"] != "error"]
+    rss = peak_rss_mb()
+    print(f"  Completed {len(ok)}/{len(df)} in {elapsed:.1f}s ({len(ok) / elapsed:.2f} answers/s) | "
+          f"paths: {ok['Path'].value_counts().to_dict()} | peak RSS: {f'{rss:.0f} MB' if rss else 'n/a'}")
+    if len(ok) < len(df):
+        print(f"  Errors: {df.loc[df['Path'] == 'error', 'Error'].value_counts().to_dict()}")
+    if "Completion Tokens" in ok and ok["Completion Tokens"].sum():
+        print(f"  Tokens: {ok['Prompt Tokens'].sum()} prompt / {ok['Completion Tokens'].sum()} completion "
+              f"({ok['Completion Tokens'].sum() / elapsed:.1f} completion tokens/s overall)")
+    print(stage_table(ok).to_string())
+    df.attrs["elapsed"], df.attrs["peak_rss_mb"] = elapsed, rss
+    return df
+
+
+def stage_table(df: pd.DataFrame) -> pd.DataFrame:
+    """p50/p95/p99 and mean of every stage (seconds); LLM stages over generated answers only."""
+    table = {}
+    for stage, column in STAGES.items():
+        rows = df[df["Path"] == "generated"] if stage in LLM_STAGES else df
+        if column in rows and rows[column].notna().any():
+            values = rows[column].dropna()
+            table[stage] = {
+                "p50": values.quantile(0.50), "p95": values.quantile(0.95),
+                "p99": values.quantile(0.99), "mean": values.mean()
+            }
+    return pd.DataFrame(table).T.round(3)
+
+
+def compare_baseline(df: pd.DataFrame, baseline_path: str, threshold: float, min_delta: float) -> List[str]:
+    """
+    Compares p50 and p95 of every stage present in both runs against the baseline
+    CSV. A stage regresses when it is more than `threshold` (relative) and
+    `min_delta` seconds slower. Returns the regressions.
+    """
+    baseline = pd.read_csv(baseline_path)
+    if "Concurrency" in baseline:
+        baseline = baseline[baseline["Concurrency"] == baseline["Concurrency"].min()]
+    current = df[(df["Concurrency"] == df["Concurrency"].min()) & (df["Path"] != "error")]
+
+    print(f"\nBaseline comparison against {baseline_path} (threshold +{threshold:.0%}):")
+    regressions = []
+    for stage, column in STAGES.items():
+        if column not in baseline or column not in current or baseline[column].isna().all():
+            continue
+        for q in (0.50, 0.95):
+            before, after = baseline[column].quantile(q), current[column].quantile(q)
+            change = (after - before) / before if before > 0 else 0.0
+            regressed = after > before * (1 + threshold) and after - before > min_delta
+            print(f"  {stage:<11} p{int(q * 100):<3} {before:8.3f}s -> {after:8.3f}s ({change:+.1%})"
+                  + ("  REGRESSION" if regressed else ""))
+            if regressed:
+                regressions.append(f"{stage} p{int(q * 100)} {before:.3f}s -> {after:.3f}s")
+    return regressions
+
+
+def run_benchmark(questions: List[str], concurrency_levels: List[int], repeat: int, warmup: int,
+                  output: str, baseline: Optional[str], threshold: float, min_delta: float) -> int:
+    from src.pipeline import RAGPipeline
+    # Configure logging to show only errors to keep output clean
+    logging.getLogger().setLevel(logging.ERROR)
+
+    print(f"Initializing pipeline (embeddings: {config.EMBEDDING_BACKEND}, LLM: {config.LLM_BACKEND})...")
+    t0 = time.time()
+    pipeline = RAGPipeline()
+    if not pipeline.readiness()["ready"]:
+        print(f"Pipeline not ready: {pipeline.readiness()['components']}")
+        return 1
+    print(f"Ready in {time.time() - t0:.1f}s")
+
+    # Page in the weights and build the prompt prefix state outside the measurements
+    for query in questions[:warmup]:
+        pipeline.process_query(query)
+
+    levels = [run_level(pipeline, questions, c, repeat) for c in concurrency_levels]
+    df = pd.concat(levels, ignore_index=True)
+    df.round(4).to_csv(output, index=False)
+    print(f"\nPer-query results saved to: {output}")
+
+    print("\nThroughput by concurrency:")
+    for c, level in zip(concurrency_levels, levels):
+        ok = level[level["Path"] != "error"]
+        print(f"  {c:>3}: {len(ok) / level.attrs['elapsed']:.2f} answers/s | "
+              f"total p50 {ok[STAGES['total']].quantile(0.5):.2f}s, p95 {ok[STAGES['total']].quantile(0.95):.2f}s | "
+              f"ttft p95 {ok[STAGES['ttft']].quantile(0.95):.2f}s")
+    if pipeline.scheduler:
+        print(f"Scheduler: {pipeline.scheduler.stats()}")
+
+    # Latency and quality split per model tier (only differs with MODEL_CASCADE)
+    generated = df[df["Path"] == "generated"]
+    if "Tier" in generated and (generated["Tier"].nunique() > 1 or generated["Escalated"].notna().any()):
+        print("\nPer-tier split:")
+        print(generated.groupby("Tier").agg(
+            Queries=("Query", "count"),
+            Generation_p50=(STAGES["generation"], "median"),
+            Generation_p95=(STAGES["generation"], lambda s: s.quantile(0.95)),
+            Tokens_per_Sec=("Tokens/Sec", "mean"),
+            Escalations=("Escalated", lambda e: e.notna().sum())
+        ).round(2).to_string())
+
+    if baseline:
+        regressions = compare_baseline(df, baseline, threshold, min_delta)
+        if regressions:
+            print(f"\nFAILED: {len(regressions)} stage(s) regressed past {threshold:.0%}: " + "; ".join(regressions))
+            return 1
+        print("\nNo stage regressed past the threshold.")
+    return 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="End-to-end latency benchmark of the RAG pipeline.")
+    parser.add_argument("--workload", default=os.path.join("workloads", "questions_50.txt"),
+                        help="Question file (.txt, one per line) or CSV with a Query column")
+    parser.add_argument("--concurrency", default="1", help="Comma-separated concurrency levels to sweep, e.g. 1,4,8")
+    parser.add_argument("--repeat", type=int, default=1, help="Passes over the workload per concurrency level")
+    parser.add_argument("--warmup", type=int, default=1, help="Unmeasured queries before the first level")
+    parser.add_argument("--limit", type=int, help="Use only the first N questions")
+    parser.add_argument("--output", default="benchmark_results.csv")
+    parser.add_argument("--baseline", help="Earlier results CSV (e.g. benchmark_50_results.csv) to compare against")
+    parser.add_argument("--threshold", type=float, default=0.2, help="Relative slowdown of a stage that fails the run")
+    parser.add_argument("--min-delta", type=float, default=0.05, help="Ignore slowdowns smaller than this many seconds")
+    parser.add_argument("--fake", action="store_true",
+                        help="Fake embedder and LLM on a synthetic corpus (no model files needed)")
+    parser.add_argument("--answer-cache", action="store_true",
+                        help="Keep the answer cache on (off by default so repeated questions are generated)")
+    args = parser.parse_args()
+
+    questions = load_workload(args.workload)[:args.limit]
+    config.ANSWER_CACHE_ENABLED = args.answer_cache
+    tmp_dir = None
+    if args.fake:
+        config.EMBEDDING_BACKEND = "fake"
+        config.LLM_BACKEND = "fake"
+        tmp_dir = tempfile.TemporaryDirectory(prefix="benchmark-")
+        config.PROMPT_CACHE_DIR = os.path.join(tmp_dir.name, "prompt_cache")
+        config.ANSWER_CACHE_DIR = os.path.join(tmp_dir.name, "answer_cache")
+        build_fake_corpus(os.path.join(tmp_dir.name, "vectorized"), questions)
+
+    try:
+        sys.exit(run_benchmark(
+            questions, [int(c) for c in args.concurrency.split(",")], args.repeat, args.warmup,
+            args.output, args.baseline, args.threshold, args.min_delta
+        ))
+    finally:
+        if tmp_dir:
+            tmp_dir.cleanup()
@@ -0,0 +1,91 @@
+import os
+import time
+import argparse
+import logging
+import numpy as np
+import pandas as pd
+import faiss
+import config
+from src.chunk_store import ChunkStore
+from src.embedding_cache import get_embeddings
+from src.index_factory import INDEX_TYPES, build_index, index_kind, sample_rows
+from benchmark import load_workload
+
+# Configure logging
+logging.getLogger().setLevel(logging.ERROR)
+
+
+def load_corpus_vectors(embeddings) -> np.ndarray:
+    """Embeddings of every chunk in the ingested Vector DB (served from the embedding cache)."""
+    texts = [doc.page_content for _, doc in ChunkStore(config.VECTOR_DB_DIR)]
+    return np.asarray(embeddings.embed_documents(texts), dtype=np.float32)
+
+
+def run_index_benchmark(index_types, queries, top_k: int):
+    """
+    Builds each index type over the corpus and reports recall@k against exact
+    (flat) search, p50/p99 single-query search latency, build time and size.
+    """
+    print("Loading corpus vectors...")
+    embeddings = get_embeddings(read_only=True)
+    vectors = load_corpus_vectors(embeddings)
+    query_vectors = np.asarray(embeddings.embed_documents(queries), dtype=np.float32)
+    n, dim = vectors.shape
+    print(f"Corpus: {n} vectors x {dim} dims, {len(queries)} queries, k={top_k}\n")
+
+    exact = faiss.IndexFlatL2(dim)
+    exact.add(vectors)
+    _, ground_truth = exact.search(query_vectors, top_k)
+    sample = vectors[sample_rows(n)]
+
+    results = []
+    for index_type in index_types:
+        t0 = time.time()
+        index = build_index(index_type, dim, n, sample)
+        index.add(vectors)
+        build_time = time.time() - t0
+
+        latencies = []
+        found = []
+        for i in range(len(query_vectors)):
+            t1 = time.perf_counter()
+            _, rows = index.search(query_vectors[i:i + 1], top_k)
+            latencies.append((time.perf_counter() - t1) * 1000)
+            found.append(rows[0])
+
+        recall = np.mean([
+            len(set(f.tolist()) & set(gt.tolist())) / top_k for f, gt in zip(found, ground_truth)
+        ])
+        results.append({
+            "Index": index_type,
+            "Built As": index_kind(index),
+            f"Recall@{top_k}": round(float(recall), 4),
+            "p50 (ms)": round(float(np.percentile(latencies, 50)), 3),
+            "p99 (ms)": round(float(np.percentile(latencies, 99)), 3),
+            "Build (s)": round(build_time, 2),
+            "Size (MB)": round(faiss.serialize_index(index).nbytes / 1e6, 2)
+        })
+        print(f"  {index_type:<8} recall@{top_k}={recall:.3f}  p50={results[-1]['p50 (ms)']}ms  p99={results[-1]['p99 (ms)']}ms")
+
+    df = pd.DataFrame(results)
+    print("\n" + "="*80)
+    print(f"{'INDEX BENCHMARK RESULTS':^80}")
+    print("="*80)
+    print(df.to_string(index=False))
+    print("="*80)
+    return df
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Recall vs latency vs size for FAISS index types on the ingested corpus.")
+    parser.add_argument("--types", nargs="+", default=INDEX_TYPES, choices=INDEX_TYPES)
+    parser.add_argument("--k", type=int, default=config.TOP_K_RETRIEVAL)
+    parser.add_argument("--queries", default=os.path.join("workloads", "questions_50.txt"),
+                        help="Workload file with one query per line (default: the 50 benchmark questions).")
+    parser.add_argument("--output", help="Optional CSV path for the report.")
+    args = parser.parse_args()
+
+    df = run_index_benchmark(args.types, load_workload(args.queries), args.k)
+    if args.output:
+        df.to_csv(args.output, index=False)
+        print(f"Results saved to: {args.output}")
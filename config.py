@@ -6,24 +6,149 @@ DATA_DIR = os.path.join(BASE_DIR, "data")
 RAW_DATA_DIR = os.path.join(DATA_DIR, "raw")
 VECTOR_DB_DIR = os.path.join(DATA_DIR, "vectorized")
 MODELS_DIR = os.path.join(BASE_DIR, "models")
+SHARD_DIR = os.path.join(VECTOR_DB_DIR, "shards")  # Temporary index shards written during ingestion
+MANIFEST_PATH = os.path.join(VECTOR_DB_DIR, "manifest.json")  # File hashes and chunk IDs in the index
+FACET_INDEX_PATH = os.path.join(VECTOR_DB_DIR, "facets.npz")  # Row IDs per grade/subject/chapter/language
+SPARSE_INDEX_PATH = os.path.join(VECTOR_DB_DIR, "sparse.npz")  # BM25 postings with precomputed weights
+OCR_CACHE_DIR = os.path.join(DATA_DIR, "ocr_cache")  # Tesseract output keyed by page-image hash
+EMBEDDING_CACHE_DIR = os.path.join(DATA_DIR, "embedding_cache")  # Vectors keyed by (model, text hash)
+PROMPT_CACHE_DIR = os.path.join(DATA_DIR, "prompt_cache")  # llama.cpp state after the fixed prompt prefix
+ANSWER_CACHE_DIR = os.path.join(DATA_DIR, "answer_cache")  # Generated answers keyed by question and filters
+TELEMETRY_TRACE_LOG = os.path.join(DATA_DIR, "traces.jsonl")  # One JSON line of timing spans per request (None = metrics only)
+TELEMETRY_PROFILE_DIR = os.path.join(DATA_DIR, "profiles")  # Collapsed-stack profiles of the slowest requests
 
 # Model Configuration
 # User must place the GGUF model in the models directory
 # Example: "mistral-7b-instruct-v0.2.Q4_K_M.gguf"
 MODEL_FILENAME = "mistral-7b-instruct-v0.2.Q4_K_M.gguf" 
 MODEL_PATH = os.path.join(MODELS_DIR, MODEL_FILENAME)
+LLM_USE_MMAP = True  # Map the GGUF instead of reading it: fast start, pages shared between workers/processes
+LLM_USE_MLOCK = False  # Pin the mapped weights in RAM so the OS cannot page them out (needs enough memory/ulimit)
+BACKGROUND_INIT = True  # App/server load the retriever and LLM on background threads and start serving at once
+RETRIEVAL_ONLY_PASSAGES = 3  # Passages shown as the answer while the LLM is still loading
+
+# Model cascade: simple factual questions go to a small GGUF (e.g. a 1-3B instruct
+# model), everything else and any doubtful small-model answer to MODEL_PATH.
+MODEL_CASCADE = False
+SMALL_MODEL_FILENAME = "small-model.Q4_K_M.gguf"
+SMALL_MODEL_PATH = os.path.join(MODELS_DIR, SMALL_MODEL_FILENAME)
+ROUTER_SMALL_LANGUAGES = ["en"]  # Query languages the small model handles well
+ROUTER_MAX_QUESTION_WORDS = 12  # Longer questions go to the large model
+ROUTER_MIN_SCORE_GAP = 0.1  # Relative distance gap between the top chunk and the rest needed for the small tier
+ROUTER_MIN_ANSWER_WORDS = 8  # Shorter small-model answers are escalated
+
+# Speculative decoding: "off", "prompt_lookup" (drafts copied from the prompt/context
+# by n-gram match) or "draft_model" (a small GGUF with the same vocabulary).
+# The main model verifies every draft; with TEMPERATURE = 0 the output is unchanged.
+SPECULATIVE_DECODING = "off"
+DRAFT_MODEL_FILENAME = "draft-model.Q4_K_M.gguf"
+DRAFT_MODEL_PATH = os.path.join(MODELS_DIR, DRAFT_MODEL_FILENAME)
+DRAFT_NUM_PRED_TOKENS = 10  # Tokens drafted per verification round
+PROMPT_LOOKUP_MAX_NGRAM = 3  # Longest n-gram matched against the prompt
 
 EMBEDDING_MODEL_NAME = "sentence-transformers/paraphrase-multilingual-MiniLM-L12-v2"
+QUERY_CACHE_SIZE = 1024  # In-memory LRU of recent query embeddings
+# Query encoder used by the retriever: "huggingface" (the PyTorch model above) or
+# "onnx_int8" (int8 ONNX export of the same model, made and checked by
+# export_onnx_encoder.py). Chunks are always embedded by the PyTorch model.
+QUERY_ENCODER = "huggingface"
+ONNX_ENCODER_PATH = os.path.join(MODELS_DIR, "onnx", "paraphrase-multilingual-MiniLM-L12-v2-int8.onnx")
+ONNX_ENCODER_THREADS = 1  # onnxruntime threads per query (queries are short; concurrency comes from requests)
 
 # Ingestion Settings
 CHUNK_SIZE = 500
 CHUNK_OVERLAP = 50
+INGEST_WORKERS = 1  # Processes used for PDF extraction (1 = serial, overridden by --workers)
+INGEST_PAGES_PER_TASK = 100  # Large books are split into page ranges of this size
+OCR_MIN_PAGE_CHARS = 10  # Pages with less extractable text than this are OCR'd
+OCR_WINDOW_PAGES = 4  # Pages rendered at once per OCR task (bounds peak memory)
+INGEST_LOOKAHEAD_FILES = 2  # Files in flight per worker while streaming
+PIPELINE_QUEUE_SIZE = 8  # Items buffered between ingestion stages
+EMBED_BATCH_SIZE = 64  # Chunks embedded per forward pass
+SHARD_SIZE = 20000  # Vectors per on-disk index shard
+
+# Vector Index
+# "flat" (exact), "ivf_flat", "ivf_pq", "hnsw", "sq8" or "sq_fp16".
+# Use benchmark_index.py to compare recall, latency and size on your corpus.
+FAISS_INDEX_TYPE = "flat"
+INDEX_TRAIN_SAMPLE = 50000  # Vectors sampled to train IVF/PQ/SQ indexes
+INDEX_MIN_TRAIN = 2000  # Below this many vectors IVF types fall back to flat
+IVF_NLIST = 1024  # Upper bound on IVF lists (scaled down to ~4*sqrt(N))
+IVF_NPROBE = 16  # Lists visited per query
+PQ_M = 48  # PQ sub-quantizers (must divide the embedding dimension, 384)
+HNSW_M = 32
+HNSW_EF_CONSTRUCTION = 80
+HNSW_EF_SEARCH = 64
 
 # RAG Parameters
 TOP_K_RETRIEVAL = 5
+FILTER_EXACT_SCAN_MAX = 50000  # Filtered searches over at most this many rows are scanned exactly
+RETRIEVAL_MODE = "dense"  # "dense" (embeddings only) or "hybrid" (embeddings + BM25, rank-fused; opt-in)
+HYBRID_FETCH_K = 20  # Candidates taken from each of the dense and sparse lists before fusion
+RRF_K = 60  # Reciprocal rank fusion constant
+BM25_K1 = 1.5
+BM25_B = 0.75
 TEMPERATURE = 0.1  # Low temperature for grounded answers
 MAX_NEW_TOKENS = 512
 CONTEXT_WINDOW = 4096
+CONTEXT_DEDUP_THRESHOLD = 0.8  # Word-trigram Jaccard similarity at which a chunk counts as a duplicate
+CONTEXT_TOKEN_MARGIN = 32  # Tokens kept free besides MAX_NEW_TOKENS when packing the context
+PROMPT_PREFIX_CACHE = True  # Evaluate the fixed instruction block once and restore its KV state per request
+
+# Extractive Fast Path
+EXTRACTIVE_FAST_PATH = False  # Answer simple "Define X" / "What is X" questions from the top chunks without the LLM
+EXTRACTIVE_TOP_CHUNKS = 2  # Only the best-ranked chunks are searched for the defining sentence
+EXTRACTIVE_MIN_SCORE = 1.3  # Sentence confidence needed (definition cue + term leads the sentence, in the top chunks)
+EXTRACTIVE_MAX_CHARS = 400  # Longer sentences are not used as standalone answers
+
+# Answer Cache
+ANSWER_CACHE_ENABLED = False  # Reuse generated answers for repeated and rephrased questions
+ANSWER_CACHE_THRESHOLD = 0.92  # Cosine similarity above which a rephrased question reuses an answer
+ANSWER_CACHE_MAX_ENTRIES = 5000
+ANSWER_CACHE_MAX_AGE = 7 * 24 * 3600  # Seconds an unused answer is kept
+
+# Generation Scheduling
+LLM_THREADS = None  # CPU threads for generation, split across workers (None = all cores but two)
+GENERATION_WORKERS = 1  # Model instances generating concurrently (weights are shared via mmap)
+GENERATION_QUEUE_SIZE = 32  # Requests waiting beyond this are rejected as busy
+GENERATION_DEADLINE = 180  # Seconds a request may spend queued plus generating
+
+# Conversation follow-ups ("explain it more simply"): reuse the previous turn's
+# chunks, and its llama.cpp state so only the new question is prefilled
+SESSION_FOLLOW_UPS = False
+SESSION_FOLLOW_UP_MAX_WORDS = 12  # Longer questions are treated as new questions
+SESSION_MAX = 1000  # Conversations remembered (least recently used dropped first)
+SESSION_TTL = 1800  # Seconds a conversation is remembered after its last turn
+# Saved KV states kept across sessions (oldest dropped first). 0 = keep only the tokens and rely on the
+# worker's KV cache still holding them; otherwise each follow-up answer copies the KV cache (tens of MB)
+SESSION_STATE_BUDGET_MB = 0
+
+# HTTP API (server.py)
+SERVER_HOST = "0.0.0.0"
+SERVER_PORT = 8000
+SERVER_MAX_INFLIGHT = 48  # Queries admitted at once; beyond this the server answers 503
+SERVER_MAX_BODY = 64 * 1024  # Largest accepted request body in bytes
+
+# Backends ("fake" runs the whole pipeline without model files; used by benchmark.py --fake)
+EMBEDDING_BACKEND = "huggingface"  # "huggingface" or "fake" (deterministic hash vectors)
+# "llama_cpp" (model loaded in this process), "server" (a llama.cpp server at
+# LLM_SERVER_URL, shared by every front end) or "fake" (echoes the context with simulated timing)
+LLM_BACKEND = "llama_cpp"
+LLM_SERVER_URL = "http://127.0.0.1:8080"  # e.g. `llama-server -m models/<model>.gguf -c 4096 --parallel 4`
+SMALL_LLM_SERVER_URL = None  # Server for the cascade's small tier (None = LLM_SERVER_URL)
+LLM_SERVER_MODEL = None  # "model" field sent to the server (None = the server's default)
+LLM_SERVER_POOL_SIZE = 8  # Keep-alive connections (= concurrent requests) per server
+LLM_SERVER_TIMEOUT = 300  # Seconds to wait for a response, or for the server to finish loading
+LLM_SERVER_TOKENIZE_CACHE = 256  # Recently tokenized texts kept by the client
+FAKE_EMBEDDING_DIM = 384
+FAKE_LLM_PREFILL_MS = 0.5  # Simulated prefill cost per prompt token not already in the KV cache
+FAKE_LLM_DECODE_MS = 20  # Simulated decode cost per generated token
+FAKE_LLM_ANSWER_TOKENS = 120  # Tokens the fake model generates per answer
+
+# Telemetry: nested timing spans per request, counters and a Prometheus /metrics endpoint
+TELEMETRY_ENABLED = False  # Off: every span/counter call is a no-op
+TELEMETRY_PROFILE_SLOWEST = 0  # Sample stacks of every request and keep profiles of the N slowest (0 = off)
+TELEMETRY_PROFILE_INTERVAL = 0.01  # Seconds between stack samples
 
 # System Prompt
 SYSTEM_PROMPT = """You are a helpful NCERT Doubt Solver for students.
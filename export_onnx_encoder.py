@@ -0,0 +1,144 @@
+import os
+import time
+import inspect
+import argparse
+import logging
+import tempfile
+import numpy as np
+import faiss
+import config
+from src.embedding_cache import CachedEmbeddings
+from src.onnx_encoder import OnnxEmbeddings, model_snapshot
+from benchmark import load_workload
+from benchmark_index import load_corpus_vectors
+
+# Configure logging
+logging.getLogger().setLevel(logging.ERROR)
+
+
+def export(model_name: str, output_path: str, opset: int = 14):
+    """
+    Exports the sentence-transformer's transformer (from the local Hugging Face
+    cache) to ONNX and quantises its weights to int8. Pooling is not part of the
+    graph; OnnxEmbeddings averages the token states itself.
+    """
+    import torch
+    from transformers import AutoModel, AutoTokenizer
+    from onnxruntime.quantization import QuantType, quantize_dynamic
+
+    class TokenStates(torch.nn.Module):
+        """The transformer called by keyword, returning only the token states (forward signatures vary across versions)."""
+
+        def __init__(self, model):
+            super().__init__()
+            self.model = model
+
+        def forward(self, input_ids, attention_mask):
+            return self.model(input_ids=input_ids, attention_mask=attention_mask).last_hidden_state
+
+    snapshot = model_snapshot(model_name)
+    model = TokenStates(AutoModel.from_pretrained(snapshot)).eval()
+    sample = AutoTokenizer.from_pretrained(snapshot)(["Photosynthesis happens in the leaves."], return_tensors="pt")
+    os.makedirs(os.path.dirname(output_path) or ".", exist_ok=True)
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        fp32_path = os.path.join(tmp_dir, "model-fp32.onnx")
+        print(f"Exporting {model_name} to ONNX (opset {opset})...")
+        # The TorchScript exporter takes dynamic_axes on every torch version; newer ones default to dynamo
+        legacy = {"dynamo": False} if "dynamo" in inspect.signature(torch.onnx.export).parameters else {}
+        with torch.no_grad():
+            torch.onnx.export(
+                model,
+                (sample["input_ids"], sample["attention_mask"]),
+                fp32_path,
+                input_names=["input_ids", "attention_mask"],
+                output_names=["last_hidden_state"],
+                dynamic_axes={
+                    "input_ids": {0: "batch", 1: "sequence"},
+                    "attention_mask": {0: "batch", 1: "sequence"},
+                    "last_hidden_state": {0: "batch", 1: "sequence"}
+                },
+                opset_version=opset,
+                do_constant_folding=True,
+                **legacy
+            )
+        print("Quantising weights to int8...")
+        quantize_dynamic(fp32_path, output_path, weight_type=QuantType.QInt8)
+    print(f"Saved {output_path} ({os.path.getsize(output_path) / 1e6:.1f} MB)")
+
+
+def time_queries(embeddings, queries) -> np.ndarray:
+    """Vectors of `queries` encoded one at a time (as the retriever does), plus per-query milliseconds."""
+    vectors, latencies = [], []
+    for query in queries:
+        t0 = time.perf_counter()
+        vectors.append(embeddings.embed_query(query))
+        latencies.append((time.perf_counter() - t0) * 1000)
+    return np.asarray(vectors, dtype=np.float32), np.asarray(latencies)
+
+
+def check(onnx_path: str, model_name: str, queries, top_k: int, min_cosine: float, min_overlap: float) -> bool:
+    """
+    Compares the int8 encoder with the PyTorch model on the workload questions:
+    cosine similarity of their query vectors, and overlap of the top-k chunks
+    each retrieves by exact search over the ingested corpus. True if both are
+    within the thresholds.
+    """
+    from langchain_community.embeddings import HuggingFaceEmbeddings
+
+    t0 = time.time()
+    reference = HuggingFaceEmbeddings(model_name=model_name)
+    reference_load = time.time() - t0
+    t0 = time.time()
+    encoder = OnnxEmbeddings(onnx_path, model_name)
+    encoder_load = time.time() - t0
+
+    reference_vectors, reference_ms = time_queries(reference, queries)
+    encoder_vectors, encoder_ms = time_queries(encoder, queries)
+    cosine = np.sum(reference_vectors * encoder_vectors, axis=1) / (
+        np.linalg.norm(reference_vectors, axis=1) * np.linalg.norm(encoder_vectors, axis=1)
+    )
+    print(f"\n{len(queries)} queries")
+    print(f"  PyTorch: load {reference_load:.2f}s, p50 {np.percentile(reference_ms, 50):.1f}ms, p95 {np.percentile(reference_ms, 95):.1f}ms")
+    print(f"  int8:    load {encoder_load:.2f}s, p50 {np.percentile(encoder_ms, 50):.1f}ms, p95 {np.percentile(encoder_ms, 95):.1f}ms")
+    print(f"  Cosine similarity int8 vs PyTorch: mean {cosine.mean():.4f}, min {cosine.min():.4f}")
+    passed = cosine.min() >= min_cosine
+
+    if not os.path.exists(config.VECTOR_DB_DIR):
+        print(f"No ingested corpus at {config.VECTOR_DB_DIR}; skipping the top-k check.")
+        return passed
+    # Chunk vectors come from the embedding cache (the PyTorch model), as in retrieval
+    vectors = load_corpus_vectors(CachedEmbeddings(reference, model_name, read_only=True))
+    index = faiss.IndexFlatL2(vectors.shape[1])
+    index.add(vectors)
+    _, expected = index.search(reference_vectors, top_k)
+    _, found = index.search(encoder_vectors, top_k)
+    overlap = np.array([len(set(f.tolist()) & set(e.tolist())) / top_k for f, e in zip(found, expected)])
+    print(f"  Top-{top_k} overlap over {len(vectors)} chunks: mean {overlap.mean():.3f}, min {overlap.min():.3f}, "
+          f"identical sets {np.mean(overlap == 1):.0%}, same top-1 {np.mean(found[:, 0] == expected[:, 0]):.0%}")
+    return passed and overlap.mean() >= min_overlap
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Export the embedding model to int8 ONNX for QUERY_ENCODER = 'onnx_int8' and check it against the PyTorch model. "
+                    "Needs `pip install -r requirements-onnx.txt`."
+    )
+    parser.add_argument("--model", default=config.EMBEDDING_MODEL_NAME)
+    parser.add_argument("--output", default=config.ONNX_ENCODER_PATH)
+    parser.add_argument("--check-only", action="store_true", help="Skip the export and only check an existing file.")
+    parser.add_argument("--queries", default=os.path.join("workloads", "questions_50.txt"),
+                        help="Workload file with one query per line (default: the 50 benchmark questions).")
+    parser.add_argument("--k", type=int, default=config.TOP_K_RETRIEVAL)
+    parser.add_argument("--min-cosine", type=float, default=0.98,
+                        help="Lowest acceptable cosine similarity between int8 and PyTorch query vectors.")
+    parser.add_argument("--min-overlap", type=float, default=0.9,
+                        help="Lowest acceptable mean top-k overlap with the PyTorch model's results.")
+    args = parser.parse_args()
+
+    if not args.check_only:
+        export(args.model, args.output)
+    if not check(args.output, args.model, load_workload(args.queries), args.k, args.min_cosine, args.min_overlap):
+        print("\nThe int8 encoder drifts too far from the PyTorch model; keep QUERY_ENCODER = 'huggingface'.")
+        raise SystemExit(1)
+    print("\nThe int8 encoder matches the PyTorch model; set QUERY_ENCODER = 'onnx_int8' in config.py.")
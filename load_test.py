@@ -0,0 +1,82 @@
+import json
+import time
+import argparse
+import statistics
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional
+
+DEFAULT_QUESTIONS = [
+    "What is photosynthesis?",
+    "Explain the function of stomata.",
+    "What is Ohm's law?",
+    "What are the causes of the French Revolution?",
+    "What is the difference between weather and climate?",
+]
+
+
+def percentile(values: List[float], q: float) -> float:
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(q / 100 * (len(values) - 1))))]
+
+
+def run_one(url: str, query: str, stream: bool, timeout: float) -> Dict:
+    """Sends one query; for streaming requests also measures time to the first token event."""
+    body = json.dumps({"query": query}).encode("utf-8")
+    endpoint = url.rstrip("/") + ("/query/stream" if stream else "/query")
+    request = urllib.request.Request(endpoint, data=body, headers={"Content-Type": "application/json"})
+    start = time.time()
+    ttft: Optional[float] = None
+    try:
+        with urllib.request.urlopen(request, timeout=timeout) as response:
+            if stream:
+                for line in response:
+                    if ttft is None and line.startswith(b"event: token"):
+                        ttft = time.time() - start
+            else:
+                response.read()
+        return {"status": 200, "latency": time.time() - start, "ttft": ttft}
+    except urllib.error.HTTPError as e:
+        return {"status": e.code, "latency": time.time() - start, "ttft": None}
+    except OSError as e:
+        return {"status": 0, "latency": time.time() - start, "ttft": None, "error": str(e)}
+
+
+def load_test(url: str, questions: List[str], concurrency: int, total: int, stream: bool, timeout: float):
+    print(f"Sending {total} queries to {url} with {concurrency} concurrent clients...")
+    start = time.time()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        results = list(pool.map(lambda i: run_one(url, questions[i % len(questions)], stream, timeout), range(total)))
+    elapsed = time.time() - start
+
+    ok = [r for r in results if r["status"] == 200]
+    latencies = [r["latency"] for r in ok]
+    ttfts = [r["ttft"] for r in ok if r["ttft"] is not None]
+    print(f"Completed: {len(ok)}/{total} | Busy (503): {sum(r['status'] == 503 for r in results)} | "
+          f"Errors: {sum(r['status'] not in (200, 503) for r in results)}")
+    print(f"Throughput: {len(ok) / elapsed:.2f} answers/s over {elapsed:.1f}s")
+    if latencies:
+        print(f"Latency p50/p95/p99: {percentile(latencies, 50):.2f} / {percentile(latencies, 95):.2f} / "
+              f"{percentile(latencies, 99):.2f} s (mean {statistics.mean(latencies):.2f} s)")
+    if ttfts:
+        print(f"First token p50/p95: {percentile(ttfts, 50):.2f} / {percentile(ttfts, 95):.2f} s")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Concurrent load test against server.py.")
+    parser.add_argument("--url", default="http://localhost:8000")
+    parser.add_argument("--concurrency", type=int, default=30, help="Simultaneous clients (e.g. a classroom)")
+    parser.add_argument("--requests", type=int, default=60, help="Total queries to send")
+    parser.add_argument("--stream", action="store_true", help="Use the SSE endpoint and measure time to first token")
+    parser.add_argument("--questions", help="Text file with one question per line")
+    parser.add_argument("--timeout", type=float, default=600)
+    args = parser.parse_args()
+
+    questions = DEFAULT_QUESTIONS
+    if args.questions:
+        with open(args.questions, "r", encoding="utf-8") as f:
+            questions = [line.strip() for line in f if line.strip()]
+    load_test(args.url, questions, args.concurrency, args.requests, args.stream, args.timeout)
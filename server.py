@@ -0,0 +1,264 @@
+import json
+import asyncio
+import logging
+import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Optional
+from src.pipeline import RAGPipeline
+from src.scheduler import SchedulerBusy
+from src import telemetry
+import config
+
+logging.basicConfig(level=logging.INFO)
+
+REASONS = {200: "OK", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed",
+           413: "Payload Too Large", 500: "Internal Server Error", 503: "Service Unavailable"}
+
+
+class HTTPError(Exception):
+    def __init__(self, status: int, message: str):
+        super().__init__(message)
+        self.status = status
+        self.message = message
+
+
+def serialize_result(result: Dict) -> Dict:
+    """JSON-safe version of a RAGPipeline result (Documents become source/page/snippet)."""
+    out = {k: v for k, v in result.items() if k != "source_documents"}
+    out["sources"] = [
+        {
+            "source": doc.metadata.get("source", "Unknown"),
+            "page": doc.metadata.get("page", "Unknown"),
+            "snippet": doc.page_content[:300]
+        }
+        for doc in result.get("source_documents", [])
+    ]
+    return out
+
+
+class DoubtSolverServer:
+    """
+    Asyncio HTTP front end for RAGPipeline (stdlib only).
+
+    Endpoints:
+      GET  /health        process is up
+      GET  /ready         vector DB and model loaded (503 otherwise), per-component state and queue stats
+      POST /query         {"query": ..., "filters": {...}, "session_id": ...} -> JSON answer
+                          (session_id is optional; reuse it across a conversation for follow-ups)
+      POST /query/stream  same body -> server-sent events ("token" ..., then "done")
+      GET  /metrics       Prometheus text exposition (populated when TELEMETRY_ENABLED)
+
+    Retrieval and generation block, so they run on a thread pool; the event loop
+    only parses requests and writes responses. At most `max_inflight` queries are
+    admitted at once and further ones get 503 with Retry-After, as do requests
+    the generation scheduler rejects, so a proxy can retry on another instance.
+    """
+
+    def __init__(self, pipeline: RAGPipeline, max_inflight: int = config.SERVER_MAX_INFLIGHT):
+        self.pipeline = pipeline
+        self.max_inflight = max_inflight
+        self.inflight = 0
+        self.executor = ThreadPoolExecutor(max_workers=max_inflight, thread_name_prefix="query")
+
+    def ready(self) -> bool:
+        return self.pipeline.readiness()["ready"]
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            method, path, body = await self._read_request(reader)
+            await self._route(method, path, body, writer)
+        except HTTPError as e:
+            await self._send_json(writer, e.status, {"error": e.message})
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        except Exception as e:
+            logging.error(f"Request failed: {e}")
+            try:
+                await self._send_json(writer, 500, {"error": str(e)})
+            except ConnectionError:
+                pass
+        finally:
+            writer.close()
+            try:
+                await writer.wait_closed()
+            except ConnectionError:
+                pass
+
+    async def _read_request(self, reader: asyncio.StreamReader):
+        request_line = (await reader.readline()).decode("latin-1").strip()
+        if not request_line:
+            raise ConnectionError("Empty request")
+        try:
+            method, target, _ = request_line.split(" ", 2)
+        except ValueError:
+            raise HTTPError(400, "Malformed request line")
+
+        headers = {}
+        while True:
+            line = (await reader.readline()).decode("latin-1").strip()
+            if not line:
+                break
+            name, _, value = line.partition(":")
+            headers[name.strip().lower()] = value.strip()
+
+        try:
+            length = int(headers.get("content-length", 0) or 0)
+        except ValueError:
+            length = -1
+        if length < 0:
+            raise HTTPError(400, "Invalid Content-Length")
+        if length > config.SERVER_MAX_BODY:
+            raise HTTPError(413, f"Request body over {config.SERVER_MAX_BODY} bytes")
+        body = await reader.readexactly(length) if length else b""
+        return method.upper(), target.split("?", 1)[0], body
+
+    async def _route(self, method: str, path: str, body: bytes, writer: asyncio.StreamWriter):
+        if path == "/health":
+            await self._send_json(writer, 200, {"status": "ok"})
+        elif path == "/ready":
+            ready = self.ready()
+            await self._send_json(writer, 200 if ready else 503, {
+                **self.pipeline.readiness(),
+                "inflight": self.inflight,
+                "scheduler": self.pipeline.scheduler.stats() if self.pipeline.scheduler else None,
+                "sessions": self.pipeline.sessions.summary() if self.pipeline.sessions else None
+            })
+        elif path == "/metrics":
+            await self._send_text(writer, 200, telemetry.metrics.exposition(), "text/plain; version=0.0.4; charset=utf-8")
+        elif path in ("/query", "/query/stream"):
+            if method != "POST":
+                raise HTTPError(405, "Use POST")
+            query, filters, session_id = self._parse_query(body)
+            if self.inflight >= self.max_inflight:
+                raise HTTPError(503, "Server busy, retry shortly")
+            self.inflight += 1
+            try:
+                if path == "/query":
+                    await self._query(writer, query, filters, session_id)
+                else:
+                    await self._query_stream(writer, query, filters, session_id)
+            finally:
+                self.inflight -= 1
+        else:
+            raise HTTPError(404, f"No route for {path}")
+
+    @staticmethod
+    def _parse_query(body: bytes):
+        try:
+            payload = json.loads(body or b"{}")
+        except ValueError:
+            raise HTTPError(400, "Body must be JSON")
+        query = payload.get("query") if isinstance(payload, dict) else None
+        if not isinstance(query, str) or not query.strip():
+            raise HTTPError(400, "Missing 'query'")
+        filters = payload.get("filters") or None
+        if filters is not None and not isinstance(filters, dict):
+            raise HTTPError(400, "'filters' must be an object")
+        session_id = payload.get("session_id")
+        if session_id is not None and not isinstance(session_id, str):
+            raise HTTPError(400, "'session_id' must be a string")
+        return query, filters, session_id
+
+    async def _query(self, writer: asyncio.StreamWriter, query: str, filters: Optional[Dict], session_id: Optional[str]):
+        loop = asyncio.get_running_loop()
+        try:
+            result = await loop.run_in_executor(self.executor, self.pipeline.process_query, query, filters, session_id)
+        except SchedulerBusy as e:
+            raise HTTPError(503, str(e))
+        await self._send_json(writer, 200, serialize_result(result))
+
+    async def _query_stream(self, writer: asyncio.StreamWriter, query: str, filters: Optional[Dict], session_id: Optional[str]):
+        loop = asyncio.get_running_loop()
+        events = asyncio.Queue()
+        stop = threading.Event()
+        end = object()
+        generations = []
+
+        def pump():
+            # Runs on the thread pool; closing the generator cancels the scheduled generation
+            stream = self.pipeline.process_query_stream(query, filters=filters, session_id=session_id,
+                                                        on_generation=generations.append)
+            try:
+                for event in stream:
+                    if stop.is_set():
+                        break
+                    loop.call_soon_threadsafe(events.put_nowait, event)
+            except Exception as e:
+                loop.call_soon_threadsafe(events.put_nowait, e)
+            finally:
+                stream.close()
+                loop.call_soon_threadsafe(events.put_nowait, end)
+
+        task = loop.run_in_executor(self.executor, pump)
+        started = False
+        try:
+            while True:
+                event = await events.get()
+                if event is end:
+                    break
+                if isinstance(event, Exception):
+                    if not started:
+                        raise HTTPError(503 if isinstance(event, SchedulerBusy) else 500, str(event))
+                    await self._send_event(writer, "error", {"error": str(event)})
+                    break
+                if not started:
+                    writer.write(self._head(200, "text/event-stream", extra="Cache-Control: no-cache\r\n"))
+                    started = True
+                if event["type"] == "token":
+                    await self._send_event(writer, "token", {"text": event["text"]})
+                else:
+                    await self._send_event(writer, "done", serialize_result(event["result"]))
+        finally:
+            # Client gone or request finished: cancel the generation now (the pump may be
+            # blocked waiting for its next token, or for it to leave the queue) and let
+            # the worker thread wind down
+            stop.set()
+            for request in generations:
+                request.cancel()
+            await task
+
+    @staticmethod
+    def _head(status: int, content_type: str, length: Optional[int] = None, extra: str = "") -> bytes:
+        head = f"HTTP/1.1 {status} {REASONS.get(status, '')}\r\nContent-Type: {content_type}\r\nConnection: close\r\n"
+        if length is not None:
+            head += f"Content-Length: {length}\r\n"
+        if status == 503:
+            head += "Retry-After: 1\r\n"
+        return (head + extra + "\r\n").encode("latin-1")
+
+    async def _send_json(self, writer: asyncio.StreamWriter, status: int, payload: Dict):
+        await self._send_text(writer, status, json.dumps(payload, ensure_ascii=False), "application/json; charset=utf-8")
+
+    async def _send_text(self, writer: asyncio.StreamWriter, status: int, text: str, content_type: str):
+        body = text.encode("utf-8")
+        writer.write(self._head(status, content_type, len(body)) + body)
+        await writer.drain()
+
+    @staticmethod
+    async def _send_event(writer: asyncio.StreamWriter, name: str, payload: Dict):
+        writer.write(f"event: {name}\ndata: {json.dumps(payload, ensure_ascii=False)}\n\n".encode("utf-8"))
+        await writer.drain()
+
+
+async def serve(host: str, port: int, max_inflight: int):
+    # Components load in the background; /ready turns 200 once they are warm
+    pipeline = RAGPipeline(background=config.BACKGROUND_INIT)
+    app = DoubtSolverServer(pipeline, max_inflight)
+    server = await asyncio.start_server(app.handle, host, port)
+    logging.info(f"Serving on http://{host}:{port} (ready: {app.ready()})")
+    async with server:
+        await server.serve_forever()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="HTTP API for the NCERT Doubt Solver (JSON and SSE streaming).")
+    parser.add_argument("--host", default=config.SERVER_HOST)
+    parser.add_argument("--port", type=int, default=config.SERVER_PORT)
+    parser.add_argument("--max-inflight", type=int, default=config.SERVER_MAX_INFLIGHT,
+                        help="Queries admitted at once before answering 503")
+    args = parser.parse_args()
+    try:
+        asyncio.run(serve(args.host, args.port, args.max_inflight))
+    except KeyboardInterrupt:
+        pass
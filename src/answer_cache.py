@@ -0,0 +1,282 @@
+import os
+import json
+import time
+import hashlib
+import logging
+import threading
+from typing import Dict, List, Optional
+import numpy as np
+from langchain_core.documents import Document
+from src.embedding_cache import normalize_text
+from src.metadata import normalize_filters
+import config
+
+META_FILE = "meta.json"
+LOG_FILE = "log.jsonl"
+VECTORS_FILE = "vectors.f32"
+
+
+def _file_signature(path: str) -> str:
+    try:
+        stat = os.stat(path)
+        return f"{os.path.basename(path)}:{stat.st_size}:{stat.st_mtime}"
+    except OSError:
+        return f"{os.path.basename(path)}:missing"
+
+
+def corpus_fingerprint() -> str:
+    """
+    Changes whenever anything that shapes an answer changes: the vector index,
+    the model(s) and backend, the prompts, or the retrieval, context packing and
+    generation settings.
+    """
+    from src.generation import PROMPT_PREFIX
+
+    parts = [
+        _file_signature(os.path.join(config.VECTOR_DB_DIR, "index.faiss")),
+        _file_signature(os.path.join(config.VECTOR_DB_DIR, "chunks.offsets.npy")),
+        _file_signature(config.MODEL_PATH),
+        _file_signature(config.SMALL_MODEL_PATH) if config.MODEL_CASCADE else "no-cascade",
+        f"{config.LLM_BACKEND}:{config.LLM_SERVER_MODEL}",
+        f"{config.TEMPERATURE}:{config.MAX_NEW_TOKENS}:{config.TOP_K_RETRIEVAL}:{config.RETRIEVAL_MODE}",
+        f"{config.CONTEXT_WINDOW}:{config.CONTEXT_DEDUP_THRESHOLD}:{config.CONTEXT_TOKEN_MARGIN}",
+        config.SYSTEM_PROMPT,
+        PROMPT_PREFIX
+    ]
+    return hashlib.sha256("\n".join(parts).encode("utf-8")).hexdigest()[:16]
+
+
+class AnswerCache:
+    """
+    Two-level cache of generated answers.
+
+    1. Exact: the normalised question text plus filters and language.
+    2. Semantic: the nearest cached question by cosine similarity of its query
+       embedding, if above `threshold`, among entries with the same filters and
+       language (so a Grade 6 answer is never served for a Grade 10 question).
+
+    Entries are persisted as an append-only log: log.jsonl gets one line per
+    new answer or hit, and vectors.f32 the unit-length query vector of each new
+    answer, so a put never rewrites the cache. The log is replayed on load and
+    compacted once it holds more than twice the live entries. Entries unused
+    for `max_age` seconds are dropped, and beyond `max_entries` the least
+    recently used go first. The whole cache is discarded when
+    corpus_fingerprint() changes (re-ingestion, a new model or new settings).
+    """
+
+    def __init__(self, embeddings, cache_dir: str = config.ANSWER_CACHE_DIR,
+                 max_entries: int = config.ANSWER_CACHE_MAX_ENTRIES, max_age: float = config.ANSWER_CACHE_MAX_AGE,
+                 threshold: float = config.ANSWER_CACHE_THRESHOLD):
+        self.embeddings = embeddings
+        self.cache_dir = cache_dir
+        self.max_entries = max_entries
+        self.max_age = max_age
+        self.threshold = threshold
+        self.fingerprint = corpus_fingerprint()
+        self.entries: List[Dict] = []
+        self.vectors = np.zeros((0, 0), dtype=np.float32)
+        self.hits = {"exact": 0, "semantic": 0, "miss": 0}
+        self._lock = threading.Lock()
+        # Lines in the log on disk; None until there is a log of this fingerprint to append to
+        self._records: Optional[int] = None
+        self._dim = 0
+        self._load()
+
+    def _path(self, name: str) -> str:
+        return os.path.join(self.cache_dir, name)
+
+    def _load(self):
+        if not os.path.exists(self._path(META_FILE)):
+            return
+        try:
+            with open(self._path(META_FILE), "r", encoding="utf-8") as f:
+                meta = json.load(f)
+            with open(self._path(LOG_FILE), "rb") as f:
+                lines = f.read().split(b"\n")
+            vectors = np.fromfile(self._path(VECTORS_FILE), dtype=np.float32)
+        except (OSError, ValueError) as e:
+            logging.warning(f"Ignoring unreadable answer cache {self.cache_dir}: {e}")
+            return
+        if meta.get("fingerprint") != self.fingerprint:
+            logging.info("Vector index or model changed; discarding the answer cache.")
+            return
+
+        dim = meta.get("dim") or 0
+        rows = vectors[:len(vectors) // dim * dim].reshape(-1, dim) if dim else vectors[:0].reshape(0, 0)
+        entries: Dict[str, Dict] = {}
+        entry_vectors: Dict[str, np.ndarray] = {}
+        puts = records = 0
+        for line in lines:
+            if not line:
+                continue
+            try:
+                record = json.loads(line)
+            except ValueError:
+                # A torn last append
+                break
+            if "put" in record:
+                if puts == len(rows):
+                    break
+                entry = record["put"]
+                entries.pop(entry["key"], None)
+                entries[entry["key"]] = entry
+                entry_vectors[entry["key"]] = rows[puts]
+                puts += 1
+            elif record.get("hit") in entries:
+                entry = entries[record["hit"]]
+                entry["last_used"] = record["time"]
+                entry["hits"] = entry.get("hits", 0) + 1
+            records += 1
+
+        self.entries = list(entries.values())
+        self.vectors = (np.stack([entry_vectors[entry["key"]] for entry in self.entries])
+                        if self.entries else np.zeros((0, dim), dtype=np.float32))
+        self._dim, self._records = dim, records
+        self._evict()
+        logging.info(f"Loaded {len(self.entries)} cached answers")
+        # Torn tail or mostly superseded lines: start a clean log
+        if records != len(lines) - lines.count(b"") or puts != len(rows) or records > 2 * len(self.entries):
+            try:
+                self._rewrite()
+            except OSError as e:
+                logging.warning(f"Could not compact answer cache: {e}")
+                self._records = None
+
+    def _rewrite(self):
+        """Replaces the log with one line per live entry (a new fingerprint, or compaction)."""
+        os.makedirs(self.cache_dir, exist_ok=True)
+        # Without the meta file the cache is ignored, so a crash part-way leaves an empty cache, not a misaligned one
+        if os.path.exists(self._path(META_FILE)):
+            os.remove(self._path(META_FILE))
+        with open(self._path(LOG_FILE), "w", encoding="utf-8") as f:
+            f.writelines(json.dumps({"put": entry}, ensure_ascii=False) + "\n" for entry in self.entries)
+        with open(self._path(VECTORS_FILE), "wb") as f:
+            f.write(np.ascontiguousarray(self.vectors, dtype=np.float32).tobytes())
+        self._dim = self.vectors.shape[1]
+        with open(self._path(META_FILE) + ".tmp", "w", encoding="utf-8") as f:
+            json.dump({"fingerprint": self.fingerprint, "dim": self._dim}, f)
+        os.replace(self._path(META_FILE) + ".tmp", self._path(META_FILE))
+        self._records = len(self.entries)
+
+    def _append(self, record: Dict, vector: Optional[np.ndarray] = None):
+        """Adds one line to the log (and its vector first, for a put). Called with the lock held."""
+        if vector is not None:
+            with open(self._path(VECTORS_FILE), "ab") as f:
+                f.write(np.ascontiguousarray(vector, dtype=np.float32).tobytes())
+        with open(self._path(LOG_FILE), "a", encoding="utf-8") as f:
+            f.write(json.dumps(record, ensure_ascii=False) + "\n")
+        self._records += 1
+
+    @staticmethod
+    def scope(filters: Optional[Dict], lang: str) -> str:
+        """Filters and language an answer is valid for."""
+        return json.dumps([normalize_filters(filters), lang], sort_keys=True)
+
+    @staticmethod
+    def key(query: str, scope: str) -> str:
+        return hashlib.sha256(f"{normalize_text(query).lower()}\n{scope}".encode("utf-8")).hexdigest()
+
+    def _vector(self, query: str) -> np.ndarray:
+        vector = np.asarray(self.embeddings.embed_query(normalize_text(query)), dtype=np.float32)
+        return vector / (np.linalg.norm(vector) or 1.0)
+
+    def _check_fingerprint(self):
+        fingerprint = corpus_fingerprint()
+        if fingerprint != self.fingerprint:
+            logging.info("Vector index or model changed; clearing the answer cache.")
+            self.fingerprint = fingerprint
+            self.entries, self.vectors = [], np.zeros((0, 0), dtype=np.float32)
+            # The next put starts a new log; until then the stale one is ignored on load
+            self._records = None
+
+    def lookup(self, query: str, filters: Optional[Dict], lang: str) -> Optional[Dict]:
+        """
+        Returns {"answer", "source_documents", "hit": "exact" | "semantic",
+        "similarity", "query"} for a cached answer, or None on a miss.
+        """
+        scope = self.scope(filters, lang)
+        key = self.key(query, scope)
+        with self._lock:
+            self._check_fingerprint()
+            match, kind, similarity = None, None, 1.0
+            for i, entry in enumerate(self.entries):
+                if entry["key"] == key:
+                    match, kind = i, "exact"
+                    break
+
+            if match is None and self.entries:
+                in_scope = np.asarray([entry["scope"] == scope for entry in self.entries])
+                if in_scope.any():
+                    scores = np.where(in_scope, self.vectors @ self._vector(query), -1.0)
+                    best = int(np.argmax(scores))
+                    if scores[best] >= self.threshold:
+                        match, kind, similarity = best, "semantic", float(scores[best])
+
+            if match is None:
+                self.hits["miss"] += 1
+                return None
+
+            self.hits[kind] += 1
+            entry = self.entries[match]
+            entry["last_used"] = time.time()
+            entry["hits"] = entry.get("hits", 0) + 1
+            if self._records is not None:
+                try:
+                    self._append({"hit": entry["key"], "time": entry["last_used"]})
+                except OSError as e:
+                    logging.warning(f"Could not save answer cache: {e}")
+            return {
+                "answer": entry["answer"],
+                "source_documents": [Document(page_content=d["text"], metadata=d["metadata"]) for d in entry["sources"]],
+                "hit": kind,
+                "similarity": similarity,
+                "query": entry["query"]
+            }
+
+    def put(self, query: str, filters: Optional[Dict], lang: str, answer: str, docs: List[Document]):
+        scope = self.scope(filters, lang)
+        key = self.key(query, scope)
+        vector = self._vector(query)
+        now = time.time()
+        with self._lock:
+            keep = [i for i, entry in enumerate(self.entries) if entry["key"] != key]
+            self.entries = [self.entries[i] for i in keep]
+            self.vectors = self.vectors[keep] if keep else np.zeros((0, len(vector)), dtype=np.float32)
+            entry = {
+                "key": key,
+                "scope": scope,
+                "query": query,
+                "answer": answer,
+                "sources": [{"text": d.page_content, "metadata": d.metadata} for d in docs],
+                "created": now,
+                "last_used": now,
+                "hits": 0
+            }
+            self.entries.append(entry)
+            self.vectors = np.vstack([self.vectors, vector[None, :]])
+            self._evict()
+            try:
+                if self._records is None or self._dim != len(vector) or self._records > 2 * max(len(self.entries), 100):
+                    self._rewrite()
+                else:
+                    self._append({"put": entry}, vector)
+            except OSError as e:
+                logging.warning(f"Could not save answer cache: {e}")
+                self._records = None
+
+    def _evict(self):
+        now = time.time()
+        keep = [i for i, entry in enumerate(self.entries) if now - entry["last_used"] <= self.max_age]
+        if len(keep) > self.max_entries:
+            keep = sorted(sorted(keep, key=lambda i: self.entries[i]["last_used"])[-self.max_entries:])
+        if len(keep) != len(self.entries):
+            self.entries = [self.entries[i] for i in keep]
+            self.vectors = self.vectors[keep]
+
+    def stats(self) -> Dict:
+        lookups = sum(self.hits.values())
+        return {
+            **self.hits,
+            "entries": len(self.entries),
+            "hit_rate": (self.hits["exact"] + self.hits["semantic"]) / lookups if lookups else 0.0
+        }
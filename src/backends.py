@@ -0,0 +1,237 @@
+import os
+import json
+import time
+import queue
+import logging
+import threading
+import http.client
+import urllib.parse
+from collections import OrderedDict
+from typing import Dict, Iterator, List, Optional, Tuple
+import config
+
+# Generation backends behind LocalLLMGenerator. Each exposes the subset of the
+# llama_cpp.Llama interface the generator uses:
+#   tokenize(text: bytes, add_bos=True) -> List[int]
+#   __call__(prompt_tokens, max_tokens=, temperature=, stop=, echo=False, stream=True)
+#       -> iterator of {"choices": [{"text": ..., "finish_reason": ...}]}
+# In-process backends (llama_cpp, fake) also support eval/save_state/load_state,
+# which the prompt prefix cache needs.
+BACKENDS = ["llama_cpp", "server", "fake"]
+
+
+def load_llama_cpp(model_path: str, n_threads: int):
+    """In-process llama.cpp model (plus its speculative draft model), or (None, None) if it cannot load."""
+    if not os.path.exists(model_path):
+        logging.error(f"Model file not found at {model_path}. Please download it.")
+        return None, None
+
+    try:
+        # Imported here so the app can start (and other backends run) before llama.cpp loads
+        from llama_cpp import Llama
+        from src.speculative import build_draft_model
+        logging.info(f"Loading model from {model_path}...")
+        draft_model = build_draft_model(config.SPECULATIVE_DECODING, n_threads)
+        llm = Llama(
+            model_path=model_path,
+            n_ctx=config.CONTEXT_WINDOW,
+            n_threads=n_threads,
+            draft_model=draft_model,
+            use_mmap=config.LLM_USE_MMAP,
+            use_mlock=config.LLM_USE_MLOCK,
+            verbose=False
+        )
+        return llm, draft_model
+    except Exception as e:
+        logging.error(f"Failed to load model: {e}")
+        return None, None
+
+
+class ConnectionPool:
+    """
+    Keep-alive HTTP connections to one server, reused across requests and threads.
+    At most `size` requests are in flight; further callers wait for a connection.
+    """
+
+    def __init__(self, url: str, size: int, timeout: float):
+        parts = urllib.parse.urlsplit(url)
+        self.scheme = parts.scheme
+        self.host = parts.hostname
+        self.port = parts.port
+        self.base_path = parts.path.rstrip("/")
+        self.timeout = timeout
+        self._idle = queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(size)
+
+    def _connect(self) -> http.client.HTTPConnection:
+        connection_class = http.client.HTTPSConnection if self.scheme == "https" else http.client.HTTPConnection
+        return connection_class(self.host, self.port, timeout=self.timeout)
+
+    def request(self, method: str, path: str, payload: Optional[Dict] = None):
+        """
+        Sends a request and returns (connection, response). The caller reads the
+        response and hands the connection back with `release`. A kept-alive
+        connection the server has since closed is replaced and the request resent.
+        """
+        body = json.dumps(payload).encode("utf-8") if payload is not None else None
+        headers = {"Content-Type": "application/json", "Connection": "keep-alive"}
+        self._slots.acquire()
+        try:
+            try:
+                connection, reused = self._idle.get_nowait(), True
+            except queue.Empty:
+                connection, reused = self._connect(), False
+            try:
+                connection.request(method, self.base_path + path, body=body, headers=headers)
+                return connection, connection.getresponse()
+            except (http.client.HTTPException, ConnectionError) as e:
+                connection.close()
+                if not reused:
+                    raise
+                logging.info(f"Reconnecting to {self.host}:{self.port} after stale connection ({e})")
+                connection = self._connect()
+                connection.request(method, self.base_path + path, body=body, headers=headers)
+                return connection, connection.getresponse()
+        except Exception:
+            self._slots.release()
+            raise
+
+    def release(self, connection: http.client.HTTPConnection, reuse: bool):
+        if reuse:
+            self._idle.put(connection)
+        else:
+            connection.close()
+        self._slots.release()
+
+
+class LlamaServerClient:
+    """
+    Client for a llama.cpp server (`llama-server`, OpenAI-compatible API), so the
+    model is loaded once on an inference box and shared by every front end.
+
+    Completions stream from /v1/completions over pooled keep-alive connections;
+    the prompt is sent as token IDs and the server reuses its KV cache for the
+    common prefix (cache_prompt). Tokenization goes through /tokenize, with an
+    LRU in front because context packing counts the same texts repeatedly.
+    Stopping a stream early closes its connection, which makes the server
+    abandon the generation.
+    """
+
+    def __init__(self, url: str, pool_size: int = config.LLM_SERVER_POOL_SIZE,
+                 timeout: float = config.LLM_SERVER_TIMEOUT, model: str = config.LLM_SERVER_MODEL):
+        self.url = url
+        self.model = model
+        self.pool = ConnectionPool(url, pool_size, timeout)
+        self._tokens: OrderedDict = OrderedDict()
+        self._tokens_lock = threading.Lock()
+
+    def _json(self, method: str, path: str, payload: Optional[Dict] = None) -> Dict:
+        connection, response = self.pool.request(method, path, payload)
+        try:
+            data = response.read()
+        except Exception:
+            self.pool.release(connection, reuse=False)
+            raise
+        self.pool.release(connection, reuse=not response.will_close)
+        if response.status != 200:
+            raise RuntimeError(f"LLM server {self.url}{path} answered {response.status}: {data[:200]!r}")
+        return json.loads(data)
+
+    def wait_until_ready(self, timeout: float) -> bool:
+        """Polls /health until the server has loaded its model (it answers 503 while loading)."""
+        deadline = time.time() + timeout
+        while True:
+            try:
+                self._json("GET", "/health")
+                return True
+            except RuntimeError as e:
+                if time.time() > deadline:
+                    logging.error(f"LLM server not ready: {e}")
+                    return False
+                time.sleep(1)
+            except OSError as e:
+                logging.error(f"LLM server unreachable at {self.url}: {e}")
+                return False
+
+    def tokenize(self, text: bytes, add_bos: bool = True, special: bool = False) -> List[int]:
+        key = (text, add_bos)
+        with self._tokens_lock:
+            if key in self._tokens:
+                self._tokens.move_to_end(key)
+                return list(self._tokens[key])
+        tokens = self._json("POST", "/tokenize", {"content": text.decode("utf-8"), "add_special": add_bos})["tokens"]
+        with self._tokens_lock:
+            self._tokens[key] = tokens
+            while len(self._tokens) > config.LLM_SERVER_TOKENIZE_CACHE:
+                self._tokens.popitem(last=False)
+        return list(tokens)
+
+    def __call__(self, prompt, max_tokens: int = 16, temperature: float = 0.8, stop: List[str] = None,
+                 echo: bool = False, stream: bool = False, **kwargs):
+        payload = {
+            "prompt": prompt,
+            "max_tokens": max_tokens,
+            "temperature": temperature,
+            "stop": stop or [],
+            "stream": stream,
+            "cache_prompt": True
+        }
+        if self.model:
+            payload["model"] = self.model
+        if not stream:
+            return self._json("POST", "/v1/completions", payload)
+        return self._stream(payload)
+
+    def _stream(self, payload: Dict) -> Iterator[Dict]:
+        connection, response = self.pool.request("POST", "/v1/completions", payload)
+        finished = False
+        try:
+            if response.status != 200:
+                raise RuntimeError(f"LLM server {self.url} answered {response.status}: {response.read()[:200]!r}")
+            # Server-sent events: "data: {chunk}" lines, ending with "data: [DONE]"
+            for line in response:
+                line = line.strip()
+                if not line.startswith(b"data:"):
+                    continue
+                data = line[5:].strip()
+                if data == b"[DONE]":
+                    break
+                yield json.loads(data)
+            response.read()
+            finished = True
+        finally:
+            # A stream abandoned mid-way leaves unread data on the socket; drop the connection
+            self.pool.release(connection, reuse=finished and not response.will_close)
+
+
+_clients: Dict[str, LlamaServerClient] = {}
+_clients_lock = threading.Lock()
+
+
+def server_client(url: str) -> Optional[LlamaServerClient]:
+    """The process-wide client (and connection pool) for a server URL, or None if the server is not reachable."""
+    with _clients_lock:
+        if url not in _clients:
+            client = LlamaServerClient(url)
+            logging.info(f"Connecting to LLM server at {url}...")
+            if not client.wait_until_ready(config.LLM_SERVER_TIMEOUT):
+                return None
+            _clients[url] = client
+        return _clients[url]
+
+
+def load_backend(backend: str, model_path: str, n_threads: int) -> Tuple[Optional[object], Optional[object]]:
+    """
+    The model for `backend` (one of BACKENDS) and its speculative draft model
+    (in-process llama.cpp only). The model is None if it is not available.
+    """
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown LLM backend '{backend}'. Choose one of {BACKENDS}.")
+    if backend == "fake":
+        from src.fake_backends import FakeLlama
+        return FakeLlama(), None
+    if backend == "server":
+        # The cascade's small tier may live on its own server
+        url = config.SMALL_LLM_SERVER_URL if model_path == config.SMALL_MODEL_PATH and config.SMALL_LLM_SERVER_URL else config.LLM_SERVER_URL
+        return server_client(url), None
+    return load_llama_cpp(model_path, n_threads)
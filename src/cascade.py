@@ -0,0 +1,132 @@
+import re
+import logging
+import threading
+from typing import Dict, Iterator, List, Optional, Tuple
+from src.generation import LocalLLMGenerator, build_source_footer
+from src.extractive import definition_term
+from src.utils import detect_language
+import config
+
+# Question starts that ask for a short fact rather than an explanation or a derivation
+FACTUAL_START = re.compile(r"^\s*(?:what|which|who|whom|when|where|name|define|state|list|give|write)\b", re.IGNORECASE)
+COMPLEX_CUES = re.compile(
+    r"\b(?:why|how|explain|describe|discuss|compare|difference|differentiate|distinguish|derive|prove|"
+    r"calculate|solve|find|evaluate|justify|analy[sz]e)\b|\d|[=+×÷^]",
+    re.IGNORECASE
+)
+REFUSAL = re.compile(r"i\s+don'?t\s+know|cannot\s+(?:be\s+)?answer|not\s+(?:provided|mentioned|given)\s+in\s+the\s+context", re.IGNORECASE)
+
+
+def route(query: str, docs: List, lang: str) -> Tuple[str, List[str]]:
+    """
+    Picks "small" or "large" for a question. Returns the tier and the reasons
+    the question was kept on the large model (empty when routed to small).
+    """
+    reasons = []
+    if lang not in config.ROUTER_SMALL_LANGUAGES:
+        reasons.append(f"language {lang}")
+    if len(query.split()) > config.ROUTER_MAX_QUESTION_WORDS:
+        reasons.append("long question")
+    if COMPLEX_CUES.search(query) or not (definition_term(query) or FACTUAL_START.match(query)):
+        reasons.append("not a simple factual question")
+
+    # Retrieval spread: a clear best chunk means the answer is easy to locate
+    distances = [d.metadata["distance"] for d in docs if "distance" in d.metadata]
+    if len(distances) >= 2:
+        rest = sum(distances[1:]) / len(distances[1:])
+        gap = (rest - distances[0]) / rest if rest > 0 else 0.0
+        if gap < config.ROUTER_MIN_SCORE_GAP:
+            reasons.append(f"flat retrieval scores (gap {gap:.2f})")
+    return ("large" if reasons else "small"), reasons
+
+
+def escalation_reason(answer: str, stats: Dict, lang: str) -> Optional[str]:
+    """Why a small-model answer should be redone by the large model, or None if it looks fine."""
+    words = answer.split()
+    if len(words) < config.ROUTER_MIN_ANSWER_WORDS:
+        return "answer too short"
+    if stats.get("finish_reason") == "length":
+        return "answer hit the token limit"
+    if REFUSAL.search(answer):
+        return "model could not answer from the context"
+    trigrams = [tuple(words[i:i + 3]) for i in range(len(words) - 2)]
+    if trigrams and len(set(trigrams)) / len(trigrams) < 0.5:
+        return "repetitive output"
+    if len(answer) > 40 and detect_language(answer) != lang:
+        return "answer in the wrong language"
+    return None
+
+
+class CascadeGenerator:
+    """
+    Tier of two GGUF models behind the LocalLLMGenerator interface.
+
+    `route` sends short, simple factual questions with a clear top chunk to the
+    small model. The small model's answer is buffered and checked by
+    `escalation_reason`; a malformed or low-confidence answer is regenerated by
+    the large model, so the student never sees it. Each tier is loaded on first
+    use and uses the worker's full thread budget (a worker runs one tier at a time).
+    """
+
+    def __init__(self, n_threads: int = None):
+        self.n_threads = n_threads
+        self.paths = {"small": config.SMALL_MODEL_PATH, "large": config.MODEL_PATH}
+        self.tiers: Dict[str, LocalLLMGenerator] = {}
+        self.last_stats = {}
+        self.last_turn = None
+        self.last_docs = []
+        self._lock = threading.Lock()
+
+    def tier(self, name: str) -> LocalLLMGenerator:
+        with self._lock:
+            if name not in self.tiers:
+                self.tiers[name] = LocalLLMGenerator(n_threads=self.n_threads, model_path=self.paths[name])
+            return self.tiers[name]
+
+    @property
+    def llm(self):
+        """The large model, which every question can fall back to."""
+        return self.tier("large").llm
+
+    def generate_answer(self, query: str, context_docs: list) -> str:
+        return "".join(self.generate_stream(query, context_docs))
+
+    def generate_stream(self, query: str, context_docs: list, previous=None, keep_turn: bool = False) -> Iterator[str]:
+        lang = detect_language(query)
+        name, reasons = route(query, context_docs, lang)
+        # A follow-up stays on the tier that holds the conversation's state
+        for tier_name, tier in list(self.tiers.items()):
+            if previous is not None and tier.model_path == previous.model_path:
+                name, reasons = tier_name, ([] if tier_name == "small" else ["follow-up"])
+        if name == "small" and not self.tier("small").llm:
+            name, reasons = "large", ["small model not available"]
+
+        escalated, small_time = None, 0.0
+        if name == "small":
+            small = self.tier("small")
+            answer = "".join(small.generate_stream(query, context_docs, with_footer=False,
+                                                   previous=previous, keep_turn=keep_turn))
+            escalated = escalation_reason(answer, small.last_stats, lang)
+            if escalated is None:
+                self.last_stats = {**small.last_stats, "tier": "small", "escalated": None, "route_reasons": []}
+                self.last_turn = small.last_turn
+                self.last_docs = small.last_docs
+                yield answer
+                yield build_source_footer(small.last_docs)
+                return
+            small_time = small.last_stats["prefill_time"] + small.last_stats["decode_time"]
+            logging.info(f"Escalating to the large model after {small_time:.1f}s: {escalated}")
+
+        large = self.tier("large")
+        yield from large.generate_stream(query, context_docs, previous=previous, keep_turn=keep_turn)
+        self.last_turn = large.last_turn
+        self.last_docs = large.last_docs
+        self.last_stats = {**large.last_stats, "tier": "large", "escalated": escalated,
+                           "small_tier_time": small_time, "route_reasons": reasons}
+
+
+def create_generator(n_threads: int = None):
+    """The generator a scheduler worker owns: a two-tier cascade if enabled, else the single model."""
+    if config.MODEL_CASCADE:
+        return CascadeGenerator(n_threads=n_threads)
+    return LocalLLMGenerator(n_threads=n_threads)
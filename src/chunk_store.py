@@ -0,0 +1,143 @@
+import os
+import json
+import mmap
+import logging
+from typing import Dict, Iterable, Iterator, Optional, Tuple
+import numpy as np
+import faiss
+from langchain_core.documents import Document
+
+INDEX_FILE = "index.faiss"
+TEXT_FILE = "chunks.text"
+META_FILE = "chunks.meta"
+OFFSETS_FILE = "chunks.offsets.npy"
+
+
+def _map_file(path: str):
+    """Read-only memory map of a file (None for an empty file, which cannot be mapped)."""
+    with open(path, "rb") as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return None
+        return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+
+class ChunkStore:
+    """
+    Chunk text and metadata stored column-wise next to the FAISS index, in row order.
+
+    chunks.text holds the UTF-8 text of every chunk back to back, chunks.meta the
+    JSON record ({"id", "metadata"}) of every chunk, and chunks.offsets.npy the
+    (n + 1) x 2 start offsets into both. All three are memory-mapped, so opening
+    the store is O(1), a chunk is decoded only when its row is requested, and
+    several processes share the same pages. Replaces the pickled docstore.
+    """
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        self.offsets = np.load(os.path.join(directory, OFFSETS_FILE), mmap_mode="r")
+        self._text = _map_file(os.path.join(directory, TEXT_FILE))
+        self._meta = _map_file(os.path.join(directory, META_FILE))
+
+    def __len__(self) -> int:
+        return len(self.offsets) - 1
+
+    @staticmethod
+    def exists(directory: str) -> bool:
+        return all(os.path.exists(os.path.join(directory, name)) for name in (TEXT_FILE, META_FILE, OFFSETS_FILE))
+
+    def _record(self, row: int) -> Tuple[str, Dict]:
+        (text_start, meta_start), (text_end, meta_end) = self.offsets[row], self.offsets[row + 1]
+        text = self._text[text_start:text_end].decode("utf-8") if self._text else ""
+        record = json.loads(self._meta[meta_start:meta_end].decode("utf-8"))
+        return text, record
+
+    def get(self, row: int) -> Document:
+        text, record = self._record(row)
+        return Document(page_content=text, metadata=record["metadata"])
+
+    def get_id(self, row: int) -> str:
+        return self._record(row)[1]["id"]
+
+    def close(self):
+        """Unmaps the files (needed on Windows before they can be replaced or deleted)."""
+        for mapped in (self._text, self._meta):
+            if mapped is not None:
+                mapped.close()
+        self._text = self._meta = None
+        self.offsets = np.zeros((1, 2), dtype=np.uint64)
+
+    def __iter__(self) -> Iterator[Tuple[str, Document]]:
+        """(chunk_id, Document) for every row, in order."""
+        for row in range(len(self)):
+            text, record = self._record(row)
+            yield record["id"], Document(page_content=text, metadata=record["metadata"])
+
+    @staticmethod
+    def write(directory: str, items: Iterable[Tuple[str, Document]]):
+        """
+        Writes (chunk_id, Document) pairs in row order, streaming to temporary
+        files that replace the previous store only once complete.
+        """
+        os.makedirs(directory, exist_ok=True)
+        paths = {name: os.path.join(directory, name) for name in (TEXT_FILE, META_FILE, OFFSETS_FILE)}
+        offsets = [(0, 0)]
+        with open(paths[TEXT_FILE] + ".tmp", "wb") as text_f, open(paths[META_FILE] + ".tmp", "wb") as meta_f:
+            for chunk_id, doc in items:
+                text_f.write(doc.page_content.encode("utf-8"))
+                meta_f.write(json.dumps({"id": chunk_id, "metadata": doc.metadata}, ensure_ascii=False).encode("utf-8"))
+                offsets.append((text_f.tell(), meta_f.tell()))
+        with open(paths[OFFSETS_FILE] + ".tmp", "wb") as f:
+            np.save(f, np.asarray(offsets, dtype=np.uint64))
+        for path in paths.values():
+            os.replace(path + ".tmp", path)
+
+
+def write_index(directory: str, index: faiss.Index):
+    os.makedirs(directory, exist_ok=True)
+    tmp_path = os.path.join(directory, INDEX_FILE + ".tmp")
+    faiss.write_index(index, tmp_path)
+    os.replace(tmp_path, os.path.join(directory, INDEX_FILE))
+
+
+def read_index(directory: str, mmap_index: bool = True) -> faiss.Index:
+    """
+    Reads the FAISS index, memory-mapped where the index type supports it.
+    IO_FLAG_MMAP only maps the inverted lists of IVF indexes; flat vectors (the
+    default "flat" type, and HNSW's storage) are only mapped by IO_FLAG_MMAP_IFC.
+    faiss builds without that flag copy them into RAM.
+    """
+    path = os.path.join(directory, INDEX_FILE)
+    if mmap_index:
+        flag = getattr(faiss, "IO_FLAG_MMAP_IFC", faiss.IO_FLAG_MMAP)
+        try:
+            return faiss.read_index(path, flag | faiss.IO_FLAG_READ_ONLY)
+        except RuntimeError as e:
+            logging.info(f"Index type cannot be memory-mapped ({e}); reading it into memory.")
+    return faiss.read_index(path)
+
+
+class MappedVectorStore:
+    """Read-only FAISS index plus ChunkStore, looked up by row ID. Used at query time."""
+
+    def __init__(self, index: faiss.Index, chunks: ChunkStore):
+        self.index = index
+        self.chunks = chunks
+
+    @classmethod
+    def load(cls, directory: str) -> Optional["MappedVectorStore"]:
+        if not os.path.exists(os.path.join(directory, INDEX_FILE)):
+            return None
+        if not ChunkStore.exists(directory):
+            logging.error(
+                f"Vector DB at {directory} uses the old pickled docstore. "
+                "Re-run `python src/ingestion.py --rebuild` to convert it."
+            )
+            return None
+        store = cls(read_index(directory), ChunkStore(directory))
+        if store.index.ntotal != len(store.chunks):
+            logging.error(f"Vector DB at {directory} is inconsistent ({store.index.ntotal} vectors, {len(store.chunks)} chunks).")
+            return None
+        return store
+
+    def doc(self, row: int) -> Document:
+        return self.chunks.get(row)
@@ -0,0 +1,117 @@
+from typing import Callable, Dict, List, Tuple
+from langchain_core.documents import Document
+from src.sparse_index import tokenize
+import config
+
+
+def format_context(docs: List[Document]) -> str:
+    """Context block of the prompt: each chunk under a [Source: name, Page: n] header."""
+    # We keep the source in context so the model knows THEM, but we tell it not to print them.
+    return "\n\n".join([
+        f"[Source: {d.metadata.get('source', 'Unknown').replace('.pdf', '')}, Page: {d.metadata.get('page', 'Unknown')}]\n{d.page_content}"
+        for d in docs
+    ])
+
+
+def _overlap(left: str, right: str, min_chars: int = 20) -> int:
+    """Length of the longest suffix of `left` that is a prefix of `right` (0 if under `min_chars`)."""
+    longest = min(len(left), len(right), 4 * config.CHUNK_OVERLAP)
+    for size in range(longest, min_chars - 1, -1):
+        if left.endswith(right[:size]):
+            return size
+    return 0
+
+
+def _shingles(text: str) -> set:
+    tokens = tokenize(text)
+    return {tuple(tokens[i:i + 3]) for i in range(max(1, len(tokens) - 2))}
+
+
+def merge_adjacent(docs: List[Document]) -> Tuple[List[Document], int]:
+    """
+    Joins chunks of the same source and page whose texts overlap (the splitter
+    repeats up to CHUNK_OVERLAP characters between neighbours), keeping the
+    retrieval rank and metadata of the better chunk. Returns the documents and merge count.
+    """
+    merged: List[Document] = []
+    count = 0
+    for doc in docs:
+        key = (doc.metadata.get("source"), doc.metadata.get("page"))
+        for i, kept in enumerate(merged):
+            if (kept.metadata.get("source"), kept.metadata.get("page")) != key:
+                continue
+            if doc.page_content in kept.page_content:
+                text = kept.page_content
+            elif kept.page_content in doc.page_content:
+                text = doc.page_content
+            elif _overlap(kept.page_content, doc.page_content):
+                text = kept.page_content + doc.page_content[_overlap(kept.page_content, doc.page_content):]
+            elif _overlap(doc.page_content, kept.page_content):
+                text = doc.page_content + kept.page_content[_overlap(doc.page_content, kept.page_content):]
+            else:
+                continue
+            # Same source and page; any other fields of either chunk are kept (the better-ranked one's win)
+            merged[i] = Document(page_content=text, metadata={**doc.metadata, **kept.metadata})
+            count += 1
+            break
+        else:
+            merged.append(doc)
+    return merged, count
+
+
+def drop_near_duplicates(docs: List[Document], threshold: float = config.CONTEXT_DEDUP_THRESHOLD) -> Tuple[List[Document], int]:
+    """
+    Drops chunks whose word trigrams are, to at least `threshold`, already
+    contained in a better-ranked chunk (covers copies and chunks repeated
+    inside a merged neighbour).
+    """
+    kept, kept_shingles = [], []
+    for doc in docs:
+        shingles = _shingles(doc.page_content)
+        if any(len(shingles & other) / (len(shingles) or 1) >= threshold for other in kept_shingles):
+            continue
+        kept.append(doc)
+        kept_shingles.append(shingles)
+    return kept, len(docs) - len(kept)
+
+
+def pack_context(docs: List[Document], count_tokens: Callable[[str], int], budget: int) -> Tuple[List[Document], Dict]:
+    """
+    Context assembly between retrieval and generation: merges overlapping
+    neighbours, drops near-duplicates, then keeps chunks in retrieval order
+    while the formatted context fits in `budget` tokens (as counted by the
+    model's tokenizer). The best chunk is always kept, truncated if it alone
+    exceeds the budget.
+    Returns the packed documents and a report of what was saved.
+    """
+    tokens_before = count_tokens(format_context(docs)) if docs else 0
+    merged, n_merged = merge_adjacent(docs)
+    unique, n_duplicates = drop_near_duplicates(merged)
+
+    packed: List[Document] = [_truncate(unique[0], count_tokens, budget)] if unique else []
+    for doc in unique[1:]:
+        if count_tokens(format_context(packed + [doc])) <= budget:
+            packed.append(doc)
+
+    tokens_after = count_tokens(format_context(packed)) if packed else 0
+    return packed, {
+        "chunks_in": len(docs),
+        "chunks_out": len(packed),
+        "merged": n_merged,
+        "duplicates_dropped": n_duplicates,
+        "over_budget_dropped": len(unique) - len(packed),
+        "tokens_before": tokens_before,
+        "tokens_after": tokens_after,
+        "tokens_saved": tokens_before - tokens_after,
+        "budget": budget
+    }
+
+
+def _truncate(doc: Document, count_tokens: Callable[[str], int], budget: int) -> Document:
+    """`doc` with its text cut until the formatted chunk fits in `budget` tokens (unchanged if it already fits)."""
+    text = doc.page_content
+    while text and count_tokens(format_context([Document(page_content=text, metadata=doc.metadata)])) > budget:
+        text = text[:int(len(text) * 0.9)]
+    if text == doc.page_content:
+        return doc
+    return Document(page_content=text, metadata=doc.metadata)
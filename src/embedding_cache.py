@@ -0,0 +1,243 @@
+import os
+import re
+import json
+import hashlib
+import logging
+import threading
+import unicodedata
+from collections import OrderedDict
+from typing import List, Dict, Optional
+import numpy as np
+from langchain_core.embeddings import Embeddings
+from langchain_community.embeddings import HuggingFaceEmbeddings
+from src import telemetry
+import config
+
+KEY_BYTES = 16
+
+
+def normalize_text(text: str) -> str:
+    """Unicode NFC plus collapsed whitespace, so trivially different copies share a key."""
+    return re.sub(r"\s+", " ", unicodedata.normalize("NFC", text)).strip()
+
+
+class CachedEmbeddings(Embeddings):
+    """
+    Content-addressed embedding cache in front of an embeddings model.
+
+    Vectors are keyed by (model name, hash of the normalised text) and persisted
+    in a flat float32 file that is memory-mapped for reads, with a parallel file
+    of 16-byte keys giving the row order. Only cache misses reach the model, and
+    they are encoded in one batch per call. Queries additionally go through an
+    in-memory LRU.
+
+    The persistent store has a single writer (ingestion). Readers such as the
+    retriever open it with read_only=True and keep new query vectors in the LRU only.
+    The key -> row map is built on the first document lookup, so a read-only
+    instance that only embeds queries never reads the keys file.
+    """
+
+    def __init__(self, base: Embeddings, model_name: str, cache_dir: str = config.EMBEDDING_CACHE_DIR,
+                 read_only: bool = False, lru_size: int = config.QUERY_CACHE_SIZE):
+        self.base = base
+        self.model_name = model_name
+        self.read_only = read_only
+        self.lru_size = lru_size
+        self.dir = os.path.join(cache_dir, re.sub(r"[^A-Za-z0-9_.-]+", "_", model_name))
+        self.vectors_path = os.path.join(self.dir, "vectors.f32")
+        self.keys_path = os.path.join(self.dir, "keys.bin")
+        self.meta_path = os.path.join(self.dir, "meta.json")
+
+        self.stats = {"hits": 0, "misses": 0, "query_hits": 0, "query_misses": 0}
+        self._lock = threading.Lock()
+        self._lru = OrderedDict()
+        self._rows: Optional[Dict[bytes, int]] = None
+        self._n_rows = 0
+        self._dim: Optional[int] = None
+        self._mmap = None
+        self._load()
+
+    def _load(self):
+        if not os.path.exists(self.meta_path):
+            return
+        try:
+            with open(self.meta_path, "r", encoding="utf-8") as f:
+                self._dim = json.load(f)["dim"]
+            keys_size = os.path.getsize(self.keys_path)
+        except (OSError, ValueError, KeyError) as e:
+            logging.warning(f"Ignoring unreadable embedding cache {self.dir}: {e}")
+            self._dim = None
+            return
+
+        # Vectors are written before keys, so a torn append leaves extra vectors (or a partial key)
+        vectors_size = os.path.getsize(self.vectors_path) if os.path.exists(self.vectors_path) else 0
+        n_rows = min(keys_size // KEY_BYTES, vectors_size // (4 * self._dim))
+        if not self.read_only and (keys_size != n_rows * KEY_BYTES or vectors_size != n_rows * 4 * self._dim):
+            # Appends go to the end of both files, so the torn tail must go before row n_rows is written
+            logging.warning(f"Embedding cache {self.dir}: dropping a partial append after row {n_rows}")
+            with open(self.keys_path, "r+b") as f:
+                f.truncate(n_rows * KEY_BYTES)
+            with open(self.vectors_path, "r+b") as f:
+                f.truncate(n_rows * 4 * self._dim)
+        self._n_rows = n_rows
+        logging.info(f"Embedding cache: {n_rows} vectors in {self.dir}")
+
+    def _row_index(self) -> Dict[bytes, int]:
+        """Key -> row map over the persisted rows, read from the keys file on first use."""
+        if self._rows is None:
+            keys = b""
+            if self._n_rows:
+                with open(self.keys_path, "rb") as f:
+                    keys = f.read(self._n_rows * KEY_BYTES)
+            self._n_rows = len(keys) // KEY_BYTES
+            self._rows = {keys[i * KEY_BYTES:(i + 1) * KEY_BYTES]: i for i in range(self._n_rows)}
+        return self._rows
+
+    def _vectors(self) -> np.ndarray:
+        """Memory-mapped view of the persisted vectors, reopened after appends."""
+        if self._mmap is None or len(self._mmap) < self._n_rows:
+            self._mmap = np.memmap(self.vectors_path, dtype=np.float32, mode="r", shape=(self._n_rows, self._dim))
+        return self._mmap
+
+    def key(self, text: str) -> bytes:
+        payload = f"{self.model_name}\0{normalize_text(text)}".encode("utf-8")
+        return hashlib.blake2b(payload, digest_size=KEY_BYTES).digest()
+
+    def _lookup(self, key: bytes) -> Optional[np.ndarray]:
+        row = self._row_index().get(key)
+        if row is None:
+            return None
+        return np.array(self._vectors()[row])
+
+    def _append(self, keys: List[bytes], vectors: np.ndarray):
+        """Persists new vectors. Called with the lock held."""
+        # Another thread may have stored some of them while these were being encoded
+        rows = self._row_index()
+        new = [i for i, key in enumerate(keys) if key not in rows]
+        if self.read_only or not new:
+            return
+        keys, vectors = [keys[i] for i in new], vectors[new]
+        os.makedirs(self.dir, exist_ok=True)
+        if self._dim is None:
+            self._dim = vectors.shape[1]
+            with open(self.meta_path, "w", encoding="utf-8") as f:
+                json.dump({"model_name": self.model_name, "dim": self._dim}, f)
+        with open(self.vectors_path, "ab") as f:
+            f.write(np.ascontiguousarray(vectors, dtype=np.float32).tobytes())
+        with open(self.keys_path, "ab") as f:
+            f.write(b"".join(keys))
+        for i, key in enumerate(keys):
+            rows[key] = self._n_rows + i
+        self._n_rows += len(keys)
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        """
+        Returns cached vectors where possible and encodes all misses in a single
+        batch. The model runs outside the lock, so concurrent callers encode in parallel.
+        """
+        keys = [self.key(t) for t in texts]
+        found = {}
+        misses = {}
+        with self._lock:
+            for key, text in zip(keys, texts):
+                if key in found or key in misses:
+                    continue
+                vector = self._lookup(key)
+                if vector is None:
+                    misses[key] = text
+                else:
+                    found[key] = vector
+            self.stats["hits"] += len(texts) - len(misses)
+            self.stats["misses"] += len(misses)
+
+        if misses:
+            miss_keys = list(misses)
+            encoded = np.asarray(self.base.embed_documents([misses[k] for k in miss_keys]), dtype=np.float32)
+            with self._lock:
+                self._append(miss_keys, encoded)
+            found.update(zip(miss_keys, encoded))
+
+        return [found[key].tolist() for key in keys]
+
+    def embed_query(self, text: str) -> List[float]:
+        """Embeds a query through the in-memory LRU, then (writers only) the persisted store, then the model."""
+        return self.embed_queries([text])[0]
+
+    def embed_queries(self, texts: List[str]) -> List[List[float]]:
+        """
+        Batched embed_query: LRU hits are served from cache and all remaining
+        queries are encoded in a single forward pass (outside the lock). Writers
+        also check the persisted store; read-only instances skip it, since it holds
+        chunk texts that queries rarely repeat and would cost the key map at startup.
+        """
+        keys = [self.key(t) for t in texts]
+        found = {}
+        misses = {}
+        with self._lock:
+            for key, text in zip(keys, texts):
+                if key in found or key in misses:
+                    continue
+                vector = self._lru.get(key)
+                if vector is None and not self.read_only:
+                    vector = self._lookup(key)
+                if vector is None:
+                    misses[key] = text
+                else:
+                    found[key] = vector
+            self.stats["query_hits"] += len(texts) - len(misses)
+            self.stats["query_misses"] += len(misses)
+        telemetry.count("cache_requests_total", len(texts) - len(misses), cache="query_embedding", result="hit")
+        telemetry.count("cache_requests_total", len(misses), cache="query_embedding", result="miss")
+
+        if misses:
+            miss_keys = list(misses)
+            encoded = np.asarray(self.base.embed_documents([misses[k] for k in miss_keys]), dtype=np.float32)
+            found.update(zip(miss_keys, encoded))
+
+        with self._lock:
+            for key in keys:
+                self._lru[key] = found[key]
+                self._lru.move_to_end(key)
+            while len(self._lru) > self.lru_size:
+                self._lru.popitem(last=False)
+            return [found[key].tolist() for key in keys]
+
+    def hit_rate(self) -> Dict[str, float]:
+        docs = self.stats["hits"] + self.stats["misses"]
+        queries = self.stats["query_hits"] + self.stats["query_misses"]
+        return {
+            "documents": self.stats["hits"] / docs if docs else 0.0,
+            "queries": self.stats["query_hits"] / queries if queries else 0.0
+        }
+
+    def log_stats(self):
+        rates = self.hit_rate()
+        logging.info(
+            f"Embedding cache: documents {self.stats['hits']} hits / {self.stats['misses']} misses "
+            f"({rates['documents']:.1%}), queries {self.stats['query_hits']} hits / "
+            f"{self.stats['query_misses']} misses ({rates['queries']:.1%})"
+        )
+
+
+def get_embeddings(read_only: bool = False) -> CachedEmbeddings:
+    """The embeddings model used by both ingestion and retrieval, behind the shared cache."""
+    if config.EMBEDDING_BACKEND == "fake":
+        from src.fake_backends import FakeEmbeddings
+        return CachedEmbeddings(FakeEmbeddings(), "fake-embeddings", read_only=read_only)
+    base = HuggingFaceEmbeddings(model_name=config.EMBEDDING_MODEL_NAME)
+    return CachedEmbeddings(base, config.EMBEDDING_MODEL_NAME, read_only=read_only)
+
+
+def get_query_embeddings() -> CachedEmbeddings:
+    """
+    The retriever's embeddings: read-only over the shared cache, with queries
+    encoded by config.QUERY_ENCODER. The int8 encoder shares the cache keys of
+    the PyTorch model, whose vectors it approximates.
+    """
+    if config.QUERY_ENCODER == "onnx_int8" and config.EMBEDDING_BACKEND != "fake":
+        if os.path.exists(config.ONNX_ENCODER_PATH):
+            from src.onnx_encoder import OnnxEmbeddings
+            base = OnnxEmbeddings(config.ONNX_ENCODER_PATH, config.EMBEDDING_MODEL_NAME)
+            return CachedEmbeddings(base, config.EMBEDDING_MODEL_NAME, read_only=True)
+        logging.warning(f"ONNX query encoder not found at {config.ONNX_ENCODER_PATH} (run export_onnx_encoder.py); using the PyTorch model.")
+    return get_embeddings(read_only=True)
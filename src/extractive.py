@@ -0,0 +1,108 @@
+import re
+from typing import List, Dict, Optional
+from langchain_core.documents import Document
+from src.generation import build_source_footer
+from src.sparse_index import tokenize
+import config
+
+# Definitional question forms; the named group is the term being asked about
+DEFINITION_PATTERNS = [
+    re.compile(r"^\s*(?:what\s+(?:is|are)\s+(?:meant\s+by\s+)?|what\s+do\s+you\s+(?:mean|understand)\s+by\s+|define\s+|state\s+|give\s+the\s+definition\s+of\s+)"
+               r"(?:the\s+)?(?:terms?\s+)?(?:an?\s+)?(?P<term>[^?.]+?)\s*[?.]?\s*$", re.IGNORECASE),
+    re.compile(r"^\s*(?P<term>[^?।]+?)\s+(?:क्या\s+(?:है|हैं|होता\s+है|होती\s+है)|किसे\s+कहते\s+हैं|की\s+परिभाषा\s+(?:दीजिए|लिखिए))\s*[?।]?\s*$"),
+]
+
+# "What is the difference between ...", "What are the causes of ..." need more than one sentence
+NOT_DEFINITIONS = re.compile(
+    r"^(?:differences?|relation(?:ship)?|role|importance|significance|causes?|effects?|advantages?|disadvantages?|"
+    r"functions?|types?|uses?|steps?|process|reasons?|features?|characteristics?)\b",
+    re.IGNORECASE
+)
+
+# Phrases that introduce a definition or a law in textbook prose. A bare "is a" or
+# "means" also opens ordinary descriptions ("Power is the reason ..."), so it is not enough.
+DEFINITION_CUES = re.compile(
+    r"\b(?:is|are)\s+(?:called|known\s+as|defined\s+as|termed)\b|\brefers?\s+to\b|\bstates?\s+that\b|"
+    r"कहते\s+हैं|कहलाता|कहलाती|कहलाते|परिभाषित",
+    re.IGNORECASE
+)
+
+# Follow-on sentences worth keeping with the definition ("Its SI unit is the watt.")
+FOLLOW_ON = re.compile(r"^\s*(?:its|the)\s+(?:s\.?i\.?\s+)?unit\b|^\s*it\s+is\s+(?:denoted|measured|expressed)\b|मात्रक", re.IGNORECASE)
+
+SENTENCE_SPLIT = re.compile(r"(?<=[.!?।])\s+|\n+")
+
+
+def definition_term(query: str) -> Optional[str]:
+    """The term a simple definitional question asks about ("State Ohm's law" -> "Ohm's law"), else None."""
+    for pattern in DEFINITION_PATTERNS:
+        match = pattern.match(query)
+        if match:
+            # "Define power and its unit" asks about "power"
+            term = re.split(r"\s+(?:and|with)\s+(?:its|their|the)\b", match.group("term"), flags=re.IGNORECASE)[0]
+            term = term.strip(" \"'")
+            if term and len(tokenize(term)) <= 6 and not NOT_DEFINITIONS.match(term):
+                return term
+    return None
+
+
+def _sentences(text: str) -> List[str]:
+    return [s.strip() for s in SENTENCE_SPLIT.split(text) if s and s.strip()]
+
+
+def score_sentence(sentence: str, term_tokens: List[str], rank: int) -> float:
+    """
+    Confidence in [0, 1.5] that `sentence` defines the term: coverage of the
+    term's words, a definition cue, the term opening the sentence, and the
+    retrieval rank of its chunk.
+    """
+    tokens = tokenize(sentence)
+    if not tokens or not (8 <= len(sentence) <= config.EXTRACTIVE_MAX_CHARS):
+        return 0.0
+    coverage = sum(t in tokens for t in term_tokens) / len(term_tokens)
+    if coverage < 1.0:
+        return 0.0
+    score = 0.5
+    if DEFINITION_CUES.search(sentence):
+        score += 0.4
+    if tokens[:len(term_tokens)] == term_tokens or tokens[1:len(term_tokens) + 1] == term_tokens:
+        score += 0.3
+    return score + 0.3 / (1 + rank)
+
+
+def extractive_answer(query: str, docs: List[Document]) -> Optional[Dict]:
+    """
+    Answers a definitional question from the retrieved chunks without the LLM.
+    Only the top config.EXTRACTIVE_TOP_CHUNKS chunks are searched. Returns
+    {"answer", "score", "term"} when the best sentence scores at least
+    config.EXTRACTIVE_MIN_SCORE, otherwise None (the caller falls back to generation).
+    """
+    term = definition_term(query)
+    if not term or not docs:
+        return None
+    term_tokens = tokenize(term)
+    if not term_tokens:
+        return None
+
+    best = None
+    for rank, doc in enumerate(docs[:config.EXTRACTIVE_TOP_CHUNKS]):
+        sentences = _sentences(doc.page_content)
+        for i, sentence in enumerate(sentences):
+            score = score_sentence(sentence, term_tokens, rank)
+            if score and (best is None or score > best[0]):
+                best = (score, sentences, i, doc)
+    if best is None or best[0] < config.EXTRACTIVE_MIN_SCORE:
+        return None
+
+    score, sentences, i, doc = best
+    parts = [sentences[i]]
+    if i + 1 < len(sentences) and FOLLOW_ON.search(sentences[i + 1]):
+        parts.append(sentences[i + 1])
+    text = " ".join(parts)
+    # Bold the term, as the generator's formatting rules ask
+    text = re.sub(re.escape(term), lambda m: f"**{m.group(0)}**", text, count=1, flags=re.IGNORECASE)
+    return {
+        "answer": text + build_source_footer([doc]),
+        "score": score,
+        "term": term
+    }
@@ -0,0 +1,116 @@
+import re
+import time
+import hashlib
+from types import SimpleNamespace
+from typing import Dict, Iterator, List
+import numpy as np
+from langchain_core.embeddings import Embeddings
+import config
+
+# Words with their trailing whitespace, so detokenize(tokenize(x)) == x
+PIECE_PATTERN = re.compile(r"\S+\s*|\s+")
+SOURCE_HEADER = re.compile(r"\[Source:[^\]]*\]")
+
+
+class FakeEmbeddings(Embeddings):
+    """
+    Deterministic stand-in for the sentence-transformer: each text maps to a unit
+    vector seeded by its hash. Costs microseconds, so benchmarks measure the
+    pipeline around the model rather than the model.
+    """
+
+    def __init__(self, dim: int = config.FAKE_EMBEDDING_DIM):
+        self.dim = dim
+
+    def _vector(self, text: str) -> List[float]:
+        seed = int.from_bytes(hashlib.blake2b(text.encode("utf-8"), digest_size=8).digest(), "little")
+        vector = np.random.default_rng(seed).standard_normal(self.dim).astype(np.float32)
+        return (vector / np.linalg.norm(vector)).tolist()
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return [self._vector(text) for text in texts]
+
+    def embed_query(self, text: str) -> List[float]:
+        return self._vector(text)
+
+
+class FakeLlama:
+    """
+    Stand-in for llama_cpp.Llama with the subset of its interface the generator
+    uses (tokenize, streamed completions, eval and save/load_state).
+
+    Tokens are whitespace-delimited pieces with hash-derived IDs (stable across
+    processes, so the persisted prefix state stays valid). Prefill sleeps per prompt token not
+    already in the KV state (longest common prefix, as llama.cpp does) and decode
+    sleeps per generated token, at the FAKE_LLM_* rates. The "answer" is the
+    start of the context block, so citation stripping and footers still apply.
+    """
+
+    _pieces: Dict[int, str] = {}
+    BOS, EOS = 1, 2
+
+    def __init__(self, n_ctx: int = config.CONTEXT_WINDOW):
+        self._n_ctx = n_ctx
+        self.context_params = SimpleNamespace(logits_all=False)
+        self.input_ids: List[int] = []
+
+    @property
+    def n_tokens(self) -> int:
+        return len(self.input_ids)
+
+    def n_ctx(self) -> int:
+        return self._n_ctx
+
+    def token_eos(self) -> int:
+        return self.EOS
+
+    def tokenize(self, text: bytes, add_bos: bool = True, special: bool = False) -> List[int]:
+        tokens = [self.BOS] if add_bos else []
+        for piece in PIECE_PATTERN.findall(text.decode("utf-8", errors="ignore")):
+            token = int.from_bytes(hashlib.blake2b(piece.encode("utf-8"), digest_size=6).digest(), "little") + self.EOS + 1
+            self._pieces[token] = piece
+            tokens.append(token)
+        return tokens
+
+    def detokenize(self, tokens: List[int]) -> bytes:
+        return "".join(self._pieces.get(t, "") for t in tokens).encode("utf-8")
+
+    def reset(self):
+        self.input_ids = []
+
+    def eval(self, tokens: List[int]):
+        time.sleep(len(tokens) * config.FAKE_LLM_PREFILL_MS / 1000)
+        self.input_ids.extend(tokens)
+
+    def save_state(self):
+        return {"input_ids": list(self.input_ids)}
+
+    def load_state(self, state):
+        self.input_ids = list(state["input_ids"])
+
+    def __call__(self, prompt, max_tokens: int = 16, stream: bool = False, **kwargs) -> Iterator[Dict]:
+        tokens = prompt if isinstance(prompt, list) else self.tokenize(prompt.encode("utf-8"))
+        common = 0
+        for a, b in zip(self.input_ids, tokens):
+            if a != b:
+                break
+            common += 1
+        self.input_ids = self.input_ids[:common]
+        self.eval(tokens[common:])
+
+        text = self.detokenize(tokens).decode("utf-8")
+        context = text.split("**Context:**", 1)[-1].split("**Question:**", 1)[0]
+        answer = self.tokenize(SOURCE_HEADER.sub("", context).strip().encode("utf-8"), add_bos=False)
+        answer = answer[:min(max_tokens, config.FAKE_LLM_ANSWER_TOKENS)]
+        if not answer:
+            answer = self.tokenize(b"I don't know.", add_bos=False)
+        return self._stream(answer, max_tokens)
+
+    def _stream(self, answer: List[int], max_tokens: int) -> Iterator[Dict]:
+        for i, token in enumerate(answer):
+            time.sleep(config.FAKE_LLM_DECODE_MS / 1000)
+            self.input_ids.append(token)
+            finish = None
+            if i == len(answer) - 1:
+                finish = "length" if len(answer) >= max_tokens else "stop"
+            yield {"choices": [{"text": self.detokenize([token]).decode("utf-8"), "finish_reason": finish}]}
@@ -1,49 +1,56 @@
 import logging
 import os
 import re
-from llama_cpp import Llama
+import time
+from typing import Iterator, List, Optional, Tuple
+from src.backends import load_backend
+from src.prompt_cache import PrefixStateCache
+from src import telemetry
+from src.context import format_context, pack_context
 import config
 
 logging.basicConfig(level=logging.INFO)
 
-class LocalLLMGenerator:
-    def __init__(self):
-        self.llm = self._load_model()
+# Post-Processing: Super Aggressive Removal
+CITATION_PATTERNS = [
+    # 1. Remove standard (Source: ...)
+    re.compile(r'\s*[\(\[]\s*Source:.*?[\)\]]', flags=re.IGNORECASE),
+    # 2. Remove (Filename.pdf, Page: X) patterns
+    re.compile(r'\s*[\(\[]\s*[a-zA-Z0-9_]+\.pdf.*?[\)\]]', flags=re.IGNORECASE),
+    # 3. Remove (ClassX_..., Page: X) patterns
+    re.compile(r'\s*[\(\[]\s*Class\d+.*?[\)\]]', flags=re.IGNORECASE),
+    # 4. Remove standalone (Page: X)
+    re.compile(r'\s*[\(\[]\s*Page:.*?[\)\]]', flags=re.IGNORECASE),
+]
 
-    def _load_model(self):
-        """Loads the quantized GGUF model."""
-        if not os.path.exists(config.MODEL_PATH):
-            logging.error(f"Model file not found at {config.MODEL_PATH}. Please download it.")
-            return None
-        
-        try:
-            logging.info(f"Loading model from {config.MODEL_PATH}...")
-            return Llama(
-                model_path=config.MODEL_PATH,
-                n_ctx=config.CONTEXT_WINDOW,
-                n_threads=os.cpu_count() - 2, # Reserve some threads
-                verbose=False
-            )
-        except Exception as e:
-            logging.error(f"Failed to load model: {e}")
-            return None
 
-    def generate_answer(self, query: str, context_docs: list) -> str:
-        """
-        Generates an answer given the query and retrieved context.
-        """
-        if not self.llm:
-            return "Error: Language Model is not loaded."
-
-        # Format Context
-        # We keep the source in context so the model knows THEM, but we tell it not to print them.
-        context_text = "\n\n".join([
-            f"[Source: {d.metadata.get('source', 'Unknown').replace('.pdf', '')}, Page: {d.metadata.get('page', 'Unknown')}]\n{d.page_content}" 
-            for d in context_docs
-        ])
+def strip_citations(text: str) -> str:
+    for pattern in CITATION_PATTERNS:
+        text = pattern.sub('', text)
+    return text
+
+
+def build_source_footer(context_docs: list) -> str:
+    """Consolidate Sources for the Footer"""
+    unique_sources = {}
+    for doc in context_docs:
+        source_name = doc.metadata.get('source', 'Unknown').replace('.pdf', '')
+        page = doc.metadata.get('page', 'Unknown')
+        if source_name not in unique_sources:
+            unique_sources[source_name] = set()
+        unique_sources[source_name].add(str(page))
         
-        # Simplified Prompt - Remove conflicting instructions
-        prompt = f"""[INST] You are an intelligent NCERT Doubt Solver. 
+    source_footer = "\n\n**Source:**\n"
+    for name, pages in unique_sources.items():
+        sorted_pages = sorted(list(pages), key=lambda x: int(x) if x.isdigit() else x)
+        source_footer += f"- {name} (Page: {', '.join(sorted_pages)})\n"
+    return source_footer
+
+
+# Simplified Prompt - Remove conflicting instructions
+# Everything up to the context is the same for every request, so its llama.cpp
+# state is evaluated once and restored (see src.prompt_cache).
+PROMPT_PREFIX = """[INST] You are an intelligent NCERT Doubt Solver. 
 Goal: Answer the student's question clearly and accurately based ONLY on the provided context.
 
 **Formatting Rules (Match this style):**
@@ -60,46 +67,287 @@ Goal: Answer the student's question clearly and accurately based ONLY on the pro
 4. **No Citations**: Do NOT include source names or page numbers in the text.
 
 **Context:**
-{context_text}
+"""
+
+
+class CitationFilter:
+    """
+    Applies the citation regexes to a token stream.
+
+    Every pattern is optional whitespace, an opening bracket and text up to the
+    first closing bracket on the same line. Text is emitted as soon as it cannot
+    be part of such a match: trailing whitespace and anything from an unclosed
+    bracket are held back until the bracket closes (or the line ends), and the
+    held segment is then cleaned with the same regexes as a full answer.
+    """
+
+    def __init__(self):
+        self.buffer = ""
+        self.started = False
+
+    def feed(self, text: str) -> str:
+        self.buffer += text
+        out = []
+        while True:
+            bracket = re.search(r'[\(\[]', self.buffer)
+            if not bracket:
+                safe = self.buffer.rstrip()
+                out.append(safe)
+                self.buffer = self.buffer[len(safe):]
+                break
+            # Whitespace right before the bracket belongs to the possible citation
+            head = self.buffer[:bracket.start()].rstrip()
+            out.append(head)
+            close = re.search(r'[\)\]\n]', self.buffer[bracket.end():])
+            if not close:
+                self.buffer = self.buffer[len(head):]
+                break
+            end = bracket.end() + close.end()
+            out.append(strip_citations(self.buffer[len(head):end]))
+            self.buffer = self.buffer[end:]
+        return self._emit("".join(out))
+
+    def finish(self) -> str:
+        text = self._emit(strip_citations(self.buffer)).rstrip()
+        self.buffer = ""
+        return text
+
+    def _emit(self, text: str) -> str:
+        # Matches the .strip() of the complete answer
+        if not self.started:
+            text = text.lstrip()
+            self.started = bool(text)
+        return text
+
+
+class LocalLLMGenerator:
+    def __init__(self, n_threads: int = None, model_path: str = config.MODEL_PATH):
+        self.model_path = model_path
+        self.n_threads = n_threads or config.LLM_THREADS or os.cpu_count() - 2 # Reserve some threads
+        self.draft_model = None
+        self.llm = self._load_model()
+        self.last_stats = {}
+        self.last_turn = None
+        # Chunks in the last prompt (after context packing); the answer's sources
+        self.last_docs = []
+        self.prefix_cache = None
+        # A llama.cpp server keeps its own prompt cache (cache_prompt)
+        if self.llm and config.PROMPT_PREFIX_CACHE and config.LLM_BACKEND != "server":
+            self.prefix_cache = PrefixStateCache(self.llm, self.model_path, PROMPT_PREFIX, config.PROMPT_CACHE_DIR)
+            self.prefix_cache.load_or_build()
+
+    def _load_model(self):
+        """Loads the generation backend chosen by config.LLM_BACKEND (see src/backends.py)."""
+        if config.LLM_BACKEND == "fake":
+            # Keeps the fake's persisted prefix state apart from the real model's
+            self.model_path = f"fake-{os.path.basename(self.model_path)}"
+        llm, self.draft_model = load_backend(config.LLM_BACKEND, self.model_path, self.n_threads)
+        return llm
+
+    def build_prompt(self, query: str, context_docs: list) -> str:
+        return PROMPT_PREFIX + f"""{format_context(context_docs)}
 
 **Question:** {query}
 [/INST]"""
 
-        output = self.llm(
-            prompt,
+    def count_tokens(self, text: str) -> int:
+        return len(self.llm.tokenize(text.encode("utf-8"), add_bos=False))
+
+    def context_budget(self, query: str) -> int:
+        """Tokens left for the context once the instructions, question and answer are accounted for."""
+        fixed = len(self.llm.tokenize(self.build_prompt(query, []).encode("utf-8"), add_bos=True))
+        return config.CONTEXT_WINDOW - config.MAX_NEW_TOKENS - config.CONTEXT_TOKEN_MARGIN - fixed
+
+    def generate_answer(self, query: str, context_docs: list) -> str:
+        """
+        Generates an answer given the query and retrieved context.
+        """
+        return "".join(self.generate_stream(query, context_docs))
+
+    def follow_up_tokens(self, query: str, previous, extra_docs: list) -> Optional[Tuple[List[int], list]]:
+        """
+        Prompt for a follow-up that continues the previous turn's evaluated tokens
+        (its prompt and answer) with a new [INST] block holding only the question
+        and any chunks that were not in that prompt, plus the chunks that fit. None
+        if the conversation would no longer leave room for the answer.
+        """
+        if not previous.tokens or previous.model_path != self.model_path:
+            return None
+        room = config.CONTEXT_WINDOW - config.MAX_NEW_TOKENS - config.CONTEXT_TOKEN_MARGIN - len(previous.tokens)
+        turn = f"[INST] **Question:** {query}\n[/INST]"
+        if extra_docs:
+            budget = room - self.count_tokens(turn) - self.count_tokens("**Additional context:**\n\n\n")
+            extra_docs, _ = pack_context(extra_docs, self.count_tokens, budget)
+        if extra_docs:
+            turn = f"[INST] **Additional context:**\n{format_context(extra_docs)}\n\n**Question:** {query}\n[/INST]"
+        # The previous answer ended at end-of-sequence (parsed as the special token, unlike the user's text)
+        tokens = self.llm.tokenize(b"</s>", add_bos=False, special=True) + self.llm.tokenize(turn.encode("utf-8"), add_bos=False)
+        if len(tokens) > room:
+            return None
+        return previous.tokens + tokens, extra_docs
+
+    def _resident_tokens(self, prompt_tokens: List[int]) -> int:
+        """Leading prompt tokens already in the model's KV cache (in-process backends)."""
+        if not hasattr(self.llm, "input_ids"):
+            return 0
+        common = 0
+        for a, b in zip(self.llm.input_ids[:self.llm.n_tokens], prompt_tokens):
+            if a != b:
+                break
+            common += 1
+        return common
+
+    def generate_stream(self, query: str, context_docs: list, with_footer: bool = True,
+                        previous=None, keep_turn: bool = False) -> Iterator[str]:
+        """
+        Yields the answer as llama.cpp produces it, with inline citations stripped
+        on the fly, followed by the source footer (unless `with_footer` is False). Joined, the pieces equal
+        generate_answer's output. Token counts and prefill/decode times of the
+        last call are kept in self.last_stats.
+
+        With `previous` (a src.session.Turn of the same conversation) the prompt
+        extends that turn's tokens, and its saved state is restored, so only the
+        new question is prefilled. With `keep_turn` the evaluated tokens (and the
+        model state, in-process) are kept in self.last_turn for the next follow-up.
+        """
+        self.last_turn = None
+        self.last_docs = []
+        if not self.llm:
+            yield "Error: Language Model is not loaded."
+            return
+
+        prompt_tokens = None
+        if previous is not None:
+            seen = {doc.page_content for doc in previous.docs}
+            with telemetry.span("llm.prompt_build", follow_up=True):
+                follow_up = self.follow_up_tokens(query, previous, [d for d in context_docs if d.page_content not in seen])
+            if follow_up is not None:
+                prompt_tokens, extra_docs = follow_up
+                # The previous turn's chunks are already in the evaluated tokens
+                prompt_docs = list(previous.docs) + extra_docs
+                context_report = {"chunks_in": len(context_docs), "chunks_out": len(prompt_docs), "tokens_saved": 0}
+        if prompt_tokens is not None:
+            with telemetry.span("llm.prefix_restore", follow_up=True):
+                if previous.state is not None:
+                    self.llm.load_state(previous.state)
+                    reused = len(previous.tokens)
+                else:
+                    # State evicted: the worker may still hold it, else fall back to the instruction prefix
+                    reused = self._resident_tokens(prompt_tokens)
+                    if self.prefix_cache and reused < len(self.prefix_cache.tokens):
+                        reused = self.prefix_cache.restore(prompt_tokens)
+        else:
+            if previous is not None:
+                # Conversation too long to continue (or other model): a fresh prompt, with the topic spelled out
+                query = f"{query} (follow-up to: {previous.topic})"
+            with telemetry.span("llm.pack_context") as span:
+                packed_docs, context_report = pack_context(context_docs, self.count_tokens, self.context_budget(query))
+                span.set(chunks_in=context_report["chunks_in"], chunks_out=context_report["chunks_out"],
+                         tokens_saved=context_report["tokens_saved"])
+            prompt_docs = packed_docs
+            with telemetry.span("llm.prompt_build"):
+                prompt = self.build_prompt(query, packed_docs)
+                prompt_tokens = self.llm.tokenize(prompt.encode("utf-8"), add_bos=True)
+            with telemetry.span("llm.prefix_restore"):
+                reused = self.prefix_cache.restore(prompt_tokens) if self.prefix_cache else 0
+        self.last_stats = {
+            "prompt_tokens": len(prompt_tokens),
+            "prefix_tokens_reused": reused,
+            "completion_tokens": 0,
+            "prefill_time": 0.0,
+            "decode_time": 0.0,
+            "finish_reason": None,
+            "context": context_report
+        }
+        if self.draft_model:
+            self.draft_model.reset()
+
+        start = time.time()
+        first_token = None
+        stream = self.llm(
+            prompt_tokens,
             max_tokens=config.MAX_NEW_TOKENS,
             temperature=config.TEMPERATURE,
             stop=["</s>", "[/INST]"],
-            echo=False
+            echo=False,
+            stream=True
         )
-        
-        raw_answer = output['choices'][0]['text'].strip()
-
-        # Post-Processing: Super Aggressive Removal
-        # 1. Remove standard (Source: ...)
-        clean_answer = re.sub(r'\s*[\(\[]\s*Source:.*?[\)\]]', '', raw_answer, flags=re.IGNORECASE)
-        # 2. Remove (Filename.pdf, Page: X) patterns
-        clean_answer = re.sub(r'\s*[\(\[]\s*[a-zA-Z0-9_]+\.pdf.*?[\)\]]', '', clean_answer, flags=re.IGNORECASE)
-        # 3. Remove (ClassX_..., Page: X) patterns
-        clean_answer = re.sub(r'\s*[\(\[]\s*Class\d+.*?[\)\]]', '', clean_answer, flags=re.IGNORECASE)
-        # 4. Remove standalone (Page: X)
-        clean_answer = re.sub(r'\s*[\(\[]\s*Page:.*?[\)\]]', '', clean_answer, flags=re.IGNORECASE)
-        
-        # Consolidate Sources for the Footer
-        unique_sources = {}
-        for doc in context_docs:
-            source_name = doc.metadata.get('source', 'Unknown').replace('.pdf', '')
-            page = doc.metadata.get('page', 'Unknown')
-            if source_name not in unique_sources:
-                unique_sources[source_name] = set()
-            unique_sources[source_name].add(str(page))
-            
-        source_footer = "\n\n**Source:**\n"
-        for name, pages in unique_sources.items():
-            sorted_pages = sorted(list(pages), key=lambda x: int(x) if x.isdigit() else x)
-            source_footer += f"- {name} (Page: {', '.join(sorted_pages)})\n"
-            
-        return clean_answer + source_footer
+
+        citations = CitationFilter()
+        raw = []
+        postprocess_time = 0.0
+        for chunk in stream:
+            if first_token is None:
+                # The first token is sampled straight from the prefill logits
+                first_token = time.time()
+                self.last_stats["prefill_time"] = first_token - start
+            raw.append(chunk['choices'][0]['text'])
+            self.last_stats["finish_reason"] = chunk['choices'][0].get('finish_reason')
+            t0 = time.time()
+            text = citations.feed(chunk['choices'][0]['text'])
+            postprocess_time += time.time() - t0
+            if text:
+                yield text
+        text = citations.finish()
+        if text:
+            yield text
+
+        end = time.time()
+        if first_token is not None:
+            self.last_stats["decode_time"] = end - first_token
+        # Streamed completions carry no usage block; count with the model's own tokenizer
+        self.last_stats["completion_tokens"] = self.count_tokens("".join(raw)) if raw else 0
+        generation_time = self.last_stats["prefill_time"] + self.last_stats["decode_time"]
+        self.last_stats["tokens_per_sec"] = self.last_stats["completion_tokens"] / generation_time if generation_time > 0 else 0.0
+        if self.draft_model:
+            self.last_stats.update(self.draft_model.stats(self.last_stats["completion_tokens"]))
+
+        if first_token is not None:
+            telemetry.record("llm.prefill", start, first_token, tokens=len(prompt_tokens) - reused)
+            telemetry.record("llm.decode", first_token, end, tokens=self.last_stats["completion_tokens"])
+        # Citation stripping runs between tokens; recorded as its total time
+        telemetry.record("llm.postprocess", end - postprocess_time, end)
+        telemetry.count("tokens_total", len(prompt_tokens), kind="prompt")
+        telemetry.count("tokens_total", reused, kind="prefix_reused")
+        telemetry.count("tokens_total", self.last_stats["completion_tokens"], kind="completion")
+        if self.prefix_cache:
+            telemetry.count("cache_requests_total", cache="prompt_prefix", result="hit" if reused else "miss")
+        logging.info(
+            f"Context: {context_report['chunks_in']} -> {context_report['chunks_out']} chunks, "
+            f"{context_report['tokens_saved']} prompt tokens saved"
+        )
+        logging.info(
+            f"Generation: prefill {self.last_stats['prefill_time']:.2f}s for "
+            f"{len(prompt_tokens) - reused}/{len(prompt_tokens)} prompt tokens, "
+            f"decode {self.last_stats['decode_time']:.2f}s for {self.last_stats['completion_tokens']} tokens"
+        )
+
+        if keep_turn:
+            # A conversation that already had a follow-up is likely to get another; a first
+            # turn keeps only its tokens and relies on the worker's KV cache still holding them
+            self.last_turn = self._turn_state(prompt_tokens, "".join(raw), save_state=previous is not None)
+
+        # Cite only the chunks the model was given (packing may have dropped some)
+        self.last_docs = prompt_docs
+        if with_footer:
+            yield build_source_footer(prompt_docs)
+
+    def _turn_state(self, prompt_tokens: List[int], raw_answer: str, save_state: bool = False) -> dict:
+        """
+        Tokens the model has evaluated after answering, for a follow-up, plus (with
+        `save_state`, in-process) a copy of the model state. The copy holds the whole
+        KV cache and logits, so it is only made when it is likely to be reused.
+        """
+        if hasattr(self.llm, "input_ids"):
+            tokens = list(self.llm.input_ids[:self.llm.n_tokens])
+        else:
+            tokens = prompt_tokens + self.llm.tokenize(raw_answer.encode("utf-8"), add_bos=False)
+        state = None
+        # A llama.cpp server keeps the conversation in its own slot cache
+        if save_state and config.SESSION_STATE_BUDGET_MB > 0 and config.LLM_BACKEND != "server":
+            with telemetry.span("llm.save_state"):
+                state = self.llm.save_state()
+        return {"tokens": tokens, "state": state, "model_path": self.model_path}
 
 if __name__ == "__main__":
     # Test stub (requires model file)
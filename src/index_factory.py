@@ -0,0 +1,90 @@
+import math
+import logging
+from typing import Optional
+import numpy as np
+import faiss
+import config
+
+INDEX_TYPES = ["flat", "ivf_flat", "ivf_pq", "hnsw", "sq8", "sq_fp16"]
+
+# Types that need k-means / codebook training before vectors can be added
+TRAINED_TYPES = {"ivf_flat", "ivf_pq", "sq8", "sq_fp16"}
+
+
+def factory_string(index_type: str, n_vectors: int) -> str:
+    """FAISS index_factory description for an index type sized for `n_vectors`."""
+    # ~4*sqrt(n) lists, with enough training points per list (FAISS wants >= 39)
+    nlist = max(1, min(config.IVF_NLIST, int(4 * math.sqrt(max(n_vectors, 1))), n_vectors // 39))
+    return {
+        "flat": "Flat",
+        "ivf_flat": f"IVF{nlist},Flat",
+        "ivf_pq": f"IVF{nlist},PQ{config.PQ_M}x8",
+        "hnsw": f"HNSW{config.HNSW_M}",
+        "sq8": "SQ8",
+        "sq_fp16": "SQfp16",
+    }[index_type]
+
+
+def build_index(index_type: str, dim: int, n_vectors: int, train_sample: Optional[np.ndarray] = None) -> faiss.Index:
+    """
+    Creates an empty index of the given type, trained on `train_sample` if the type needs it.
+    IVF/PQ types fall back to a flat index when the corpus is too small to train them.
+    """
+    if index_type not in INDEX_TYPES:
+        raise ValueError(f"Unknown FAISS index type '{index_type}'. Choose one of {INDEX_TYPES}.")
+    if index_type in ("ivf_flat", "ivf_pq") and n_vectors < config.INDEX_MIN_TRAIN:
+        logging.warning(f"Only {n_vectors} vectors; too few to train {index_type}. Using a flat index.")
+        index_type = "flat"
+
+    index = faiss.index_factory(dim, factory_string(index_type, n_vectors), faiss.METRIC_L2)
+    if not index.is_trained:
+        if train_sample is None or len(train_sample) == 0:
+            raise ValueError(f"Index type '{index_type}' needs training vectors.")
+        logging.info(f"Training {index_type} index on {len(train_sample)} vectors...")
+        index.train(np.ascontiguousarray(train_sample, dtype=np.float32))
+    if index_type == "hnsw":
+        index.hnsw.efConstruction = config.HNSW_EF_CONSTRUCTION
+    configure_search(index)
+    return index
+
+
+def index_kind(index: faiss.Index) -> str:
+    """Inverse of build_index: which of INDEX_TYPES a loaded index is."""
+    index = faiss.downcast_index(index)
+    if isinstance(index, faiss.IndexHNSW):
+        return "hnsw"
+    if isinstance(index, faiss.IndexIVFPQ):
+        return "ivf_pq"
+    if isinstance(index, faiss.IndexIVFFlat):
+        return "ivf_flat"
+    if isinstance(index, faiss.IndexScalarQuantizer):
+        return "sq_fp16" if index.sq.qtype == faiss.ScalarQuantizer.QT_fp16 else "sq8"
+    return "flat"
+
+
+def configure_search(index: faiss.Index):
+    """Applies the query-time knobs (nprobe, efSearch) from config to a built or loaded index."""
+    index = faiss.downcast_index(index)
+    if isinstance(index, faiss.IndexIVF):
+        index.nprobe = config.IVF_NPROBE
+        # Allows reconstruct() by row ID, used by the exact scan of filtered searches
+        index.make_direct_map()
+    elif isinstance(index, faiss.IndexHNSW):
+        index.hnsw.efSearch = config.HNSW_EF_SEARCH
+
+
+def search_params(index: faiss.Index, selector) -> faiss.SearchParameters:
+    """Search parameters restricted to `selector`, keeping the index's own nprobe/efSearch."""
+    index = faiss.downcast_index(index)
+    if isinstance(index, faiss.IndexIVF):
+        return faiss.SearchParametersIVF(sel=selector, nprobe=index.nprobe)
+    if isinstance(index, faiss.IndexHNSW):
+        return faiss.SearchParametersHNSW(sel=selector, efSearch=index.hnsw.efSearch)
+    return faiss.SearchParameters(sel=selector)
+
+
+def sample_rows(n_vectors: int, size: int = config.INDEX_TRAIN_SAMPLE, seed: int = 0) -> np.ndarray:
+    """Sorted, reproducible random row IDs used to draw a training sample."""
+    if n_vectors <= size:
+        return np.arange(n_vectors)
+    return np.sort(np.random.default_rng(seed).choice(n_vectors, size=size, replace=False))
@@ -1,126 +1,432 @@
 import os
 import glob
+import time
+import hashlib
+import argparse
 import logging
-from typing import List, Dict, Optional
-import pytesseract
-from pdf2image import convert_from_path
-from langchain_community.document_loaders import PyPDFLoader
+from collections import deque
+from itertools import chain, islice
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Dict, Optional, Iterable, Iterator, Tuple
+from pypdf import PdfReader
 from langchain_text_splitters import RecursiveCharacterTextSplitter
-from langchain_community.embeddings import HuggingFaceEmbeddings
-from langchain_community.vectorstores import FAISS
+import numpy as np
+import faiss
 from langchain_core.documents import Document
+from src.chunk_store import ChunkStore, MappedVectorStore, read_index, write_index
+from src.embedding_cache import get_embeddings
+from src.index_factory import index_kind
+from src.manifest import IngestionManifest
+from src.ocr import ocr_pdf, ocr_pages, ocr_windows
+from src.shards import ShardWriter
+from src.sparse_index import SparseIndex
+from src.metadata import FacetIndex, parse_filename
+from src.utils import bounded_stage, detect_language
 import config
 
 # Setup logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
+
+class _Done:
+    """Already-computed result with the same .result() interface as a Future."""
+    def __init__(self, value):
+        self.value = value
+
+    def result(self):
+        return self.value
+
+
+def _run_inline(fn, *args) -> _Done:
+    return _Done(fn(*args))
+
+
+def _page_ranges(pdf_path: str):
+    """Splits a PDF into page ranges of at most INGEST_PAGES_PER_TASK pages."""
+    try:
+        n_pages = len(PdfReader(pdf_path).pages)
+    except Exception:
+        # Let the worker surface the error for this file
+        return [(0, None)]
+    step = config.INGEST_PAGES_PER_TASK
+    return [(start, min(start + step, n_pages)) for start in range(0, max(n_pages, 1), step)]
+
+
+def _find_pdfs(directory: str) -> List[str]:
+    return sorted(glob.glob(os.path.join(directory, "**", "*.pdf"), recursive=True))
+
+
+# Worker tasks. These run in child processes, so they are module-level
+# and never raise: errors are returned and logged by the parent.
+
+def _extract_text_pages(pdf_path: str, start: int, end: Optional[int]) -> Dict:
+    """Extracts the text layer of pages [start, end) of a PDF."""
+    t0 = time.time()
+    try:
+        reader = PdfReader(pdf_path)
+        end = len(reader.pages) if end is None else end
+        docs = [
+            Document(page_content=reader.pages[i].extract_text() or "",
+                     metadata={"source": pdf_path, "page": i})
+            for i in range(start, end)
+        ]
+        return {"docs": docs, "error": None, "elapsed": time.time() - t0}
+    except Exception as e:
+        return {"docs": [], "error": str(e), "elapsed": time.time() - t0}
+
+
 class IngestionPipeline:
     def __init__(self):
-        self.embeddings = HuggingFaceEmbeddings(model_name=config.EMBEDDING_MODEL_NAME)
+        # Shared, persistent cache: unchanged and duplicate chunks are never re-encoded
+        self.embeddings = get_embeddings()
         self.text_splitter = RecursiveCharacterTextSplitter(
             chunk_size=config.CHUNK_SIZE,
             chunk_overlap=config.CHUNK_OVERLAP,
             separators=["\n\n", "\n", " ", ""]
         )
+        self.timing_report = []
+
+    def load_pdfs(self, directory: str, workers: Optional[int] = None) -> List[Document]:
+        """
+        Loads all PDFs from a directory.
+
+        With workers > 1, files (and page ranges of large books) are extracted
+        in a process pool. Results are reassembled in sorted file order, so the
+        output is identical to a serial run.
+        """
+        pdf_files = _find_pdfs(directory)
 
-    def load_pdfs(self, directory: str) -> List[Document]:
-        """Loads all PDFs from a directory."""
-        pdf_files = glob.glob(os.path.join(directory, "**", "*.pdf"), recursive=True)
-        documents = []
-        
         if not pdf_files:
             logging.warning(f"No PDF files found in {directory}")
             return []
 
-        for pdf_path in pdf_files:
-            logging.info(f"Processing: {pdf_path}")
-            try:
-                # Try standard Pypdf loading first
-                loader = PyPDFLoader(pdf_path)
-                docs = loader.load()
-                
-                # Check if text extraction was successful (not empty)
-                # If extraction is poor (scanned PDF), use OCR
-                if not docs or len(docs[0].page_content.strip()) < 10:
-                    logging.info(f"Standard extraction failed for {pdf_path}. Switching to OCR.")
-                    docs = self.ocr_pdf(pdf_path)
-                
+        per_file = self.load_files(pdf_files, workers)
+        return [doc for docs in per_file.values() for doc in docs]
+
+    def load_files(self, pdf_files: List[str], workers: Optional[int] = None) -> Dict[str, List[Document]]:
+        """
+        Extracts the given PDFs and returns their pages keyed by path, in input order.
+        Files that fail are logged and left out.
+        """
+        return dict(self.iter_files(pdf_files, workers))
+
+    def iter_files(self, pdf_files: List[str], workers: Optional[int] = None) -> Iterator[Tuple[str, List[Document]]]:
+        """
+        Extracts the given PDFs and yields (path, pages) one file at a time, in input order.
+
+        Only a few files are in flight at once (INGEST_LOOKAHEAD_FILES per worker),
+        so memory does not grow with the number of PDFs, and later stages can start
+        on the first book while the pool is still extracting the next ones.
+        Files that fail are logged and left out.
+        """
+        workers = workers or config.INGEST_WORKERS
+        executor = ProcessPoolExecutor(max_workers=workers) if workers > 1 else None
+        submit = executor.submit if executor else _run_inline
+        lookahead = workers * config.INGEST_LOOKAHEAD_FILES if executor else 1
+
+        self.timing_report = []
+        remaining = iter(pdf_files)
+        in_flight = deque()
+        try:
+            for pdf_path in islice(remaining, lookahead):
+                in_flight.append((pdf_path, self._start_file(pdf_path, submit)))
+
+            while in_flight:
+                pdf_path, futures = in_flight.popleft()
+                next_path = next(remaining, None)
+                if next_path is not None:
+                    in_flight.append((next_path, self._start_file(next_path, submit)))
+
+                result = self._finish_file(pdf_path, futures, submit)
+                self.timing_report.append({
+                    "file": os.path.basename(pdf_path),
+                    "pages": len(result["docs"]),
+                    "seconds": result["elapsed"],
+                    "ocr": result["ocr"],
+                    "ok": result["error"] is None
+                })
+                if result["error"]:
+                    logging.error(f"Error processing {pdf_path}: {result['error']}")
+                    continue
+
                 # Enrich metadata
                 filename = os.path.basename(pdf_path)
-                for doc in docs:
+                file_meta = self._file_metadata(filename, result["docs"])
+                for doc in result["docs"]:
                     doc.metadata["source"] = filename
-                    # Simplistic extraction of metadata from filename if possible, 
-                    # e.g., "Grade10_Science_Ch1.pdf"
-                    # For now, we keep it generic or rely on filename
-                
-                documents.extend(docs)
-                
-            except Exception as e:
-                logging.error(f"Error processing {pdf_path}: {e}")
-        
-        return documents
+                    doc.metadata.update(file_meta)
+
+                yield pdf_path, result["docs"]
+        finally:
+            if executor:
+                executor.shutdown(cancel_futures=True)
+
+        self.log_timing_report()
+
+    def _file_metadata(self, filename: str, docs: List[Document]) -> Dict:
+        """Grade, subject and chapter from the filename; language from it or from the text."""
+        meta = parse_filename(filename)
+        if "language" not in meta:
+            sample = " ".join(d.page_content for d in docs[:5])[:2000]
+            meta["language"] = detect_language(sample)
+        return meta
+
+    def _start_file(self, pdf_path: str, submit) -> List:
+        """Phase 1: submits text-layer extraction, split into page ranges for big books."""
+        logging.info(f"Processing: {pdf_path}")
+        return [submit(_extract_text_pages, pdf_path, start, end) for start, end in _page_ranges(pdf_path)]
+
+    def _finish_file(self, pdf_path: str, futures: List, submit) -> Dict:
+        """
+        Collects the text layer of one file and runs phase 2, OCR of its scanned
+        pages, through `submit` (an executor's submit or an inline runner).
+        """
+        parts = [f.result() for f in futures]
+        error = next((p["error"] for p in parts if p["error"]), None)
+        docs = [d for p in parts for d in p["docs"]]
+        result = {
+            "docs": [] if error else docs,
+            "elapsed": sum(p["elapsed"] for p in parts),
+            "error": error,
+            "ocr": False
+        }
+        if error:
+            return result
+
+        # Decide per page: only pages without a usable text layer
+        # (scanned pages in an otherwise digital book) are OCR'd
+        ocr_tasks = []
+        if not docs:
+            logging.info(f"Standard extraction failed for {pdf_path}. Switching to OCR.")
+            ocr_tasks.append((None, submit(ocr_pdf, pdf_path)))
+        else:
+            scanned = [d.metadata["page"] for d in docs if len(d.page_content.strip()) < config.OCR_MIN_PAGE_CHARS]
+            if scanned:
+                logging.info(f"{len(scanned)}/{len(docs)} pages of {pdf_path} have no text layer. Switching to OCR for those pages.")
+            # A small window of pages per task keeps rendering memory bounded
+            for start, end in ocr_windows(scanned):
+                ocr_tasks.append((start, submit(ocr_pages, pdf_path, start, end)))
+
+        for start, future in ocr_tasks:
+            part = future.result()
+            result["elapsed"] += part["elapsed"]
+            if part["error"]:
+                if start is None:
+                    result["error"] = part["error"]
+                else:
+                    logging.error(f"OCR failed for {pdf_path} from page {start}: {part['error']}")
+                continue
+            result["ocr"] = True
+            if start is None:
+                result["docs"] = part["docs"]
+            else:
+                by_page = {d.metadata["page"]: d for d in part["docs"]}
+                result["docs"] = [by_page.get(d.metadata["page"], d) for d in result["docs"]]
+
+        return result
+
+    def log_timing_report(self):
+        """Logs per-file extraction time, slowest first."""
+        if not self.timing_report:
+            return
+        lines = ["Per-file extraction time (slowest first):"]
+        for row in sorted(self.timing_report, key=lambda r: r["seconds"], reverse=True):
+            status = "OK" if row["ok"] else "FAILED"
+            mode = "OCR" if row["ocr"] else "text"
+            lines.append(f"  {row['seconds']:8.2f}s  {row['pages']:5d} pages  {mode:<4}  {status:<6}  {row['file']}")
+        total = sum(r["seconds"] for r in self.timing_report)
+        lines.append(f"  {total:8.2f}s  total worker time over {len(self.timing_report)} files")
+        logging.info("\n".join(lines))
 
     def ocr_pdf(self, pdf_path: str) -> List[Document]:
         """Performs OCR on a PDF file."""
-        images = convert_from_path(pdf_path)
-        docs = []
-        
-        try:
-            for i, image in enumerate(images):
-                # Tesseract OCR
-                text = pytesseract.image_to_string(image, lang='eng+hin') # English + Hindi
-                
-                # Create Document object
-                metadata = {
-                    "source": os.path.basename(pdf_path),
-                    "page": i + 1,
-                    "is_ocr": True
-                }
-                docs.append(Document(page_content=text, metadata=metadata))
-        except pytesseract.TesseractNotFoundError:
-            logging.error(f"Tesseract OCR not found. Please install Tesseract and add to PATH to process scanned PDF: {pdf_path}")
-        except Exception as e:
-            logging.error(f"OCR failed for {pdf_path}: {e}")
-            
-        return docs
+        return ocr_pdf(pdf_path)["docs"]
 
     def clean_text(self, text: str) -> str:
         """Basic text normalization."""
         # Add specific cleaning rules here if needed
         return text.strip()
 
-    def create_vector_db(self, documents: List[Document]):
-        """Chunks documents and creates a FAISS index."""
-        if not documents:
-            logging.info("No documents to index.")
-            return
+    def _clean_stage(self, files: Iterable[Tuple[str, List[Document]]]) -> Iterator[Tuple[str, List[Document]]]:
+        for pdf_path, docs in files:
+            for doc in docs:
+                doc.page_content = self.clean_text(doc.page_content)
+            yield pdf_path, docs
+
+    def _split_stage(self, files: Iterable[Tuple[str, List[Document]]], directory: str,
+                     hashes: Dict[str, str], manifest: IngestionManifest) -> Iterator[Tuple[Document, str]]:
+        """Chunks each file, records it in the manifest and yields (chunk, chunk_id)."""
+        for pdf_path, docs in files:
+            rel_path = os.path.relpath(pdf_path, directory)
+            chunks, ids = self.split_documents(docs, rel_path, hashes[rel_path])
+            manifest.record(rel_path, pdf_path, hashes[rel_path], ids)
+            yield from zip(chunks, ids)
+
+    def _embed_stage(self, chunks: Iterable[Tuple[Document, str]]) -> Iterator[Tuple[List, List, List, List]]:
+        """Embeds chunks in batches of EMBED_BATCH_SIZE and yields (texts, vectors, metadatas, ids)."""
+        batch = []
+        for item in chunks:
+            batch.append(item)
+            if len(batch) >= config.EMBED_BATCH_SIZE:
+                yield self._embed_batch(batch)
+                batch = []
+        if batch:
+            yield self._embed_batch(batch)
+
+    def _embed_batch(self, batch: List[Tuple[Document, str]]):
+        texts = [chunk.page_content for chunk, _ in batch]
+        vectors = self.embeddings.embed_documents(texts)
+        return texts, vectors, [chunk.metadata for chunk, _ in batch], [chunk_id for _, chunk_id in batch]
 
-        logging.info(f"Chunking {len(documents)} documents...")
+    def split_documents(self, documents: List[Document], rel_path: str, file_hash: str):
+        """
+        Chunks one file's pages. Chunk IDs derive from the file's path and hash, so
+        they are stable across runs, and identical copies of a book at different
+        paths (common in NCERT mirrors) can be removed independently.
+        """
         chunks = self.text_splitter.split_documents(documents)
-        logging.info(f"Created {len(chunks)} chunks.")
+        key = hashlib.blake2b(f"{rel_path.replace(os.sep, '/')}\0{file_hash}".encode("utf-8"), digest_size=8).hexdigest()
+        ids = [f"{key}-{i:05d}" for i in range(len(chunks))]
+        return chunks, ids
 
-        if not chunks:
-            logging.warning("No chunks created.")
-            return
+    def load_vector_db(self) -> Optional[MappedVectorStore]:
+        """
+        The existing index (read into memory, to be extended) and its chunk store
+        (memory-mapped, chunks decoded only when streamed) for an incremental
+        update, if there is one.
+        """
+        if not os.path.exists(os.path.join(config.VECTOR_DB_DIR, "index.faiss")):
+            return None
+        if not ChunkStore.exists(config.VECTOR_DB_DIR):
+            logging.info("Existing Vector DB uses the old pickled docstore. Rebuilding from scratch.")
+            return None
+        try:
+            store = MappedVectorStore(read_index(config.VECTOR_DB_DIR, mmap_index=False), ChunkStore(config.VECTOR_DB_DIR))
+            if store.index.ntotal != len(store.chunks):
+                raise ValueError(f"{store.index.ntotal} vectors but {len(store.chunks)} chunks")
+            return store
+        except Exception as e:
+            logging.warning(f"Could not load existing Vector DB ({e}). Rebuilding from scratch.")
+            return None
 
-        logging.info("Creating FAISS index...")
-        vector_store = FAISS.from_documents(chunks, self.embeddings)
-        
-        # Save locally
+    @staticmethod
+    def _kept_chunks(chunks: ChunkStore, removed: set) -> Iterator[Tuple[str, Document]]:
+        """Existing chunks minus the removed rows, streamed; the store is closed once read."""
+        for row, item in enumerate(chunks):
+            if row not in removed:
+                yield item
+        # Unmapped before ChunkStore.write replaces its files (required on Windows)
+        chunks.close()
+
+    def save_vector_db(self, index: faiss.Index, rows: Iterable[Tuple[str, Document]]):
+        """
+        Writes the index and streams `rows` ((chunk_id, Document) in index row order)
+        into the chunk store, then rebuilds the sidecar indexes keyed by row ID from
+        the written store. Rows shift when vectors are deleted, so the sidecars are
+        regenerated after every update.
+        """
         save_path = config.VECTOR_DB_DIR
-        vector_store.save_local(save_path)
-        logging.info(f"Vector DB saved to {save_path}")
+        write_index(save_path, index)
+        ChunkStore.write(save_path, rows)
+        chunks = ChunkStore(save_path)
+        FacetIndex.build(doc.metadata for _, doc in chunks).save(config.FACET_INDEX_PATH)
+        SparseIndex.build(doc.page_content for _, doc in chunks).save(config.SPARSE_INDEX_PATH)
+        chunks.close()
+
+        legacy_docstore = os.path.join(save_path, "index.pkl")
+        if os.path.exists(legacy_docstore):
+            os.remove(legacy_docstore)
+
+    def ingest(self, directory: str, workers: Optional[int] = None, rebuild: bool = False):
+        """
+        Brings the FAISS index in line with the PDFs in `directory`.
+
+        Only added, changed or deleted files are processed: vectors of changed and
+        deleted files are removed from the existing index and new chunks are added
+        to it. A full rebuild happens with rebuild=True or when no manifest exists.
+        """
+        manifest = IngestionManifest.load(config.MANIFEST_PATH)
+        if manifest.files and manifest.index_type != config.FAISS_INDEX_TYPE:
+            logging.info(f"Index type changed ({manifest.index_type} -> {config.FAISS_INDEX_TYPE}). Rebuilding.")
+            rebuild = True
+        existing = None if rebuild or not manifest.files else self.load_vector_db()
+        if existing is None:
+            # Without a matching index the manifest means nothing
+            manifest.files = {}
+
+        pdf_files = _find_pdfs(directory)
+        changes = manifest.diff(directory, pdf_files)
+        if existing is not None and (changes["changed"] or changes["deleted"]) \
+                and index_kind(existing.index) != "flat":
+            # Only flat indexes keep the remaining rows in order on removal, as the chunk store does
+            logging.info(f"{index_kind(existing.index)} index does not support removing vectors. Rebuilding.")
+            existing.chunks.close()
+            existing = None
+            manifest.files = {}
+            changes = manifest.diff(directory, pdf_files)
+        manifest.index_type = config.FAISS_INDEX_TYPE
+        logging.info(
+            f"Manifest diff: {len(changes['added'])} added, {len(changes['changed'])} changed, "
+            f"{len(changes['deleted'])} deleted, {len(changes['unchanged'])} unchanged."
+        )
+        if not (changes["added"] or changes["changed"] or changes["deleted"]):
+            logging.info("Vector DB is up to date.")
+            return
+
+        # 1. Remove vectors of changed and deleted files
+        stale_ids = []
+        for rel_path in changes["changed"] + changes["deleted"]:
+            stale_ids.extend(manifest.remove(rel_path))
+        removed = set()
+        if stale_ids and existing is not None:
+            logging.info(f"Removing {len(stale_ids)} stale chunks...")
+            stale = set(stale_ids)
+            removed = {row for row in range(len(existing.chunks)) if existing.chunks.get_id(row) in stale}
+            existing.index.remove_ids(np.fromiter(sorted(removed), dtype=np.int64, count=len(removed)))
+
+        # 2. Stream added and changed files through load -> clean -> split -> embed -> write.
+        # Each stage hands over to the next through a bounded queue, so extraction
+        # of later books overlaps with embedding of earlier ones and memory stays flat.
+        to_load = [os.path.join(directory, rel_path) for rel_path in changes["added"] + changes["changed"]]
+        writer = ShardWriter(config.SHARD_DIR, config.SHARD_SIZE)
+        try:
+            files = bounded_stage(self.iter_files(to_load, workers), config.PIPELINE_QUEUE_SIZE)
+            chunks = bounded_stage(self._split_stage(self._clean_stage(files), directory, changes["hashes"], manifest),
+                                   config.PIPELINE_QUEUE_SIZE)
+            for texts, vectors, metadatas, ids in self._embed_stage(chunks):
+                writer.add(texts, vectors, metadatas, ids)
+            logging.info(f"Embedded {writer.total} new chunks. Merging shards...")
+            self.embeddings.log_stats()
+            index = writer.merge_into(existing.index if existing else None, config.FAISS_INDEX_TYPE)
+            if index is None:
+                logging.warning("No chunks created.")
+                return
+
+            # Save locally: kept chunks, then the new ones, streamed shard by shard
+            kept = self._kept_chunks(existing.chunks, removed) if existing else []
+            self.save_vector_db(index, chain(kept, writer.chunks()))
+        finally:
+            writer.cleanup()
+
+        manifest.save()
+        logging.info(f"Vector DB saved to {config.VECTOR_DB_DIR} ({index.ntotal} vectors, {index_kind(index)} index)")
 
 if __name__ == "__main__":
     # Ensure directories exist
     os.makedirs(config.RAW_DATA_DIR, exist_ok=True)
     os.makedirs(config.VECTOR_DB_DIR, exist_ok=True)
 
+    parser = argparse.ArgumentParser(description="Ingest NCERT PDFs into the FAISS index.")
+    parser.add_argument("--workers", type=int, default=config.INGEST_WORKERS,
+                        help="Number of processes for PDF extraction (1 = serial).")
+    parser.add_argument("--rebuild", action="store_true",
+                        help="Ignore the manifest and rebuild the whole index.")
+    args = parser.parse_args()
+
     pipeline = IngestionPipeline()
     logging.info("Starting ingestion process...")
     
-    docs = pipeline.load_pdfs(config.RAW_DATA_DIR)
-    if docs:
-        pipeline.create_vector_db(docs)
+    if _find_pdfs(config.RAW_DATA_DIR) or os.path.exists(config.MANIFEST_PATH):
+        pipeline.ingest(config.RAW_DATA_DIR, workers=args.workers, rebuild=args.rebuild)
     else:
         logging.info(f"Please place PDF files in {config.RAW_DATA_DIR}")
@@ -0,0 +1,90 @@
+import os
+import json
+import hashlib
+import logging
+from typing import List, Dict, Optional
+
+
+class IngestionManifest:
+    """
+    Persisted record of what is in the vector index: for every PDF (keyed by its
+    path relative to the raw data directory) the content hash and the IDs of the
+    chunks it contributed. Lets a re-run touch only added, changed or deleted files.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.files: Dict[str, Dict] = {}
+        self.index_type: Optional[str] = None
+
+    @classmethod
+    def load(cls, path: str) -> "IngestionManifest":
+        manifest = cls(path)
+        if os.path.exists(path):
+            try:
+                with open(path, "r", encoding="utf-8") as f:
+                    data = json.load(f)
+                manifest.files = data.get("files", {})
+                manifest.index_type = data.get("index_type")
+            except (OSError, ValueError) as e:
+                logging.warning(f"Ignoring unreadable manifest {path}: {e}")
+        return manifest
+
+    def save(self):
+        """Writes the manifest atomically so an interrupted run never leaves it half-written."""
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"index_type": self.index_type, "files": self.files}, f, indent=1, sort_keys=True)
+        os.replace(tmp_path, self.path)
+
+    def file_hash(self, rel_path: str, abs_path: str) -> str:
+        """SHA-256 of the file contents, reusing the stored hash when size and mtime are unchanged."""
+        stat = os.stat(abs_path)
+        entry = self.files.get(rel_path)
+        if entry and entry.get("size") == stat.st_size and entry.get("mtime") == stat.st_mtime:
+            return entry["sha256"]
+
+        digest = hashlib.sha256()
+        with open(abs_path, "rb") as f:
+            for block in iter(lambda: f.read(1 << 20), b""):
+                digest.update(block)
+        return digest.hexdigest()
+
+    def diff(self, directory: str, pdf_files: List[str]) -> Dict[str, List[str]]:
+        """
+        Compares the PDFs on disk with the manifest.
+        Returns relative paths grouped as added / changed / deleted / unchanged,
+        plus the current hash of every file on disk under "hashes".
+        """
+        changes = {"added": [], "changed": [], "deleted": [], "unchanged": [], "hashes": {}}
+        seen = set()
+        for abs_path in pdf_files:
+            rel_path = os.path.relpath(abs_path, directory)
+            seen.add(rel_path)
+            sha = self.file_hash(rel_path, abs_path)
+            changes["hashes"][rel_path] = sha
+            entry = self.files.get(rel_path)
+            if entry is None:
+                changes["added"].append(rel_path)
+            elif entry["sha256"] != sha:
+                changes["changed"].append(rel_path)
+            else:
+                changes["unchanged"].append(rel_path)
+
+        changes["deleted"] = sorted(set(self.files) - seen)
+        return changes
+
+    def record(self, rel_path: str, abs_path: str, sha: str, chunk_ids: List[str]):
+        stat = os.stat(abs_path)
+        self.files[rel_path] = {
+            "sha256": sha,
+            "size": stat.st_size,
+            "mtime": stat.st_mtime,
+            "chunk_ids": chunk_ids
+        }
+
+    def remove(self, rel_path: str) -> List[str]:
+        """Drops a file from the manifest and returns its chunk IDs."""
+        entry = self.files.pop(rel_path, None)
+        return entry["chunk_ids"] if entry else []
@@ -0,0 +1,138 @@
+import os
+import re
+import logging
+from typing import Iterable, List, Dict, Optional
+import numpy as np
+
+FACETS = ["grade", "subject", "chapter", "language"]
+
+SUBJECT_ALIASES = {
+    "science": "Science",
+    "physics": "Science",
+    "chemistry": "Science",
+    "biology": "Science",
+    "math": "Maths",
+    "maths": "Maths",
+    "mathematics": "Maths",
+    "social science": "Social Science",
+    "social": "Social Science",
+    "sst": "Social Science",
+    "history": "Social Science",
+    "geography": "Social Science",
+    "civics": "Social Science",
+    "political science": "Social Science",
+    "politics": "Social Science",
+    "economics": "Social Science",
+    "english": "English",
+    "hindi": "Hindi",
+}
+
+# NCERT file codes, e.g. "jesc101.pdf": class letter (a=1 ... l=12), medium (e/h),
+# two-letter subject code, book number, two-digit chapter
+NCERT_CODE = re.compile(r"^([a-l])([eh])([a-z]{2})(\d)(\d{2})$")
+NCERT_SUBJECTS = {"sc": "Science", "mh": "Maths", "ss": "Social Science"}
+
+
+def parse_filename(filename: str) -> Dict:
+    """
+    Derives grade, subject, chapter and language from a textbook filename,
+    e.g. "Class10_Science_Ch1.pdf" or NCERT's "jesc101.pdf". Unknown facets are left out.
+    """
+    stem = os.path.splitext(os.path.basename(filename))[0].lower()
+    meta = {}
+
+    code = NCERT_CODE.match(stem)
+    if code:
+        letter, medium, subject, _, chapter = code.groups()
+        meta["grade"] = str(ord(letter) - ord("a") + 1)
+        meta["language"] = "hi" if medium == "h" else "en"
+        meta["chapter"] = str(int(chapter))
+        if subject in NCERT_SUBJECTS:
+            meta["subject"] = NCERT_SUBJECTS[subject]
+        return meta
+
+    words = re.sub(r"[_\-.]+", " ", stem)
+    grade = re.search(r"(?:class|grade|std)\s*(\d{1,2})", words)
+    if grade:
+        meta["grade"] = str(int(grade.group(1)))
+    chapter = re.search(r"(?:ch|chap|chapter)\s*(\d{1,2})", words)
+    if chapter:
+        meta["chapter"] = str(int(chapter.group(1)))
+    # Longest alias first so "social science" wins over "science"
+    for alias in sorted(SUBJECT_ALIASES, key=len, reverse=True):
+        if re.search(rf"\b{alias}\b", words):
+            meta["subject"] = SUBJECT_ALIASES[alias]
+            break
+    return meta
+
+
+def normalize_filters(filters: Optional[Dict]) -> Dict[str, str]:
+    """Maps UI filter values ("Grade 6", "Maths", "All") onto stored metadata values."""
+    normalized = {}
+    for facet, value in (filters or {}).items():
+        if facet not in FACETS or value in (None, "", "All"):
+            continue
+        value = str(value).strip()
+        if facet in ("grade", "chapter"):
+            digits = re.search(r"\d+", value)
+            if not digits:
+                continue
+            value = str(int(digits.group()))
+        elif facet == "subject":
+            value = SUBJECT_ALIASES.get(value.lower(), value)
+        elif facet == "language":
+            value = value.lower()
+        normalized[facet] = value
+    return normalized
+
+
+class FacetIndex:
+    """
+    Row-ID lists per facet value (e.g. subject=Science -> rows of the FAISS index),
+    stored next to the index. A filter becomes the intersection of the matching
+    lists, which the retriever turns into an ID selector or an exact scan over
+    just those rows.
+    """
+
+    def __init__(self, postings: Dict[str, np.ndarray], ntotal: int):
+        self.postings = postings
+        self.ntotal = ntotal
+
+    @classmethod
+    def build(cls, metadatas: Iterable[Dict]) -> "FacetIndex":
+        rows: Dict[str, List[int]] = {}
+        ntotal = 0
+        for row, meta in enumerate(metadatas):
+            ntotal += 1
+            for facet in FACETS:
+                if meta.get(facet) is not None:
+                    rows.setdefault(f"{facet}={meta[facet]}", []).append(row)
+        postings = {key: np.asarray(ids, dtype=np.int64) for key, ids in rows.items()}
+        return cls(postings, ntotal)
+
+    def save(self, path: str):
+        np.savez(path, __ntotal__=np.asarray([self.ntotal]), **self.postings)
+
+    @classmethod
+    def load(cls, path: str) -> Optional["FacetIndex"]:
+        if not os.path.exists(path):
+            return None
+        try:
+            with np.load(path) as data:
+                postings = {key: data[key] for key in data.files if key != "__ntotal__"}
+                return cls(postings, int(data["__ntotal__"][0]))
+        except Exception as e:
+            logging.warning(f"Could not load facet index {path}: {e}")
+            return None
+
+    def candidates(self, filters: Dict[str, str]) -> Optional[np.ndarray]:
+        """Sorted row IDs matching every filter, or None when nothing is filtered."""
+        if not filters:
+            return None
+        result = None
+        for facet, value in filters.items():
+            rows = self.postings.get(f"{facet}={value}", np.empty(0, dtype=np.int64))
+            result = rows if result is None else np.intersect1d(result, rows, assume_unique=True)
+            if len(result) == 0:
+                break
+        return result
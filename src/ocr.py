@@ -0,0 +1,130 @@
+import os
+import time
+import hashlib
+from typing import List, Dict, Optional, Tuple
+import pytesseract
+from pdf2image import convert_from_path, pdfinfo_from_path
+from langchain_core.documents import Document
+import config
+
+OCR_LANG = 'eng+hin' # English + Hindi
+
+
+class OCRCache:
+    """
+    On-disk cache of Tesseract output keyed by a hash of the rendered page image,
+    so a scanned page is never OCR'd twice, even if the PDF around it changes.
+    Entries are single files written atomically, so worker processes can share it.
+    """
+
+    def __init__(self, cache_dir: str = config.OCR_CACHE_DIR):
+        self.cache_dir = cache_dir
+
+    @staticmethod
+    def key(image, lang: str = OCR_LANG) -> str:
+        digest = hashlib.sha256()
+        digest.update(f"{lang}|{image.mode}|{image.size}".encode("utf-8"))
+        digest.update(image.tobytes())
+        return digest.hexdigest()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, key[:2], key + ".txt")
+
+    def get(self, key: str) -> Optional[str]:
+        try:
+            with open(self._path(key), "r", encoding="utf-8") as f:
+                return f.read()
+        except OSError:
+            return None
+
+    def put(self, key: str, text: str):
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(text)
+        os.replace(tmp_path, path)
+
+
+def ocr_page(image, cache: OCRCache) -> str:
+    """OCRs one page image, going through the cache."""
+    key = cache.key(image)
+    text = cache.get(key)
+    if text is None:
+        text = pytesseract.image_to_string(image, lang=OCR_LANG)
+        cache.put(key, text)
+    return text
+
+
+def ocr_windows(pages: List[int], window: int = config.OCR_WINDOW_PAGES) -> List[Tuple[int, int]]:
+    """
+    Groups 0-based page numbers into runs of consecutive pages, each at most
+    `window` long. Every run becomes one [start, end) OCR task.
+    """
+    runs = []
+    for page in sorted(pages):
+        if runs and runs[-1][1] == page and runs[-1][1] - runs[-1][0] < window:
+            runs[-1][1] = page + 1
+        else:
+            runs.append([page, page + 1])
+    return [(start, end) for start, end in runs]
+
+
+def ocr_pages(pdf_path: str, start: int, end: int) -> Dict:
+    """
+    Renders and OCRs pages [start, end) (0-based) of a PDF.
+    Only this window is ever rasterised, so memory stays bounded by the window
+    size whatever the length of the book. Runs as an ingestion worker task, so
+    errors are returned rather than raised.
+    """
+    t0 = time.time()
+    docs = []
+    cache = OCRCache()
+
+    try:
+        # pdf2image pages are 1-based and last_page is inclusive
+        images = convert_from_path(pdf_path, first_page=start + 1, last_page=end)
+    except Exception as e:
+        return {"docs": [], "error": str(e), "elapsed": time.time() - t0}
+
+    try:
+        for offset, image in enumerate(images):
+            text = ocr_page(image, cache)
+
+            # Create Document object
+            metadata = {
+                "source": os.path.basename(pdf_path),
+                "page": start + offset,
+                "is_ocr": True
+            }
+            docs.append(Document(page_content=text, metadata=metadata))
+    except pytesseract.TesseractNotFoundError:
+        return {"docs": [], "error": f"Tesseract OCR not found. Please install Tesseract and add to PATH to process scanned PDF: {pdf_path}", "elapsed": time.time() - t0}
+    except Exception as e:
+        return {"docs": [], "error": f"OCR failed: {e}", "elapsed": time.time() - t0}
+    finally:
+        for image in images:
+            image.close()
+
+    return {"docs": docs, "error": None, "elapsed": time.time() - t0}
+
+
+def ocr_pdf(pdf_path: str) -> Dict:
+    """
+    Performs OCR on a whole PDF file, one window of pages at a time.
+    Runs as an ingestion worker task, so errors are returned rather than raised.
+    """
+    t0 = time.time()
+    try:
+        n_pages = int(pdfinfo_from_path(pdf_path)["Pages"])
+    except Exception as e:
+        return {"docs": [], "error": str(e), "elapsed": time.time() - t0}
+
+    docs = []
+    for start, end in ocr_windows(list(range(n_pages))):
+        part = ocr_pages(pdf_path, start, end)
+        if part["error"]:
+            return {"docs": [], "error": part["error"], "elapsed": time.time() - t0}
+        docs.extend(part["docs"])
+
+    return {"docs": docs, "error": None, "elapsed": time.time() - t0}
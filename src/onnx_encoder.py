@@ -0,0 +1,75 @@
+import os
+import json
+import logging
+from typing import List
+import numpy as np
+from langchain_core.embeddings import Embeddings
+import config
+
+
+def model_snapshot(model_name: str) -> str:
+    """Directory of the sentence-transformer in the local Hugging Face cache (no download)."""
+    from huggingface_hub import snapshot_download
+    return snapshot_download(model_name, local_files_only=True)
+
+
+class OnnxEmbeddings(Embeddings):
+    """
+    The sentence-transformer run from an int8 ONNX export (see export_onnx_encoder.py)
+    with onnxruntime instead of PyTorch: no torch import, a fraction of the memory,
+    and a few milliseconds per query on one core.
+
+    The fast tokenizer is loaded from the model's files in the local Hugging Face
+    cache, and the session runs one dummy query at construction so the first real
+    query does not pay for graph initialisation. Vectors are the mean of the
+    token states over the attention mask, as the model's own pooling layer does.
+    """
+
+    def __init__(self, onnx_path: str, model_name: str, threads: int = config.ONNX_ENCODER_THREADS):
+        import onnxruntime as ort
+        from tokenizers import Tokenizer
+
+        snapshot = model_snapshot(model_name)
+        self.tokenizer = Tokenizer.from_file(os.path.join(snapshot, "tokenizer.json"))
+        self.tokenizer.no_padding()
+        max_length = 128
+        st_config = os.path.join(snapshot, "sentence_bert_config.json")
+        if os.path.exists(st_config):
+            with open(st_config, "r", encoding="utf-8") as f:
+                max_length = json.load(f).get("max_seq_length", max_length)
+        self.tokenizer.enable_truncation(max_length)
+
+        options = ort.SessionOptions()
+        options.intra_op_num_threads = threads
+        options.inter_op_num_threads = 1
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        self.session = ort.InferenceSession(onnx_path, options, providers=["CPUExecutionProvider"])
+        self.input_names = {i.name for i in self.session.get_inputs()}
+        logging.info(f"ONNX query encoder loaded from {onnx_path} ({threads} thread(s))")
+        self.embed_query("warm up")
+
+    def _encode(self, texts: List[str]) -> np.ndarray:
+        encodings = self.tokenizer.encode_batch(texts)
+        length = max(len(e.ids) for e in encodings)
+        # Padded positions are masked out of attention and pooling, so their IDs do not matter
+        input_ids = np.zeros((len(texts), length), dtype=np.int64)
+        attention_mask = np.zeros((len(texts), length), dtype=np.int64)
+        for i, e in enumerate(encodings):
+            input_ids[i, :len(e.ids)] = e.ids
+            attention_mask[i, :len(e.ids)] = 1
+        feeds = {"input_ids": input_ids, "attention_mask": attention_mask}
+        if "token_type_ids" in self.input_names:
+            feeds["token_type_ids"] = np.zeros_like(input_ids)
+
+        hidden = self.session.run(None, feeds)[0]
+        mask = attention_mask[:, :, None].astype(np.float32)
+        return (hidden * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        vectors = []
+        for start in range(0, len(texts), config.EMBED_BATCH_SIZE):
+            vectors.extend(self._encode(texts[start:start + config.EMBED_BATCH_SIZE]).tolist())
+        return vectors
+
+    def embed_query(self, text: str) -> List[float]:
+        return self._encode([text])[0].tolist()
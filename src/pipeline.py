@@ -1,59 +1,371 @@
 import logging
 import time
-from typing import Dict, Any
-from src.retrieval import NCERTRetriever
-from src.generation import LocalLLMGenerator
+import threading
+from typing import Callable, List, Dict, Any, Iterator
 from src.utils import detect_language
+from src.session import SessionStore, Turn, follow_up_kind
+from src import telemetry
+import config
 
 logging.basicConfig(level=logging.INFO)
 
+# Loaded independently; queries need the retriever, generation needs the LLM
+COMPONENTS = ("retriever", "generator")
+
+
+def answer_path(result: Dict[str, Any]) -> str:
+    """How a result was produced: cached, extractive, passages, no_context or generated."""
+    if (result.get("cache") or {}).get("hit"):
+        return "cached"
+    if (result.get("fast_path") or {}).get("hit"):
+        return "extractive"
+    if result.get("retrieval_only"):
+        return "passages"
+    if not result["source_documents"]:
+        return "no_context"
+    return "generated"
+
 class RAGPipeline:
-    def __init__(self):
+    def __init__(self, background: bool = False):
+        """
+        With `background=True` the constructor returns at once and the retriever
+        (embedding model, FAISS index) and the LLM load on their own threads;
+        `readiness()` shows which are warm. Until the LLM is ready, queries are
+        answered from the retrieved passages alone. The heavy modules are only
+        imported by the loaders.
+        """
+        self.init_started = time.time()
+        self.first_interactive = None
+        self.retriever = None
+        self.answer_cache = None
+        # All generation goes through the scheduler's worker pool; `generator` is
+        # the first worker's model, for single-threaded callers such as the benchmarks.
+        self.scheduler = None
+        self.generator = None
+        self.fast_path_stats = {"attempts": 0, "hits": 0, "time": 0.0}
+        # Last turn per conversation, for follow-up questions
+        self.sessions = SessionStore() if config.SESSION_FOLLOW_UPS else None
+        self.status = {name: {"state": "pending", "seconds": None, "error": None} for name in COMPONENTS}
+        self._loaded = {name: threading.Event() for name in COMPONENTS}
+
+        loaders = {"retriever": self._load_retriever, "generator": self._load_generator}
+        for name, loader in loaders.items():
+            if background:
+                threading.Thread(target=self._load, args=(name, loader), name=f"load-{name}", daemon=True).start()
+            else:
+                self._load(name, loader)
+
+    def _load(self, name: str, loader):
+        self.status[name]["state"] = "loading"
+        start = time.time()
+        try:
+            loader()
+            self.status[name]["state"] = "ready"
+        except Exception as e:
+            logging.error(f"Failed to load {name}: {e}")
+            self.status[name]["state"] = "failed"
+            self.status[name]["error"] = str(e)
+        finally:
+            self.status[name]["seconds"] = time.time() - start
+            logging.info(f"{name} {self.status[name]['state']} after {self.status[name]['seconds']:.1f}s")
+            self._loaded[name].set()
+
+    def _load_retriever(self):
+        from src.retrieval import NCERTRetriever
+        from src.answer_cache import AnswerCache
         self.retriever = NCERTRetriever()
-        self.generator = LocalLLMGenerator()
+        if config.ANSWER_CACHE_ENABLED:
+            self.answer_cache = AnswerCache(self.retriever.embeddings)
+        if not self.retriever.vector_store:
+            raise RuntimeError("Vector DB not found. Run ingestion first.")
+
+    def _load_generator(self):
+        from src.scheduler import GenerationScheduler
+        self.scheduler = GenerationScheduler()
+        self.generator = self.scheduler.generators[0]
+        if not self.generator.llm:
+            raise RuntimeError("LLM not loaded (check models/).")
+
+    def is_ready(self, name: str) -> bool:
+        return self.status[name]["state"] == "ready"
+
+    def wait_for(self, name: str, timeout: float = None) -> bool:
+        """Blocks until a component has finished loading (successfully or not)."""
+        return self._loaded[name].wait(timeout)
+
+    def readiness(self) -> Dict[str, Any]:
+        """Per-component state ("pending", "loading", "ready", "failed"), load time and error."""
+        return {
+            "components": {name: dict(status) for name, status in self.status.items()},
+            "ready": all(self.is_ready(name) for name in COMPONENTS),
+            "uptime": time.time() - self.init_started,
+            "first_interactive": self.first_interactive
+        }
 
-    def process_query(self, query: str, filters: Dict = None) -> Dict[str, Any]:
+    def process_query(self, query: str, filters: Dict = None, session_id: str = None) -> Dict[str, Any]:
         """
         End-to-end processing of a user query.
         Returns a dictionary with the answer, context, and metadata.
         """
+        result = None
+        for event in self.process_query_stream(query, filters=filters, session_id=session_id):
+            if event["type"] == "done":
+                result = event["result"]
+        return result
+
+    def process_query_stream(self, query: str, filters: Dict = None, session_id: str = None,
+                             on_generation: Callable = None) -> Iterator[Dict[str, Any]]:
+        """
+        Streaming version of process_query. Yields {"type": "token", "text": ...}
+        events as the answer is generated, then {"type": "done", "result": ...}
+        with the same dictionary process_query returns.
+
+        With a `session_id` (one per conversation) a follow-up such as "explain it
+        more simply" reuses the previous turn's chunks (plus a few new ones if it
+        brings new terms) and continues from its model state, so only the new
+        question is prefilled. The result's "follow_up" says what was reused.
+
+        `on_generation` is called with the scheduler's GenerationRequest once it
+        is queued, so a front end can cancel it as soon as its client goes away.
+        """
+        # The root span is current only while the body runs, not while the caller holds an event
+        return telemetry.traced(telemetry.span("query"), self._query_stream(query, filters, session_id, on_generation))
+
+    def _query_stream(self, query: str, filters: Dict, session_id: str,
+                      on_generation: Callable = None) -> Iterator[Dict[str, Any]]:
         start_time = time.time()
-        
         # 1. Detect Language
-        lang = detect_language(query)
+        with telemetry.span("detect_language"):
+            lang = detect_language(query)
         logging.info(f"Detected language: {lang}")
 
-        # 2. Retrieve
-        # We can append language instruction to query if needed, but for now raw query is better for embeddings
-        retrieved_docs = self.retriever.retrieve(query, filters=filters)
-        
+        if not self.is_ready("retriever"):
+            with telemetry.span("wait_for_retriever"):
+                self.wait_for("retriever")
+
+        previous = self.sessions.get(session_id) if self.sessions and session_id else None
+        kind = follow_up_kind(query, previous.topic) if previous else None
+        follow_up = None
+        if kind:
+            self.sessions.stats["follow_ups"] += 1
+            logging.info(f"Follow-up ({kind}) to '{previous.topic}'")
+
+        # Same (or a near-duplicate) question already answered for these filters?
+        # (A follow-up's answer depends on the conversation, not just the question.)
+        hit = None
+        if self.answer_cache and not kind:
+            with telemetry.span("answer_cache.lookup"):
+                hit = self.answer_cache.lookup(query, filters, lang)
+            telemetry.count("cache_requests_total", cache="answer", result="hit" if hit else "miss")
+        if hit:
+            events = self._cached_stream(hit, lang, start_time)
+            retrieval_time = 0.0
+        elif kind:
+            t0 = time.time()
+            retrieved_docs = list(previous.docs)
+            extra = []
+            if kind == "extend" and self.retriever:
+                # A full retrieval for the topic plus the new terms, merged after the previous chunks
+                # (which stay first, so the previous turn's tokens remain a prefix of the prompt)
+                with telemetry.span("retrieval", follow_up=kind):
+                    seen = {doc.page_content for doc in retrieved_docs}
+                    extra = [doc for doc in self.retriever.retrieve(f"{previous.topic} {query}", filters=filters)
+                             if doc.page_content not in seen]
+            retrieved_docs += extra
+            retrieval_time = time.time() - t0
+            follow_up = {"kind": kind, "topic": previous.topic, "reused_chunks": len(previous.docs), "extra_chunks": len(extra)}
+            events = self._answer_stream(query, lang, retrieved_docs, start_time, filters,
+                                         previous=previous, keep_turn=True, on_generation=on_generation)
+        else:
+            # 2. Retrieve
+            # We can append language instruction to query if needed, but for now raw query is better for embeddings
+            t0 = time.time()
+            with telemetry.span("retrieval"):
+                retrieved_docs = self.retriever.retrieve(query, filters=filters) if self.retriever else []
+            retrieval_time = time.time() - t0
+            events = self._answer_stream(query, lang, retrieved_docs, start_time, filters,
+                                         keep_turn=bool(self.sessions and session_id), on_generation=on_generation)
+
+        for event in events:
+            if event["type"] == "done":
+                turn = event.pop("turn", None) or {}
+                if self.sessions and session_id and event["result"]["source_documents"]:
+                    topic = previous.topic if kind else query
+                    self.sessions.put(session_id, Turn(query, topic, event["result"]["source_documents"], **turn))
+                event["result"]["follow_up"] = follow_up
+                event["result"]["retrieval_time"] = retrieval_time
+                path = answer_path(event["result"])
+                telemetry.current().set(language=lang, path=path)
+                telemetry.count("requests_total", path=path)
+            yield event
+
+    def process_queries(self, queries: List[str], filters: Dict = None) -> List[Dict[str, Any]]:
+        """
+        Batch version of process_query for question banks and offline evaluation.
+        Cached answers are served first; retrieval for the remaining questions runs
+        as one batch (one batched encode and search), then answers are generated
+        one by one. Results come back in input order; generated ones carry the
+        shared batch retrieval timing under "retrieval_batch".
+        """
+        self.wait_for("retriever")
+        langs = [detect_language(q) for q in queries]
+        results = [None] * len(queries)
+        if self.answer_cache:
+            for i, (query, lang) in enumerate(zip(queries, langs)):
+                hit = self.answer_cache.lookup(query, filters, lang)
+                if hit:
+                    results[i] = self._done(self._cached_stream(hit, lang, time.time()))
+
+        misses = [i for i, result in enumerate(results) if result is None]
+        if misses and self.retriever:
+            batch = self.retriever.retrieve_many([queries[i] for i in misses], filters=filters)
+            logging.info(f"Retrieved context for {len(misses)} queries in {batch['timing']['total']:.2f}s")
+            for i, docs in zip(misses, batch["results"]):
+                result = self._done(self._answer_stream(queries[i], langs[i], docs, time.time(), filters))
+                result["retrieval_batch"] = batch["timing"]
+                results[i] = result
+        return results
+
+    def fast_path_summary(self) -> Dict[str, float]:
+        """Extractive fast path hit rate and mean time spent trying it."""
+        attempts = self.fast_path_stats["attempts"]
+        return {
+            "hits": self.fast_path_stats["hits"],
+            "attempts": attempts,
+            "hit_rate": self.fast_path_stats["hits"] / attempts if attempts else 0.0,
+            "mean_time": self.fast_path_stats["time"] / attempts if attempts else 0.0
+        }
+
+    @staticmethod
+    def _done(events: Iterator[Dict[str, Any]]) -> Dict[str, Any]:
+        for event in events:
+            if event["type"] == "done":
+                return event["result"]
+
+    def _cached_stream(self, hit: Dict, lang: str, start_time: float) -> Iterator[Dict[str, Any]]:
+        logging.info(f"Answer cache {hit['hit']} hit (similarity {hit['similarity']:.3f}, cached question: '{hit['query']}')")
+        latency = time.time() - start_time
+        yield {"type": "token", "text": hit["answer"]}
+        yield {"type": "done", "result": {
+            "answer": hit["answer"],
+            "source_documents": hit["source_documents"],
+            "language": lang,
+            "latency": latency,
+            "ttft": latency,
+            "cache": {"hit": hit["hit"], "similarity": hit["similarity"], **self.answer_cache.stats()}
+        }}
+
+    def _passages_stream(self, retrieved_docs: List, lang: str, start_time: float) -> Iterator[Dict[str, Any]]:
+        from src.generation import build_source_footer
+        state = self.status["generator"]["state"]
+        note = ("The language model is still loading" if state in ("pending", "loading")
+                else "The language model is not available")
+        answer = f"*{note}; here are the most relevant textbook passages.*\n\n" + "\n\n".join(
+            f"> {doc.page_content.strip()}" for doc in retrieved_docs[:config.RETRIEVAL_ONLY_PASSAGES]
+        ) + build_source_footer(retrieved_docs[:config.RETRIEVAL_ONLY_PASSAGES])
+        latency = time.time() - start_time
+        yield {"type": "token", "text": answer}
+        yield {"type": "done", "result": {
+            "answer": answer,
+            "source_documents": retrieved_docs,
+            "language": lang,
+            "latency": latency,
+            "ttft": latency,
+            "retrieval_only": True
+        }}
+
+    def _answer_stream(self, query: str, lang: str, retrieved_docs: List, start_time: float,
+                       filters: Dict = None, previous: Turn = None, keep_turn: bool = False,
+                       on_generation: Callable = None) -> Iterator[Dict[str, Any]]:
         if not retrieved_docs:
-            return {
-                "answer": "I don't know based on NCERT textbooks. (No relevant content found)",
+            answer = "I don't know based on NCERT textbooks. (No relevant content found)"
+            latency = time.time() - start_time
+            yield {"type": "token", "text": answer}
+            yield {"type": "done", "result": {
+                "answer": answer,
                 "source_documents": [],
                 "language": lang,
-                "latency": time.time() - start_time
-            }
+                "latency": latency,
+                "ttft": latency
+            }}
+            return
 
-        # 3. Generate Answer
+        # 3a. Extractive fast path for simple definitional questions
+        if config.EXTRACTIVE_FAST_PATH and previous is None:
+            from src.extractive import extractive_answer
+            t0 = time.time()
+            with telemetry.span("extractive"):
+                extract = extractive_answer(query, retrieved_docs)
+            self.fast_path_stats["attempts"] += 1
+            self.fast_path_stats["time"] += time.time() - t0
+            if extract:
+                self.fast_path_stats["hits"] += 1
+                latency = time.time() - start_time
+                logging.info(f"Extractive answer for '{extract['term']}' (score {extract['score']:.2f}) in {time.time() - t0:.3f}s")
+                yield {"type": "token", "text": extract["answer"]}
+                yield {"type": "done", "result": {
+                    "answer": extract["answer"],
+                    "source_documents": retrieved_docs,
+                    "language": lang,
+                    "latency": latency,
+                    "ttft": latency,
+                    "fast_path": {"hit": True, "score": extract["score"], "time": time.time() - t0, **self.fast_path_summary()}
+                }}
+                return
+
+        # 3b. No LLM (yet): answer with the retrieved passages themselves
+        if not self.is_ready("generator"):
+            yield from self._passages_stream(retrieved_docs, lang, start_time)
+            return
+
+        # 3c. Generate Answer
         # Add language instruction to the prompt context implicitly via system prompt or here
         # We might want to wrap the generator call to enforce output language
-        answer = self.generator.generate_answer(query, retrieved_docs)
+        pieces = []
+        ttft = None
+        t0 = time.time()
+        # The worker runs in a copy of this context, so its spans nest under the query's
+        request = self.scheduler.submit(query, retrieved_docs, previous=previous, keep_turn=keep_turn)
+        if on_generation:
+            on_generation(request)
+        try:
+            for text in request.stream():
+                if ttft is None:
+                    # Time to first token, as the student sees it (includes retrieval)
+                    ttft = time.time() - start_time
+                pieces.append(text)
+                yield {"type": "token", "text": text}
+        finally:
+            # Recorded, not opened as a span: a span must not stay open across the yields
+            telemetry.record("generation", t0, time.time())
+        answer = "".join(pieces)
+        # The chunks the model was given, after context packing: what the answer (and its footer) cites
+        used_docs = request.context_docs if request.context_docs is not None else retrieved_docs
+        logging.info(f"Queue wait {request.wait_time:.2f}s (queue depth {self.scheduler.queue.qsize()})")
+
+        # Only complete answers from a loaded model are worth reusing
+        if self.answer_cache and previous is None and not request.truncated and request.stats.get("completion_tokens"):
+            self.answer_cache.put(query, filters, lang, answer, used_docs)
 
         # 4. Post-processing (optional language check)
         
         latency = time.time() - start_time
         
-        return {
+        yield {"type": "done", "result": {
             "answer": answer,
-            "source_documents": retrieved_docs,
+            "source_documents": used_docs,
             "language": lang,
-            "latency": latency
-        }
+            "latency": latency,
+            "ttft": ttft if ttft is not None else latency,
+            "queue_wait": request.wait_time,
+            "generation": request.stats,
+            "fast_path": {"hit": False, **self.fast_path_summary()} if config.EXTRACTIVE_FAST_PATH else None,
+            "cache": {"hit": None, **self.answer_cache.stats()} if self.answer_cache else None
+        }, "turn": request.turn}
 
 if __name__ == "__main__":
     pipeline = RAGPipeline()
     # Mock run only if model exists
-    if pipeline.generator.llm and pipeline.retriever.vector_store:
+    if pipeline.readiness()["ready"]:
         result = pipeline.process_query("What is the capital of India?") # Expect "I don't know" or similar if no PDF
         print(result)
@@ -0,0 +1,110 @@
+import os
+import inspect
+import hashlib
+import logging
+from typing import Dict, List
+import numpy as np
+
+
+def state_arrays(state) -> Dict[str, np.ndarray]:
+    """A llama_cpp.LlamaState (or the fake backend's dict state) as plain arrays for np.savez."""
+    if isinstance(state, dict):
+        return {"kind": np.array("fake"), "input_ids": np.asarray(state["input_ids"], dtype=np.int64)}
+    arrays = {
+        "kind": np.array("llama"),
+        "input_ids": np.asarray(state.input_ids),
+        "scores": np.asarray(state.scores),
+        "n_tokens": np.array(state.n_tokens),
+        "llama_state": np.frombuffer(bytes(state.llama_state), dtype=np.uint8),
+        "llama_state_size": np.array(state.llama_state_size),
+    }
+    if getattr(state, "seed", None) is not None:
+        arrays["seed"] = np.array(state.seed)
+    return arrays
+
+
+def state_from_arrays(arrays) -> object:
+    """Inverse of state_arrays. Only numbers and bytes are read; nothing is unpickled."""
+    if str(arrays["kind"]) == "fake":
+        return {"input_ids": arrays["input_ids"].tolist()}
+    from llama_cpp.llama import LlamaState
+    fields = {
+        "input_ids": arrays["input_ids"],
+        "scores": arrays["scores"],
+        "n_tokens": int(arrays["n_tokens"]),
+        "llama_state": arrays["llama_state"].tobytes(),
+        "llama_state_size": int(arrays["llama_state_size"]),
+        "seed": int(arrays["seed"]) if "seed" in arrays else None,
+    }
+    # The constructor's fields differ between llama-cpp-python versions (e.g. `seed`)
+    accepted = inspect.signature(LlamaState.__init__).parameters
+    return LlamaState(**{name: value for name, value in fields.items() if name in accepted})
+
+
+class PrefixStateCache:
+    """
+    llama.cpp state (KV cache, token IDs, logits) after evaluating a fixed prompt prefix.
+
+    The state is computed once, kept in memory and written to `cache_dir` (as
+    plain arrays with np.savez, never pickled), keyed by
+    the model file (name, size, mtime), the context settings and a hash of the prefix
+    text, so a restart restores it from disk instead of prefilling the prefix again.
+    Before each request `restore` puts the model back in that state; llama.cpp then
+    only evaluates the tokens after the longest common prefix.
+    """
+
+    def __init__(self, llm, model_path: str, prefix: str, cache_dir: str):
+        self.llm = llm
+        self.prefix = prefix
+        self.cache_dir = cache_dir
+        self.tokens: List[int] = llm.tokenize(prefix.encode("utf-8"), add_bos=True)
+        self.path = os.path.join(cache_dir, f"{self._key(model_path)}.npz")
+        self.state = None
+
+    def _key(self, model_path: str) -> str:
+        # No file for the fake backend (benchmark.py --fake)
+        stat = os.stat(model_path) if os.path.exists(model_path) else None
+        size, mtime = (stat.st_size, stat.st_mtime) if stat else (0, 0)
+        digest = hashlib.sha256()
+        digest.update(f"{os.path.basename(model_path)}:{size}:{mtime}:{self.llm.n_ctx()}:{self.llm.context_params.logits_all}\n".encode("utf-8"))
+        digest.update(self.prefix.encode("utf-8"))
+        name = os.path.splitext(os.path.basename(model_path))[0]
+        return f"{name}-{digest.hexdigest()[:16]}"
+
+    def load_or_build(self):
+        """Loads the prefix state from disk, or evaluates the prefix and saves it."""
+        if os.path.exists(self.path):
+            try:
+                with np.load(self.path, allow_pickle=False) as arrays:
+                    self.state = state_from_arrays(arrays)
+                self.llm.load_state(self.state)
+                logging.info(f"Restored prompt prefix state ({len(self.tokens)} tokens) from {self.path}")
+                return
+            except Exception as e:
+                logging.warning(f"Ignoring unreadable prompt prefix state {self.path}: {e}")
+                self.state = None
+
+        logging.info(f"Evaluating prompt prefix ({len(self.tokens)} tokens)...")
+        self.llm.reset()
+        self.llm.eval(self.tokens)
+        self.state = self.llm.save_state()
+
+        os.makedirs(self.cache_dir, exist_ok=True)
+        tmp_path = self.path + ".tmp"
+        try:
+            with open(tmp_path, "wb") as f:
+                np.savez(f, **state_arrays(self.state))
+            os.replace(tmp_path, self.path)
+        except OSError as e:
+            logging.warning(f"Could not save prompt prefix state to {self.path}: {e}")
+
+    def restore(self, prompt_tokens: List[int]) -> int:
+        """
+        Puts the model in the prefix state if `prompt_tokens` starts with the prefix.
+        Returns the number of prompt tokens that will not be prefilled again.
+        """
+        if self.state is None or prompt_tokens[:len(self.tokens)] != self.tokens:
+            return 0
+        self.llm.load_state(self.state)
+        return len(self.tokens)
+
@@ -1,55 +1,185 @@
 import os
+import time
 import logging
-from typing import List, Dict, Tuple
-from langchain_community.vectorstores import FAISS
-from langchain_community.embeddings import HuggingFaceEmbeddings
+from typing import List, Dict, Optional
+import numpy as np
+import faiss
 from langchain_core.documents import Document
+from src.chunk_store import MappedVectorStore
+from src.embedding_cache import get_query_embeddings
+from src.index_factory import configure_search, search_params
+from src.metadata import FacetIndex, normalize_filters
+from src.sparse_index import SparseIndex, reciprocal_rank_fusion
+from src import telemetry
 import config
 
 logging.basicConfig(level=logging.INFO)
 
 class NCERTRetriever:
     def __init__(self):
-        self.embeddings = HuggingFaceEmbeddings(model_name=config.EMBEDDING_MODEL_NAME)
+        # Read-only view of the ingestion cache plus an LRU of recent queries
+        self.embeddings = get_query_embeddings()
         self.vector_store = self._load_vector_store()
+        self.facets = FacetIndex.load(config.FACET_INDEX_PATH) if self.vector_store else None
+        self.sparse = SparseIndex.load(config.SPARSE_INDEX_PATH) if self.vector_store else None
+        self._warned_sparse = False
 
-    def _load_vector_store(self):
-        """Loads the FAISS index from disk."""
+    def _load_vector_store(self) -> Optional[MappedVectorStore]:
+        """
+        Opens the FAISS index and chunk store from disk. The chunk store is memory-mapped
+        and decoded lazily by row; the index is mapped too where faiss supports it
+        (see read_index), so startup cost does not grow with the corpus.
+        """
         if not os.path.exists(config.VECTOR_DB_DIR) or not os.listdir(config.VECTOR_DB_DIR):
             logging.warning(f"Vector DB not found at {config.VECTOR_DB_DIR}. Please run ingestion first.")
             return None
         
         try:
-            return FAISS.load_local(config.VECTOR_DB_DIR, self.embeddings, allow_dangerous_deserialization=True)
+            vector_store = MappedVectorStore.load(config.VECTOR_DB_DIR)
+            if vector_store:
+                # Any index type built by src.index_factory loads here; apply its query-time knobs
+                configure_search(vector_store.index)
+            return vector_store
         except Exception as e:
             logging.error(f"Error loading Vector DB: {e}")
             return None
 
-    def retrieve(self, query: str, top_k: int = config.TOP_K_RETRIEVAL, filters: Dict = None) -> List[Document]:
+    def retrieve(self, query: str, top_k: int = config.TOP_K_RETRIEVAL, filters: Dict = None,
+                 mode: str = config.RETRIEVAL_MODE) -> List[Document]:
         """
         Retrieves relevant documents for a query.
         
         Args:
             query: The user's question.
             top_k: Number of documents to retrieve.
-            filters: Optional metadata filters (e.g., {"subject": "Science"}). 
-                     Note: standard FAISS doesn't support complex filtering easily without metadata wrappers,
-                     so strictly speaking this might require a different vector store or post-filtering. 
-                     For this implementation, we will use basic vector search and optional post-filtering if needed.
+            filters: Optional metadata filters (e.g., {"grade": "Grade 6", "subject": "Science"}).
+                     Filters are applied inside the search: the facet index gives the
+                     matching rows, which are either scanned exactly (small sets) or
+                     passed to FAISS as an ID-selector bitmap, so a narrower filter
+                     means less work rather than over-fetching and dropping results.
+            mode: "dense" for embedding similarity only, or "hybrid" to fuse it with
+                  BM25 over the precomputed inverted index (catches exact terms such
+                  as "Fleming's Left-Hand Rule" or chemical formulas).
+        """
+        return self.retrieve_many([query], top_k=top_k, filters=filters, mode=mode)["results"][0]
+
+    def retrieve_many(self, queries: List[str], top_k: int = config.TOP_K_RETRIEVAL, filters: Dict = None,
+                      mode: str = config.RETRIEVAL_MODE) -> Dict:
+        """
+        Retrieves documents for a batch of queries sharing the same filters.
+
+        All queries are encoded in one batched forward pass and searched with a
+        single batched FAISS call. Returns {"results": one document list per query,
+        in input order, "timing": seconds spent per stage for the whole batch}.
         """
+        timing = {"queries": len(queries), "embed": 0.0, "search": 0.0, "sparse": 0.0, "total": 0.0}
+        results = [[] for _ in queries]
         if not self.vector_store:
             logging.error("Vector Store is not initialized.")
-            return []
+            return {"results": results, "timing": timing}
+        if not queries:
+            return {"results": results, "timing": timing}
 
-        # basic search
-        docs = self.vector_store.similarity_search(query, k=top_k)
-        
-        # If we had metadata filters, we would apply them here if the vector store supports it
-        # or post-filter the results. For simplicity with basic FAISS, we return the top results.
-        # Improvement: Fetch 2*top_k and filter manually if strictly needed.
-        
+        start = time.perf_counter()
+        with telemetry.span("retrieval.filter"):
+            candidates = self._candidates(filters)
+        if candidates is not None and len(candidates) == 0:
+            timing["total"] = time.perf_counter() - start
+            return {"results": results, "timing": timing}
+
+        t0 = time.perf_counter()
+        with telemetry.span("retrieval.embed", queries=len(queries)):
+            query_vectors = np.asarray(self.embeddings.embed_queries(queries), dtype=np.float32)
+        timing["embed"] = time.perf_counter() - t0
+
+        hybrid = mode == "hybrid" and self._sparse_ready()
+        fetch_k = max(top_k, config.HYBRID_FETCH_K) if hybrid else top_k
+        t0 = time.perf_counter()
+        with telemetry.span("retrieval.dense_search"):
+            rows_per_query = self._search_rows(query_vectors, fetch_k, candidates)
+        timing["search"] = time.perf_counter() - t0
+
+        if hybrid:
+            t0 = time.perf_counter()
+            with telemetry.span("retrieval.sparse_search"):
+                for i, query in enumerate(queries):
+                    sparse_rows = [row for row, _ in self.sparse.search(query, fetch_k, candidates)]
+                    rows_per_query[i] = reciprocal_rank_fusion([rows_per_query[i], sparse_rows])
+            timing["sparse"] = time.perf_counter() - t0
+
+        with telemetry.span("retrieval.load_chunks"):
+            results = [self._docs(query_vectors[i], rows[:top_k]) for i, rows in enumerate(rows_per_query)]
+        timing["total"] = time.perf_counter() - start
+        return {"results": results, "timing": timing}
+
+    def _sparse_ready(self) -> bool:
+        if self.sparse is None or self.sparse.ntotal != self.vector_store.index.ntotal:
+            if not self._warned_sparse:
+                logging.warning("No sparse index matching the Vector DB; using dense retrieval. Re-run ingestion.")
+                self._warned_sparse = True
+            return False
+        return True
+
+    def _candidates(self, filters: Optional[Dict]) -> Optional[np.ndarray]:
+        """Row IDs allowed by the filters, or None for an unfiltered search."""
+        filters = normalize_filters(filters)
+        if not filters:
+            return None
+        if self.facets is None or self.facets.ntotal != self.vector_store.index.ntotal:
+            logging.warning("No facet index matching the Vector DB; filters are ignored. Re-run ingestion with --rebuild.")
+            return None
+        return self.facets.candidates(filters)
+
+    def _search_rows(self, query_vectors: np.ndarray, top_k: int, candidates: Optional[np.ndarray] = None) -> List[List[int]]:
+        """Top-k rows for each query vector (shape n x d), optionally among `candidates` only."""
+        index = self.vector_store.index
+        if candidates is not None and len(candidates) <= config.FILTER_EXACT_SCAN_MAX:
+            # Small candidate set: exact distances over just those rows
+            try:
+                vectors = index.reconstruct_batch(candidates)
+                distances = (
+                    (query_vectors ** 2).sum(axis=1, keepdims=True)
+                    - 2.0 * query_vectors @ vectors.T
+                    + (vectors ** 2).sum(axis=1)
+                )
+                k = min(top_k, len(candidates))
+                best = np.argpartition(distances, k - 1, axis=1)[:, :k]
+                order = np.take_along_axis(distances, best, axis=1).argsort(axis=1)
+                return candidates[np.take_along_axis(best, order, axis=1)].tolist()
+            except RuntimeError:
+                pass  # index type without reconstruct support
+
+        params = None
+        if candidates is not None:
+            mask = np.zeros(index.ntotal, dtype=bool)
+            mask[candidates] = True
+            bitmap = np.packbits(mask, bitorder="little")
+            selector = faiss.IDSelectorBitmap(index.ntotal, faiss.swig_ptr(bitmap))
+            params = search_params(index, selector)
+        _, rows = index.search(query_vectors, top_k, params=params)
+        return [[int(row) for row in query_rows if row != -1] for query_rows in rows]
+
+    def _doc(self, row: int) -> Document:
+        return self.vector_store.doc(row)
+
+    def _docs(self, query_vector: np.ndarray, rows: List[int]) -> List[Document]:
+        """Documents for `rows`, each with its squared L2 distance to the query under metadata["distance"]."""
+        docs = [self._doc(row) for row in rows]
+        if not rows:
+            return docs
+        try:
+            vectors = self.vector_store.index.reconstruct_batch(np.asarray(rows, dtype=np.int64))
+        except RuntimeError:
+            return docs  # index type without reconstruct support
+        distances = ((vectors - query_vector) ** 2).sum(axis=1)
+        for doc, distance in zip(docs, distances):
+            doc.metadata["distance"] = float(distance)
         return docs
 
+    def cache_stats(self) -> Dict:
+        """Query-embedding cache counters and hit rate."""
+        return {**self.embeddings.stats, "query_hit_rate": self.embeddings.hit_rate()["queries"]}
+
 if __name__ == "__main__":
     retriever = NCERTRetriever()
     if retriever.vector_store:
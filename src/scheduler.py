@@ -0,0 +1,184 @@
+import os
+import time
+import queue
+import logging
+import threading
+import contextvars
+from collections import deque
+from typing import Dict, Iterator, List, Optional
+import numpy as np
+from src.generation import LocalLLMGenerator
+from src.cascade import create_generator
+from src import telemetry
+import config
+
+
+class SchedulerBusy(RuntimeError):
+    """Raised by GenerationScheduler.submit when the admission queue is full."""
+
+
+class GenerationRequest:
+    """
+    One queued generation. Workers push ("token", text), ("error", exc) and a
+    final ("done", None) event; the submitter reads them with `stream`.
+    """
+
+    def __init__(self, query: str, docs: list, deadline: float, previous=None, keep_turn: bool = False):
+        self.query = query
+        self.docs = docs
+        # Previous turn of the conversation (src.session.Turn), and whether to keep this one
+        self.previous = previous
+        self.keep_turn = keep_turn
+        self.turn: Optional[Dict] = None
+        # Chunks the model was actually given (None until generation finishes)
+        self.context_docs: Optional[list] = None
+        self.submitted = time.time()
+        self.deadline = deadline
+        self.started: Optional[float] = None
+        self.truncated = False
+        self.stats: Dict = {}
+        self.events = queue.Queue()
+        self._cancelled = threading.Event()
+        # Submitter's context (current telemetry span), re-entered by the worker
+        self.context = contextvars.copy_context()
+
+    @property
+    def wait_time(self) -> float:
+        """Seconds spent in the admission queue (so far, if not started)."""
+        return (self.started or time.time()) - self.submitted
+
+    def expired(self) -> bool:
+        return time.time() > self.deadline
+
+    def cancel(self):
+        """Drops the request if still queued, or stops its generation at the next token."""
+        self._cancelled.set()
+
+    @property
+    def cancelled(self) -> bool:
+        return self._cancelled.is_set()
+
+    def stream(self) -> Iterator[str]:
+        """Yields answer text as the worker produces it. Cancels the request if the reader stops early."""
+        try:
+            while True:
+                kind, value = self.events.get()
+                if kind == "token":
+                    yield value
+                elif kind == "error":
+                    raise value
+                else:
+                    return
+        finally:
+            self.cancel()
+
+
+class GenerationScheduler:
+    """
+    Bounded FIFO admission queue in front of a pool of LocalLLMGenerator workers.
+
+    Every worker owns its own llama.cpp context and gets an equal share of the
+    CPU threads, so concurrent students are served by exactly `workers`
+    generations at a time instead of contending for one model. The weights are
+    memory-mapped by llama.cpp and shared between workers. Requests are served in
+    arrival order; a request that waits past its deadline is failed without
+    running, and one that runs past it is cut off at the next token.
+    """
+
+    def __init__(self, workers: int = config.GENERATION_WORKERS, queue_size: int = config.GENERATION_QUEUE_SIZE,
+                 n_threads: int = config.LLM_THREADS):
+        total_threads = n_threads or max(1, os.cpu_count() - 2) # Reserve some threads
+        threads_per_worker = max(1, total_threads // workers)
+        logging.info(f"Starting {workers} generation worker(s) with {threads_per_worker} threads each")
+
+        self.queue = queue.Queue(maxsize=queue_size)
+        # LocalLLMGenerator, or a CascadeGenerator with the same interface
+        self.generators: List[LocalLLMGenerator] = [
+            create_generator(n_threads=threads_per_worker) for _ in range(workers)
+        ]
+        self._lock = threading.Lock()
+        self._active = 0
+        self._waits = deque(maxlen=1000)
+        self._counts = {"completed": 0, "rejected": 0, "expired": 0, "cancelled": 0}
+        for i, generator in enumerate(self.generators):
+            threading.Thread(target=self._work, args=(generator,), name=f"generation-worker-{i}", daemon=True).start()
+
+    def submit(self, query: str, docs: list, timeout: float = config.GENERATION_DEADLINE,
+               previous=None, keep_turn: bool = False) -> GenerationRequest:
+        """
+        Queues a generation. Raises SchedulerBusy if the admission queue is full.
+        A follow-up passes the conversation's `previous` turn; with `keep_turn` the
+        worker's tokens and model state after answering end up in `request.turn`.
+        """
+        request = GenerationRequest(query, docs, time.time() + timeout, previous, keep_turn)
+        try:
+            self.queue.put_nowait(request)
+        except queue.Full:
+            self._count("rejected")
+            raise SchedulerBusy(f"Generation queue is full ({self.queue.maxsize} waiting). Please retry shortly.")
+        return request
+
+    def _work(self, generator: LocalLLMGenerator):
+        while True:
+            request = self.queue.get()
+            request.started = time.time()
+            with self._lock:
+                self._waits.append(request.wait_time)
+                self._active += 1
+            try:
+                request.context.run(self._run, generator, request)
+            except Exception as e:
+                logging.error(f"Generation failed: {e}")
+                request.events.put(("error", e))
+            finally:
+                with self._lock:
+                    self._active -= 1
+                request.events.put(("done", None))
+
+    def _run(self, generator: LocalLLMGenerator, request: GenerationRequest):
+        telemetry.record("queue_wait", request.submitted, request.started)
+        telemetry.observe("queue_wait_seconds", request.wait_time)
+        if request.cancelled:
+            self._count("cancelled")
+            return
+        if request.expired():
+            self._count("expired")
+            request.events.put(("error", TimeoutError(f"Request waited {request.wait_time:.1f}s in the queue, past its deadline.")))
+            return
+
+        for text in generator.generate_stream(request.query, request.docs, previous=request.previous,
+                                              keep_turn=request.keep_turn):
+            if request.cancelled or request.expired():
+                request.truncated = True
+                break
+            request.events.put(("token", text))
+        request.stats = dict(generator.last_stats)
+        request.context_docs = generator.last_docs
+        if not request.truncated:
+            request.turn = generator.last_turn
+
+        if request.cancelled:
+            self._count("cancelled")
+        elif request.truncated:
+            logging.warning(f"Generation cut off at the {config.GENERATION_DEADLINE}s deadline.")
+            self._count("expired")
+        else:
+            self._count("completed")
+
+    def _count(self, key: str):
+        with self._lock:
+            self._counts[key] += 1
+
+    def stats(self) -> Dict:
+        """Queue depth, busy workers, request counts and queue wait percentiles (recent requests)."""
+        with self._lock:
+            waits = np.asarray(self._waits) if self._waits else np.zeros(1)
+            return {
+                "queue_depth": self.queue.qsize(),
+                "queue_capacity": self.queue.maxsize,
+                "workers": len(self.generators),
+                "active": self._active,
+                **self._counts,
+                "wait_p50": float(np.percentile(waits, 50)),
+                "wait_p95": float(np.percentile(waits, 95))
+            }
@@ -0,0 +1,152 @@
+import re
+import time
+import logging
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Optional
+from src.sparse_index import tokenize
+import config
+
+# Words that point back at the previous turn ("explain it more simply", "इसका उदाहरण दीजिए")
+REFERENCES = {
+    "it", "its", "this", "that", "these", "those", "they", "them", "their", "he", "she", "him", "her", "his",
+    "यह", "इसे", "इसका", "इसकी", "इसके", "इस", "वह", "उसे", "उसका", "उसकी", "उसके", "ये", "वे", "इन्हें", "उन्हें",
+}
+
+# Requests that only make sense about the previous answer. A leading "so" or "and"
+# is not one: "So what is mitosis?" is a new question.
+FOLLOW_UP_CUES = re.compile(
+    r"\b(?:more\s+simply|simpler|simple\s+(?:words|terms|language)|in\s+short|briefly|summari[sz]e|elaborate|"
+    r"in\s+detail|more\s+detail|explain\s+(?:again|more|further)|give\s+(?:an?\s+)?examples?|for\s+example|"
+    r"what\s+about|how\s+about|in\s+hindi|in\s+english|translate)\b|"
+    r"^\s*why\s+so\b|सरल|उदाहरण|विस्तार|संक्षेप|और\s+बताइए|हिंदी\s+में",
+    re.IGNORECASE
+)
+
+# Function words and request verbs that do not change what the question is about
+FILLER = {
+    "a", "an", "the", "is", "are", "was", "were", "be", "of", "in", "on", "to", "for", "with", "and", "or", "but",
+    "so", "then", "also", "please", "can", "could", "you", "me", "i", "we", "do", "does", "did", "what", "why",
+    "how", "about", "more", "simply", "simpler", "simple", "words", "terms", "language", "short", "briefly",
+    "summarize", "summarise", "elaborate", "detail", "explain", "again", "further", "give", "example",
+    "examples", "hindi", "english", "translate", "tell", "it's", "s", "define", "state", "describe", "meant",
+    "mean", "by", "मुझे", "में", "का", "की", "के", "है",
+    "हैं", "और", "बताइए", "समझाइए", "दीजिए", "सरल", "उदाहरण", "विस्तार", "से", "संक्षेप",
+}
+
+
+def follow_up_kind(query: str, topic: str) -> Optional[str]:
+    """
+    Whether `query` continues the conversation about `topic` (the question that
+    started it): None for a new question, "reuse" when it adds nothing to search
+    for ("Explain it more simply"), "extend" when it brings new terms
+    ("What about its unit?" after "Define power").
+
+    A pronoun alone does not make a follow-up ("Why do leaves change their
+    colour?" is self-contained): the query needs a follow-up cue, or a reference
+    word and no new terms. New terms that outweigh the topic's make it a new question.
+    """
+    tokens = tokenize(query)
+    if not tokens or len(tokens) > config.SESSION_FOLLOW_UP_MAX_WORDS:
+        return None
+    new_terms = set(tokens) - REFERENCES - FILLER - set(tokenize(topic))
+    if not new_terms:
+        return "reuse" if REFERENCES & set(tokens) or FOLLOW_UP_CUES.search(query) else None
+    if not FOLLOW_UP_CUES.search(query):
+        return None
+    topic_terms = set(tokenize(topic)) - REFERENCES - FILLER
+    return "extend" if len(new_terms) <= len(topic_terms) else None
+
+
+def state_bytes(state) -> int:
+    """Approximate memory held by a saved model state (llama_cpp.LlamaState or the fake's dict)."""
+    if state is None:
+        return 0
+    if isinstance(state, dict):
+        return 8 * len(state.get("input_ids", []))
+    size = getattr(state, "llama_state_size", 0)
+    for name in ("input_ids", "scores"):
+        size += getattr(getattr(state, name, None), "nbytes", 0)
+    return size
+
+
+class Turn:
+    """
+    What a session keeps of its last answered turn: the retrieved chunks, the
+    question that started the topic and, for generated answers, the exact token
+    sequence the model evaluated and (optionally) its saved KV state.
+    """
+
+    def __init__(self, query: str, topic: str, docs: list, tokens: Optional[List[int]] = None,
+                 state=None, model_path: Optional[str] = None):
+        self.query = query
+        self.topic = topic
+        self.docs = docs
+        self.tokens = tokens
+        self.state = state
+        self.model_path = model_path
+        self.created = time.time()
+
+    @property
+    def state_bytes(self) -> int:
+        return state_bytes(self.state)
+
+
+class SessionStore:
+    """
+    Last turn per conversation, least recently used first. Saved model states
+    are the expensive part (the KV cache of the whole conversation), so when
+    their total exceeds `budget_bytes` the oldest sessions lose theirs first;
+    their chunks stay, so follow-ups still skip retrieval and only prefill again.
+    Sessions idle for `ttl` seconds, or beyond `max_sessions`, are dropped.
+    """
+
+    def __init__(self, max_sessions: int = config.SESSION_MAX, budget_bytes: int = config.SESSION_STATE_BUDGET_MB * 1024 * 1024,
+                 ttl: float = config.SESSION_TTL):
+        self.max_sessions = max_sessions
+        self.budget_bytes = budget_bytes
+        self.ttl = ttl
+        self._turns: "OrderedDict[str, Turn]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.state_total = 0
+        self.stats = {"follow_ups": 0, "states_evicted": 0, "sessions_expired": 0}
+
+    def get(self, session_id: str) -> Optional[Turn]:
+        with self._lock:
+            turn = self._turns.get(session_id)
+            if turn is None:
+                return None
+            if time.time() - turn.created > self.ttl:
+                self._drop(session_id)
+                self.stats["sessions_expired"] += 1
+                return None
+            self._turns.move_to_end(session_id)
+            return turn
+
+    def put(self, session_id: str, turn: Turn):
+        with self._lock:
+            if session_id in self._turns:
+                self._drop(session_id)
+            self._turns[session_id] = turn
+            self.state_total += turn.state_bytes
+            while len(self._turns) > self.max_sessions:
+                self._drop(next(iter(self._turns)))
+            for old in self._turns.values():
+                if self.state_total <= self.budget_bytes:
+                    break
+                if old.state is not None:
+                    self.state_total -= old.state_bytes
+                    old.state = None
+                    self.stats["states_evicted"] += 1
+            if self.state_total > self.budget_bytes:
+                logging.warning(f"Session state {self.state_total / 2**20:.0f} MB exceeds the budget on its own; not keeping it.")
+                self.state_total -= turn.state_bytes
+                turn.state = None
+
+    def _drop(self, session_id: str):
+        turn = self._turns.pop(session_id)
+        self.state_total -= turn.state_bytes
+
+    def summary(self) -> Dict:
+        with self._lock:
+            return {"sessions": len(self._turns), "state_mb": self.state_total / 2**20, **self.stats}
@@ -0,0 +1,102 @@
+import os
+import shutil
+import logging
+from typing import List, Dict, Iterator, Optional, Tuple
+import numpy as np
+import faiss
+from langchain_core.documents import Document
+from src.chunk_store import ChunkStore, read_index, write_index
+from src.index_factory import build_index, sample_rows
+
+
+class ShardWriter:
+    """
+    Append-only writer of FAISS index shards.
+
+    Embedded chunks are buffered until `shard_size` vectors are collected, then
+    written to disk as a self-contained shard and dropped from memory. Shards are
+    never modified after being written; `merge_into` folds their vectors into the
+    main index once the whole corpus has streamed through, and `chunks` streams
+    their text and metadata into the main chunk store. Shards are always flat;
+    the main index can be any type from src.index_factory.
+    """
+
+    def __init__(self, shard_dir: str, shard_size: int):
+        self.shard_dir = shard_dir
+        self.shard_size = shard_size
+        self.paths: List[str] = []
+        self.sizes: List[int] = []
+        self.total = 0
+        self._texts, self._vectors, self._metadatas, self._ids = [], [], [], []
+
+        # Leftovers from an interrupted run are not part of this one
+        shutil.rmtree(self.shard_dir, ignore_errors=True)
+        os.makedirs(self.shard_dir, exist_ok=True)
+
+    def add(self, texts: List[str], vectors: List[List[float]], metadatas: List[Dict], ids: List[str]):
+        self._texts.extend(texts)
+        self._vectors.extend(vectors)
+        self._metadatas.extend(metadatas)
+        self._ids.extend(ids)
+        self.total += len(texts)
+        if len(self._texts) >= self.shard_size:
+            self.flush()
+
+    def flush(self):
+        """Writes the buffered vectors as a new shard."""
+        if not self._texts:
+            return
+        vectors = np.asarray(self._vectors, dtype=np.float32)
+        index = faiss.IndexFlatL2(vectors.shape[1])
+        index.add(vectors)
+        path = os.path.join(self.shard_dir, f"shard_{len(self.paths):05d}")
+        write_index(path, index)
+        ChunkStore.write(path, (
+            (chunk_id, Document(page_content=text, metadata=metadata))
+            for chunk_id, text, metadata in zip(self._ids, self._texts, self._metadatas)
+        ))
+        self.paths.append(path)
+        self.sizes.append(len(self._texts))
+        logging.info(f"Wrote shard {path} ({len(self._texts)} vectors, {self.total} total)")
+        self._texts, self._vectors, self._metadatas, self._ids = [], [], [], []
+
+    def merge_into(self, index: Optional[faiss.Index], index_type: str) -> Optional[faiss.Index]:
+        """
+        Adds the vectors of every shard, one shard at a time, to `index`. When there
+        is no index yet, one of `index_type` is created first, trained on a sample
+        drawn across all shards. Rows are appended in shard order, matching `chunks`.
+        """
+        self.flush()
+        if not self.paths:
+            return index
+
+        if index is None:
+            sample = self._training_sample()
+            index = build_index(index_type, sample.shape[1], self.total, sample)
+
+        for path in self.paths:
+            shard = read_index(path, mmap_index=False)
+            index.add(shard.reconstruct_n(0, shard.ntotal))
+        return index
+
+    def chunks(self) -> Iterator[Tuple[str, Document]]:
+        """(chunk_id, Document) of every shard in row order, read lazily from the shards' chunk stores."""
+        for path in self.paths:
+            store = ChunkStore(path)
+            yield from store
+            store.close()
+
+    def _training_sample(self) -> np.ndarray:
+        """Vectors at reproducible random rows across all shards."""
+        rows = sample_rows(self.total)
+        starts = np.cumsum([0] + self.sizes)
+        parts = []
+        for i, path in enumerate(self.paths):
+            local = rows[(rows >= starts[i]) & (rows < starts[i + 1])] - starts[i]
+            if len(local):
+                index = read_index(path, mmap_index=False)
+                parts.append(index.reconstruct_batch(local))
+        return np.concatenate(parts)
+
+    def cleanup(self):
+        shutil.rmtree(self.shard_dir, ignore_errors=True)
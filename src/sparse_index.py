@@ -0,0 +1,132 @@
+import os
+import re
+import math
+import logging
+import unicodedata
+from collections import Counter
+from typing import Iterable, List, Dict, Optional, Tuple
+import numpy as np
+import config
+
+# Latin letters/digits plus the Devanagari block. Vowel signs, virama and nukta
+# are not \w in Python, so they are listed explicitly to keep Hindi words whole;
+# the danda (U+0964/5) is punctuation and splits tokens.
+TOKEN_PATTERN = re.compile(r"[\w\u0900-\u0963\u0966-\u097F]+")
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercased word tokens for Latin and Devanagari text ("H2O" -> "h2o", "Left-Hand" -> "left", "hand")."""
+    text = unicodedata.normalize("NFC", text).lower()
+    return [t.strip("_") for t in TOKEN_PATTERN.findall(text) if t.strip("_")]
+
+
+class SparseIndex:
+    """
+    BM25 inverted index with precomputed term weights.
+
+    Postings are stored CSR-style (offsets, row IDs, weights) so a query only
+    touches the postings of its own terms: the score of a row is the sum of the
+    stored BM25 weights of the query terms it contains. Nothing is rescored at
+    query time, unlike rank_bm25's BM25Okapi.get_scores over the whole corpus.
+    """
+
+    def __init__(self, vocab: Dict[str, int], offsets: np.ndarray, rows: np.ndarray, weights: np.ndarray, ntotal: int):
+        self.vocab = vocab
+        self.offsets = offsets
+        self.rows = rows
+        self.weights = weights
+        self.ntotal = ntotal
+
+    @classmethod
+    def build(cls, texts: Iterable[str], k1: float = config.BM25_K1, b: float = config.BM25_B) -> "SparseIndex":
+        """BM25 index over `texts` in row order (any iterable, e.g. streamed from a ChunkStore)."""
+        vocab: Dict[str, int] = {}
+        term_rows: List[List[int]] = []
+        term_tfs: List[List[int]] = []
+        lengths: List[int] = []
+
+        for row, text in enumerate(texts):
+            counts = Counter(tokenize(text))
+            lengths.append(sum(counts.values()))
+            for term, tf in counts.items():
+                term_id = vocab.setdefault(term, len(vocab))
+                if term_id == len(term_rows):
+                    term_rows.append([])
+                    term_tfs.append([])
+                term_rows[term_id].append(row)
+                term_tfs[term_id].append(tf)
+
+        doc_lens = np.asarray(lengths, dtype=np.float32)
+        n_docs = len(doc_lens)
+        avg_len = float(doc_lens.mean()) if n_docs else 0.0
+        offsets = np.zeros(len(vocab) + 1, dtype=np.int64)
+        rows_parts, weight_parts = [], []
+        for term_id in range(len(vocab)):
+            rows = np.asarray(term_rows[term_id], dtype=np.int32)
+            tfs = np.asarray(term_tfs[term_id], dtype=np.float32)
+            df = len(rows)
+            idf = math.log(1.0 + (n_docs - df + 0.5) / (df + 0.5))
+            norm = k1 * (1.0 - b + b * doc_lens[rows] / avg_len) if avg_len else k1
+            rows_parts.append(rows)
+            weight_parts.append((idf * tfs * (k1 + 1.0) / (tfs + norm)).astype(np.float32))
+            offsets[term_id + 1] = offsets[term_id] + df
+
+        rows = np.concatenate(rows_parts) if rows_parts else np.empty(0, dtype=np.int32)
+        weights = np.concatenate(weight_parts) if weight_parts else np.empty(0, dtype=np.float32)
+        return cls(vocab, offsets, rows, weights, n_docs)
+
+    def save(self, path: str):
+        terms = sorted(self.vocab, key=self.vocab.get)
+        np.savez(
+            path,
+            terms=np.asarray(terms, dtype=str),
+            offsets=self.offsets,
+            rows=self.rows,
+            weights=self.weights,
+            ntotal=np.asarray([self.ntotal])
+        )
+
+    @classmethod
+    def load(cls, path: str) -> Optional["SparseIndex"]:
+        if not os.path.exists(path):
+            return None
+        try:
+            with np.load(path) as data:
+                vocab = {term: i for i, term in enumerate(data["terms"].tolist())}
+                return cls(vocab, data["offsets"], data["rows"], data["weights"], int(data["ntotal"][0]))
+        except Exception as e:
+            logging.warning(f"Could not load sparse index {path}: {e}")
+            return None
+
+    def search(self, query: str, top_k: int, candidates: Optional[np.ndarray] = None) -> List[Tuple[int, float]]:
+        """
+        Top-k (row, score) pairs for a query, optionally restricted to the
+        sorted row IDs in `candidates`.
+        """
+        term_ids = {self.vocab[t] for t in tokenize(query) if t in self.vocab}
+        if not term_ids:
+            return []
+
+        rows = np.concatenate([self.rows[self.offsets[t]:self.offsets[t + 1]] for t in term_ids])
+        weights = np.concatenate([self.weights[self.offsets[t]:self.offsets[t + 1]] for t in term_ids])
+        if candidates is not None:
+            keep = np.isin(rows, candidates, assume_unique=False)
+            rows, weights = rows[keep], weights[keep]
+            if len(rows) == 0:
+                return []
+
+        unique_rows, inverse = np.unique(rows, return_inverse=True)
+        scores = np.bincount(inverse, weights=weights)
+        k = min(top_k, len(unique_rows))
+        best = np.argpartition(-scores, k - 1)[:k]
+        best = best[np.argsort(-scores[best])]
+        return [(int(unique_rows[i]), float(scores[i])) for i in best]
+
+
+def reciprocal_rank_fusion(ranked_lists: List[List[int]], k: int = config.RRF_K) -> List[int]:
+    """Fuses ranked row lists by summing 1 / (k + rank) per list."""
+    scores: Dict[int, float] = {}
+    for ranked in ranked_lists:
+        for rank, row in enumerate(ranked):
+            scores[row] = scores.get(row, 0.0) + 1.0 / (k + rank + 1)
+    return sorted(scores, key=lambda row: (-scores[row], row))
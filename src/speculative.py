@@ -0,0 +1,92 @@
+import os
+import logging
+from typing import Optional
+import numpy as np
+import numpy.typing as npt
+from llama_cpp import Llama
+from llama_cpp.llama_speculative import LlamaDraftModel, LlamaPromptLookupDecoding
+import config
+
+SPECULATIVE_MODES = ["off", "prompt_lookup", "draft_model"]
+
+
+class GGUFDraftModel(LlamaDraftModel):
+    """
+    Drafts tokens greedily with a small GGUF model. The draft model must share
+    the main model's vocabulary (e.g. a smaller model of the same family).
+    """
+
+    def __init__(self, model_path: str, num_pred_tokens: int, n_threads: int):
+        self.num_pred_tokens = num_pred_tokens
+        self.llm = Llama(
+            model_path=model_path,
+            n_ctx=config.CONTEXT_WINDOW,
+            n_threads=n_threads,
+            use_mmap=config.LLM_USE_MMAP,
+            use_mlock=config.LLM_USE_MLOCK,
+            verbose=False
+        )
+
+    def __call__(self, input_ids: npt.NDArray[np.intc], /, **kwargs) -> npt.NDArray[np.intc]:
+        draft = []
+        # reset=True lets llama.cpp keep the longest common prefix of the previous call
+        for token in self.llm.generate(input_ids.tolist(), top_k=1, temp=0.0, reset=True):
+            if token == self.llm.token_eos():
+                break
+            draft.append(token)
+            if len(draft) >= self.num_pred_tokens:
+                break
+        return np.array(draft, dtype=np.intc)
+
+
+class CountingDraftModel(LlamaDraftModel):
+    """
+    Wraps a draft model and counts verification rounds and drafted tokens.
+
+    llama.cpp verifies a round's drafts in one batch and keeps the matching
+    prefix plus one token of its own, so a generation of n tokens over r rounds
+    accepted n - r drafted tokens.
+    """
+
+    def __init__(self, draft_model: LlamaDraftModel):
+        self.draft_model = draft_model
+        self.reset()
+
+    def reset(self):
+        self.rounds = 0
+        self.drafted = 0
+
+    def __call__(self, input_ids: npt.NDArray[np.intc], /, **kwargs) -> npt.NDArray[np.intc]:
+        draft = self.draft_model(input_ids, **kwargs)
+        self.rounds += 1
+        self.drafted += len(draft)
+        return draft
+
+    def stats(self, completion_tokens: int) -> dict:
+        accepted = max(0, min(self.drafted, completion_tokens - self.rounds))
+        return {
+            "draft_rounds": self.rounds,
+            "draft_tokens": self.drafted,
+            "draft_accepted": accepted,
+            "draft_acceptance_rate": accepted / self.drafted if self.drafted else 0.0
+        }
+
+
+def build_draft_model(mode: str, n_threads: int) -> Optional[CountingDraftModel]:
+    """Draft model for config.SPECULATIVE_DECODING, or None when speculation is off."""
+    if mode not in SPECULATIVE_MODES:
+        raise ValueError(f"Unknown speculative decoding mode '{mode}'. Choose one of {SPECULATIVE_MODES}.")
+    if mode == "off":
+        return None
+
+    if mode == "draft_model":
+        if os.path.exists(config.DRAFT_MODEL_PATH):
+            logging.info(f"Loading draft model from {config.DRAFT_MODEL_PATH}...")
+            return CountingDraftModel(GGUFDraftModel(config.DRAFT_MODEL_PATH, config.DRAFT_NUM_PRED_TOKENS, n_threads))
+        logging.warning(f"Draft model not found at {config.DRAFT_MODEL_PATH}. Using prompt lookup instead.")
+
+    # Drafts by matching the last n-gram against the prompt, which holds the retrieved context
+    return CountingDraftModel(LlamaPromptLookupDecoding(
+        max_ngram_size=config.PROMPT_LOOKUP_MAX_NGRAM,
+        num_pred_tokens=config.DRAFT_NUM_PRED_TOKENS
+    ))
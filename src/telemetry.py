@@ -0,0 +1,363 @@
+import os
+import sys
+import json
+import time
+import heapq
+import uuid
+import itertools
+import logging
+import threading
+import contextvars
+from collections import Counter
+from typing import Dict, Iterator, List, Optional, Tuple
+import config
+
+# Seconds; shared by every histogram
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+
+HELP = {
+    "requests_total": "Queries answered, by answer path",
+    "stage_seconds": "Time spent per pipeline stage (span)",
+    "request_seconds": "End-to-end time per query",
+    "tokens_total": "LLM tokens, by kind (prompt, prefix_reused, completion)",
+    "cache_requests_total": "Cache lookups, by cache and result (hit, miss)",
+    "queue_wait_seconds": "Time generation requests waited in the scheduler queue",
+}
+
+_current: contextvars.ContextVar[Optional["Span"]] = contextvars.ContextVar("telemetry_span", default=None)
+
+
+class Metrics:
+    """Thread-safe counters and histograms with Prometheus text exposition."""
+
+    def __init__(self, prefix: str = "ncert"):
+        self.prefix = prefix
+        self._lock = threading.Lock()
+        self._counters: Dict[Tuple[str, tuple], float] = {}
+        self._histograms: Dict[Tuple[str, tuple], list] = {}
+
+    def count(self, name: str, value: float = 1, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def observe(self, name: str, value: float, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            # Per-bucket counts, then sum and count
+            histogram = self._histograms.setdefault(key, [0] * len(BUCKETS) + [0.0, 0])
+            for i, bound in enumerate(BUCKETS):
+                if value <= bound:
+                    histogram[i] += 1
+                    break
+            histogram[-2] += value
+            histogram[-1] += 1
+
+    @staticmethod
+    def _labels(labels: tuple, **extra) -> str:
+        pairs = list(labels) + list(extra.items())
+        if not pairs:
+            return ""
+        escaped = (str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, v in pairs)
+        return "{" + ",".join(f'{k}="{v}"' for (k, _), v in zip(pairs, escaped)) + "}"
+
+    def exposition(self) -> str:
+        """All metrics in the Prometheus text format (version 0.0.4)."""
+        lines = []
+        with self._lock:
+            counters = sorted(self._counters.items())
+            histograms = sorted((key, list(values)) for key, values in self._histograms.items())
+
+        typed = set()
+        for (name, labels), value in counters:
+            metric = f"{self.prefix}_{name}"
+            if metric not in typed:
+                typed.add(metric)
+                lines += [f"# HELP {metric} {HELP.get(name, name)}", f"# TYPE {metric} counter"]
+            lines.append(f"{metric}{self._labels(labels)} {value:g}")
+        for (name, labels), values in histograms:
+            metric = f"{self.prefix}_{name}"
+            if metric not in typed:
+                typed.add(metric)
+                lines += [f"# HELP {metric} {HELP.get(name, name)}", f"# TYPE {metric} histogram"]
+            cumulative = 0
+            for bound, n in zip(BUCKETS, values):
+                cumulative += n
+                lines.append(f"{metric}_bucket{self._labels(labels, le=f'{bound:g}')} {cumulative}")
+            lines.append(f"{metric}_bucket{self._labels(labels, le='+Inf')} {values[-1]}")
+            lines.append(f"{metric}_sum{self._labels(labels)} {values[-2]:.6f}")
+            lines.append(f"{metric}_count{self._labels(labels)} {values[-1]}")
+        return "\n".join(lines) + "\n"
+
+
+class Trace:
+    """The spans of one request (one root span and everything opened under it, on any thread)."""
+
+    def __init__(self, name: str):
+        self.id = uuid.uuid4().hex[:16]
+        self.name = name
+        self.start = time.time()
+        self.spans: List["Span"] = []
+        self.threads = set()
+        self.samples: Counter = Counter()
+        self._ids = itertools.count(1)
+
+    def span_id(self) -> int:
+        return next(self._ids)
+
+    def to_dict(self, root: "Span") -> Dict:
+        return {
+            "trace_id": self.id,
+            "name": self.name,
+            "start": self.start,
+            "duration": root.duration,
+            "attrs": root.attrs,
+            "spans": [
+                {
+                    "id": span.id,
+                    "parent": span.parent.id if span.parent else None,
+                    "name": span.name,
+                    "offset": round(span.start - self.start, 6),
+                    "duration": round(span.duration, 6),
+                    **({"attrs": span.attrs} if span.attrs else {})
+                }
+                for span in sorted(self.spans, key=lambda s: s.start)
+            ]
+        }
+
+
+class Span:
+    """
+    A timed stage. Use as a context manager; spans opened inside it (in the same
+    context, or in a context copied from it, e.g. on a scheduler worker) become
+    its children. A span with no parent starts a new trace and finishes it on exit.
+    Never hold one open across a yield: use traced() for generators.
+    """
+
+    __slots__ = ("trace", "name", "id", "parent", "attrs", "start", "end", "_token")
+
+    def __init__(self, trace: Trace, name: str, parent: Optional["Span"], attrs: Dict):
+        self.trace = trace
+        self.name = name
+        self.id = trace.span_id()
+        self.parent = parent
+        self.attrs = attrs
+        self.start = self.end = None
+        self._token = None
+
+    @property
+    def duration(self) -> float:
+        return (self.end or time.time()) - self.start
+
+    def set(self, **attrs):
+        self.attrs.update(attrs)
+
+    def __enter__(self) -> "Span":
+        self.start = time.time()
+        self.trace.threads.add(threading.get_ident())
+        self._token = _current.set(self)
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is not None and exc_type is not GeneratorExit:
+            self.attrs["error"] = exc_type.__name__
+        _current.reset(self._token)
+        self.end = time.time()
+        _finish(self)
+
+
+class _NullSpan:
+    """Returned when telemetry is off: every operation is a no-op."""
+
+    __slots__ = ()
+
+    def set(self, **attrs):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        pass
+
+
+NULL_SPAN = _NullSpan()
+metrics = Metrics()
+_log_lock = threading.Lock()
+_profiler: Optional["SlowRequestProfiler"] = None
+
+
+def span(name: str, **attrs):
+    """Context manager timing `name` under the current span (or as a new trace)."""
+    if not config.TELEMETRY_ENABLED:
+        return NULL_SPAN
+    parent = _current.get()
+    trace = parent.trace if parent else Trace(name)
+    if parent is None and config.TELEMETRY_PROFILE_SLOWEST > 0:
+        _get_profiler().track(trace)
+    return Span(trace, name, parent, attrs)
+
+
+def traced(span, events: Iterator) -> Iterator:
+    """
+    Yields from the generator `events` as the body of `span`. The span is current
+    only while the generator runs, never while the consumer holds an event, so
+    spans the consumer opens between events do not nest under it. The span
+    finishes when the generator is exhausted, fails or is closed.
+    """
+    if span is NULL_SPAN:
+        yield from events
+        return
+    span.start = time.time()
+    error = None
+    try:
+        while True:
+            span.trace.threads.add(threading.get_ident())
+            token = _current.set(span)
+            try:
+                event = next(events)
+            except StopIteration:
+                return
+            except Exception as e:
+                error = type(e).__name__
+                raise
+            finally:
+                _current.reset(token)
+            yield event
+    finally:
+        # Closing runs the generator's cleanup, which may record stages under the span
+        token = _current.set(span)
+        try:
+            events.close()
+        finally:
+            _current.reset(token)
+        if error:
+            span.attrs["error"] = error
+        span.end = time.time()
+        _finish(span)
+
+
+def record(name: str, start: float, end: float, **attrs):
+    """Adds an already-measured stage (time.time() bounds) under the current span."""
+    if not config.TELEMETRY_ENABLED:
+        return
+    parent = _current.get()
+    if parent is None:
+        metrics.observe("stage_seconds", end - start, stage=name)
+        return
+    child = Span(parent.trace, name, parent, attrs)
+    child.start, child.end = start, end
+    _finish(child)
+
+
+def current():
+    """The innermost open span (a no-op stand-in when there is none or telemetry is off)."""
+    return (_current.get() if config.TELEMETRY_ENABLED else None) or NULL_SPAN
+
+
+def count(name: str, value: float = 1, **labels):
+    if config.TELEMETRY_ENABLED:
+        metrics.count(name, value, **labels)
+
+
+def observe(name: str, value: float, **labels):
+    if config.TELEMETRY_ENABLED:
+        metrics.observe(name, value, **labels)
+
+
+def _finish(span: Span):
+    trace = span.trace
+    trace.spans.append(span)
+    metrics.observe("stage_seconds", span.duration, stage=span.name)
+    if span.parent is not None:
+        return
+
+    metrics.observe("request_seconds", span.duration, root=span.name)
+    if _profiler:
+        _profiler.finish(trace, span.duration)
+    if config.TELEMETRY_TRACE_LOG:
+        line = json.dumps(trace.to_dict(span), ensure_ascii=False, default=str)
+        try:
+            with _log_lock:
+                with open(config.TELEMETRY_TRACE_LOG, "a", encoding="utf-8") as f:
+                    f.write(line + "\n")
+        except OSError as e:
+            logging.warning(f"Could not write trace log {config.TELEMETRY_TRACE_LOG}: {e}")
+
+
+def _collapse(frame) -> str:
+    """Stack of `frame` in the collapsed format of flamegraph.pl / speedscope (root first)."""
+    names = []
+    while frame is not None:
+        names.append(f"{frame.f_code.co_name} ({os.path.basename(frame.f_code.co_filename)})")
+        frame = frame.f_back
+    return ";".join(reversed(names))
+
+
+class SlowRequestProfiler:
+    """
+    Sampling profiler for the slowest requests. A background thread samples the
+    stacks of every thread a traced request is running on every `interval`
+    seconds; when the request finishes its samples are kept only if it is among
+    the `keep` slowest seen so far, written as collapsed stacks to
+    `<directory>/<duration>-<trace_id>.folded` (older profiles that drop out of
+    the top `keep` are deleted).
+    """
+
+    def __init__(self, keep: int, interval: float, directory: str):
+        self.keep = keep
+        self.interval = interval
+        self.directory = directory
+        self._active: Dict[str, Trace] = {}
+        self._slowest: List[Tuple[float, str, str]] = []
+        self._lock = threading.Lock()
+        threading.Thread(target=self._sample, name="telemetry-profiler", daemon=True).start()
+
+    def track(self, trace: Trace):
+        with self._lock:
+            self._active[trace.id] = trace
+
+    def _sample(self):
+        while True:
+            time.sleep(self.interval)
+            with self._lock:
+                if not self._active:
+                    continue
+                frames = sys._current_frames()
+                for trace in self._active.values():
+                    for thread_id in list(trace.threads):
+                        frame = frames.get(thread_id)
+                        if frame is not None:
+                            trace.samples[_collapse(frame)] += 1
+
+    def finish(self, trace: Trace, duration: float):
+        with self._lock:
+            self._active.pop(trace.id, None)
+            if not trace.samples or (len(self._slowest) >= self.keep and duration <= self._slowest[0][0]):
+                return
+            path = os.path.join(self.directory, f"{duration:09.3f}s-{trace.id}.folded")
+            try:
+                os.makedirs(self.directory, exist_ok=True)
+                with open(path, "w", encoding="utf-8") as f:
+                    f.writelines(f"{stack} {n}\n" for stack, n in trace.samples.items())
+            except OSError as e:
+                logging.warning(f"Could not write profile {path}: {e}")
+                return
+            heapq.heappush(self._slowest, (duration, trace.id, path))
+            if len(self._slowest) > self.keep:
+                _, _, dropped = heapq.heappop(self._slowest)
+                try:
+                    os.remove(dropped)
+                except OSError:
+                    pass
+
+
+def _get_profiler() -> SlowRequestProfiler:
+    """The profiler, started on the first traced request once TELEMETRY_PROFILE_SLOWEST is set."""
+    global _profiler
+    with _log_lock:
+        if _profiler is None:
+            _profiler = SlowRequestProfiler(
+                config.TELEMETRY_PROFILE_SLOWEST, config.TELEMETRY_PROFILE_INTERVAL, config.TELEMETRY_PROFILE_DIR
+            )
+    return _profiler
@@ -1,3 +1,6 @@
+import queue
+import threading
+from typing import Iterable, Iterator
 from langdetect import detect, DetectorFactory
 from langdetect.lang_detect_exception import LangDetectException
 
@@ -16,3 +19,53 @@ def detect_language(text: str) -> str:
         return detect(text)
     except LangDetectException:
         return 'en'
+
+
+class _StageError:
+    def __init__(self, error: BaseException):
+        self.error = error
+
+
+_STAGE_END = object()
+
+
+def bounded_stage(iterable: Iterable, maxsize: int) -> Iterator:
+    """
+    Runs `iterable` in a background thread and yields its items through a bounded
+    queue. The producer runs ahead of the consumer by at most `maxsize` items, so
+    chained stages overlap in time while memory stays fixed. Exceptions raised by
+    the producer are re-raised in the consumer.
+    """
+    handoff = queue.Queue(maxsize=maxsize)
+    stopped = threading.Event()
+
+    def put(item) -> bool:
+        while not stopped.is_set():
+            try:
+                handoff.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def produce():
+        try:
+            for item in iterable:
+                if not put(item):
+                    return
+            put(_STAGE_END)
+        except BaseException as e:
+            put(_StageError(e))
+
+    threading.Thread(target=produce, daemon=True).start()
+    try:
+        while True:
+            item = handoff.get()
+            if item is _STAGE_END:
+                return
+            if isinstance(item, _StageError):
+                raise item.error
+            yield item
+    finally:
+        # Unblocks the producer if the consumer stops early
+        stopped.set()
@@ -0,0 +1,21 @@
+import os
+import sys
+import pytest
+
+# Tests import `config` and `src.*` like the scripts in the project root do
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import config
+
+
+@pytest.fixture(autouse=True)
+def fake_backends(monkeypatch, tmp_path):
+    """Every test runs on the fake embedder and LLM, with caches under its own temp dir."""
+    monkeypatch.setattr(config, "EMBEDDING_BACKEND", "fake")
+    monkeypatch.setattr(config, "LLM_BACKEND", "fake")
+    monkeypatch.setattr(config, "TELEMETRY_ENABLED", False)
+    monkeypatch.setattr(config, "FAKE_LLM_PREFILL_MS", 0)
+    monkeypatch.setattr(config, "FAKE_LLM_DECODE_MS", 0)
+    monkeypatch.setattr(config, "EMBEDDING_CACHE_DIR", str(tmp_path / "embedding_cache"))
+    monkeypatch.setattr(config, "PROMPT_CACHE_DIR", str(tmp_path / "prompt_cache"))
+    monkeypatch.setattr(config, "ANSWER_CACHE_DIR", str(tmp_path / "answer_cache"))
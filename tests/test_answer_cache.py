@@ -0,0 +1,64 @@
+import os
+import config
+from langchain_core.documents import Document
+from src.answer_cache import AnswerCache, LOG_FILE
+from src.fake_backends import FakeEmbeddings
+
+DOCS = [Document(page_content="Light is a form of energy.", metadata={"source": "Class6_Science.pdf", "page": 4})]
+
+
+def cache():
+    return AnswerCache(FakeEmbeddings(), cache_dir=config.ANSWER_CACHE_DIR, threshold=0.99)
+
+
+def log_lines():
+    with open(os.path.join(config.ANSWER_CACHE_DIR, LOG_FILE), "rb") as f:
+        return f.read().splitlines()
+
+
+def test_answers_survive_a_restart():
+    first = cache()
+    first.put("What is light?", {"grade": "6"}, "en", "Light is energy.", DOCS)
+    first.put("What is sound?", {"grade": "6"}, "en", "Sound is a vibration.", DOCS)
+
+    second = cache()
+    hit = second.lookup("what  is light?", {"grade": "6"}, "en")
+    assert hit["hit"] == "exact" and hit["answer"] == "Light is energy."
+    assert hit["source_documents"][0].metadata["page"] == 4
+    assert second.lookup("What is light?", {"grade": "10"}, "en") is None
+    assert cache().entries[0]["hits"] == 1
+
+
+def test_puts_append_to_the_log():
+    answers = cache()
+    answers.put("What is light?", None, "en", "Light is energy.", DOCS)
+    answers.put("What is sound?", None, "en", "Sound is a vibration.", DOCS)
+    answers.lookup("What is sound?", None, "en")
+    assert len(log_lines()) == 3
+    # Re-answering a question supersedes its old line on replay
+    answers.put("What is light?", None, "en", "Light is radiant energy.", DOCS)
+    reloaded = cache()
+    assert [e["answer"] for e in reloaded.entries] == ["Sound is a vibration.", "Light is radiant energy."]
+    assert reloaded.vectors.shape == (2, config.FAKE_EMBEDDING_DIM)
+
+
+def test_torn_append_is_dropped():
+    answers = cache()
+    answers.put("What is light?", None, "en", "Light is energy.", DOCS)
+    answers.put("What is sound?", None, "en", "Sound is a vibration.", DOCS)
+    with open(os.path.join(config.ANSWER_CACHE_DIR, LOG_FILE), "ab") as f:
+        f.write(b'{"put": {"key": "trunc')
+
+    reloaded = cache()
+    assert len(reloaded.entries) == 2
+    assert len(log_lines()) == 2
+    reloaded.put("What is heat?", None, "en", "Heat is energy in transit.", DOCS)
+    assert len(cache().entries) == 3
+
+
+def test_settings_change_discards_the_cache(monkeypatch):
+    cache().put("What is light?", None, "en", "Light is energy.", DOCS)
+    monkeypatch.setattr(config, "CONTEXT_TOKEN_MARGIN", config.CONTEXT_TOKEN_MARGIN + 1)
+    answers = cache()
+    assert answers.entries == []
+    assert answers.lookup("What is light?", None, "en") is None
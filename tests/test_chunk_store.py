@@ -0,0 +1,52 @@
+import numpy as np
+import faiss
+from langchain_core.documents import Document
+from src.chunk_store import ChunkStore, MappedVectorStore, write_index
+
+ROWS = [
+    ("a1", Document(page_content="Cells are the basic unit of life.", metadata={"source": "Class8_Science.pdf", "page": 1})),
+    ("a2", Document(page_content="", metadata={"source": "Class8_Science.pdf", "page": 2})),
+    ("b1", Document(page_content="कोशिका जीवन की मूल इकाई है।", metadata={"source": "Class8_Vigyan.pdf", "page": 0, "language": "hi"})),
+]
+
+
+def test_round_trip(tmp_path):
+    ChunkStore.write(str(tmp_path), iter(ROWS))
+    assert ChunkStore.exists(str(tmp_path))
+    store = ChunkStore(str(tmp_path))
+    assert len(store) == 3
+    assert store.get(2) == ROWS[2][1]
+    assert store.get(1).page_content == ""
+    assert store.get_id(0) == "a1"
+    assert list(store) == ROWS
+    store.close()
+    assert len(store) == 0
+
+
+def test_rewrite_replaces_the_store(tmp_path):
+    ChunkStore.write(str(tmp_path), ROWS)
+    old = ChunkStore(str(tmp_path))
+    first = list(old)
+    old.close()
+    ChunkStore.write(str(tmp_path), first[1:])
+    assert [chunk_id for chunk_id, _ in ChunkStore(str(tmp_path))] == ["a2", "b1"]
+
+
+def test_empty_store(tmp_path):
+    ChunkStore.write(str(tmp_path), [])
+    store = ChunkStore(str(tmp_path))
+    assert len(store) == 0 and list(store) == []
+
+
+def test_vector_store_checks_row_counts(tmp_path):
+    index = faiss.IndexFlatL2(4)
+    index.add(np.eye(4, dtype=np.float32)[:3])
+    write_index(str(tmp_path), index)
+    assert MappedVectorStore.load(str(tmp_path)) is None  # no chunk store yet
+
+    ChunkStore.write(str(tmp_path), ROWS)
+    store = MappedVectorStore.load(str(tmp_path))
+    assert store.index.ntotal == 3 and store.doc(0) == ROWS[0][1]
+
+    ChunkStore.write(str(tmp_path), ROWS[:2])
+    assert MappedVectorStore.load(str(tmp_path)) is None
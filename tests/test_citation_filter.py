@@ -0,0 +1,38 @@
+import random
+import pytest
+from src.generation import CitationFilter, strip_citations
+
+ANSWERS = [
+    "Plants make food by **photosynthesis** (Source: Class7_Science, Page: 12). It needs sunlight [Page: 3].",
+    "  Ohm's law states that V = IR (Class10_Science.pdf, Page 4)\n\nThe current (I) is in amperes (A).",
+    "An open bracket (never closed\nis kept as it is.",
+    "Nothing to strip here.   ",
+    "प्रकाश संश्लेषण (Source: Class7_Vigyan, Page: 5) पत्तियों में होता है।",
+]
+
+
+def filtered(pieces):
+    citations = CitationFilter()
+    return "".join(citations.feed(piece) for piece in pieces) + citations.finish()
+
+
+@pytest.mark.parametrize("answer", ANSWERS)
+def test_one_character_at_a_time_matches_the_full_answer(answer):
+    assert filtered(list(answer)) == strip_citations(answer).strip()
+
+
+@pytest.mark.parametrize("answer", ANSWERS)
+def test_random_token_boundaries_match_the_full_answer(answer):
+    rng = random.Random(answer)
+    for _ in range(50):
+        cuts = sorted(rng.sample(range(1, len(answer)), min(8, len(answer) - 1)))
+        pieces = [answer[i:j] for i, j in zip([0] + cuts, cuts + [len(answer)])]
+        assert filtered(pieces) == strip_citations(answer).strip()
+
+
+def test_text_is_emitted_before_the_answer_ends():
+    citations = CitationFilter()
+    assert citations.feed("Light travels in straight lines") == "Light travels in straight lines"
+    assert citations.feed(" (Source: Class6") == ""
+    assert citations.feed("_Science, Page: 2).") == "."
+    assert citations.feed(" See (figure 3)") == " See (figure 3)"
@@ -0,0 +1,65 @@
+from langchain_core.documents import Document
+from src.context import format_context, pack_context
+
+
+def doc(text, page=1):
+    return Document(page_content=text, metadata={"source": "Class8_Science.pdf", "page": page})
+
+
+def count_words(text):
+    return len(text.split())
+
+
+def test_overlapping_neighbours_are_merged():
+    left = doc("Friction opposes the relative motion between two surfaces in contact with each other.")
+    right = doc("two surfaces in contact with each other. It depends on the nature of the surfaces.")
+    packed, report = pack_context([left, right], count_words, budget=1000)
+    assert [d.page_content for d in packed] == [
+        "Friction opposes the relative motion between two surfaces in contact with each other. "
+        "It depends on the nature of the surfaces."
+    ]
+    assert report["merged"] == 1 and report["chunks_out"] == 1
+
+
+def test_near_duplicates_are_dropped():
+    text = "Sound is produced by vibrating objects and needs a medium to travel through."
+    packed, report = pack_context([doc(text, page=2), doc(text + " Indeed.", page=9)], count_words, budget=1000)
+    assert packed == [doc(text, page=2)]
+    assert report["duplicates_dropped"] == 1
+
+
+def test_chunks_are_kept_in_rank_order_within_the_budget():
+    docs = [doc(f"Fact number {i} about the solar system and its planets.", page=i) for i in range(5)]
+    budget = count_words(format_context(docs[:3]))
+    packed, report = pack_context(docs, count_words, budget)
+    assert packed == docs[:3]
+    assert report["over_budget_dropped"] == 2
+    assert report["tokens_saved"] == report["tokens_before"] - report["tokens_after"] > 0
+
+
+def test_best_chunk_is_truncated_to_fit():
+    packed, _ = pack_context([doc("word " * 200)], count_words, budget=50)
+    assert len(packed) == 1 and count_words(format_context(packed)) <= 50
+
+
+def test_merged_chunks_keep_both_metadata():
+    left = Document(page_content="Friction opposes the relative motion between two surfaces in contact.",
+                    metadata={"source": "Class8_Science.pdf", "page": 1, "chapter": "Friction"})
+    right = Document(page_content="two surfaces in contact. It depends on the nature of the surfaces.",
+                     metadata={"source": "Class8_Science.pdf", "page": 1, "language": "en"})
+    packed, _ = pack_context([left, right], count_words, budget=1000)
+    assert packed[0].metadata == {"source": "Class8_Science.pdf", "page": 1, "chapter": "Friction", "language": "en"}
+
+
+def test_footer_cites_only_the_packed_chunks(monkeypatch):
+    import config
+    from src.generation import LocalLLMGenerator
+
+    monkeypatch.setattr(config, "PROMPT_PREFIX_CACHE", False)
+    text = "Sound is produced by vibrating objects and needs a medium to travel through."
+    docs = [doc(text, page=2), doc(text, page=9), doc("Echo is a reflected sound.", page=4)]
+    generator = LocalLLMGenerator(n_threads=1)
+    answer = generator.generate_answer("What is sound?", docs)
+    footer = answer.split("**Source:**")[1]
+    assert "Page: 2, 4" in footer and "9" not in footer
+    assert generator.last_docs == [docs[0], docs[2]]
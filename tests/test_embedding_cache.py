@@ -0,0 +1,84 @@
+import threading
+import numpy as np
+from src.embedding_cache import CachedEmbeddings, KEY_BYTES
+from src.fake_backends import FakeEmbeddings
+
+
+class CountingEmbeddings(FakeEmbeddings):
+    def __init__(self):
+        super().__init__()
+        self.calls = 0
+
+    def embed_documents(self, texts):
+        self.calls += 1
+        return super().embed_documents(texts)
+
+
+def test_misses_are_persisted_and_reloaded(tmp_path):
+    cache = CachedEmbeddings(FakeEmbeddings(), "model", cache_dir=str(tmp_path))
+    first = cache.embed_documents(["alpha", "beta", "alpha"])
+    assert cache.stats["misses"] == 2
+
+    base = CountingEmbeddings()
+    reloaded = CachedEmbeddings(base, "model", cache_dir=str(tmp_path))
+    assert reloaded.embed_documents(["beta", "alpha"]) == [first[1], first[0]]
+    assert base.calls == 0
+
+
+def test_reload_after_partial_append_keeps_rows_aligned(tmp_path):
+    cache = CachedEmbeddings(FakeEmbeddings(), "model", cache_dir=str(tmp_path))
+    cache.embed_documents(["alpha", "beta"])
+    # A crash mid-append: one extra vector plus a few bytes of it, and part of a key
+    with open(cache.vectors_path, "ab") as f:
+        f.write(b"\0" * (4 * cache._dim + 10))
+    with open(cache.keys_path, "ab") as f:
+        f.write(b"\1" * (KEY_BYTES // 2))
+
+    writer = CachedEmbeddings(FakeEmbeddings(), "model", cache_dir=str(tmp_path))
+    assert len(writer._row_index()) == 2
+    writer.embed_documents(["gamma"])
+
+    reader = CachedEmbeddings(CountingEmbeddings(), "model", cache_dir=str(tmp_path), read_only=True)
+    expected = FakeEmbeddings()
+    for text in ("alpha", "beta", "gamma"):
+        np.testing.assert_allclose(reader._lookup(reader.key(text)), expected.embed_query(text), rtol=1e-6)
+
+
+def test_read_only_reader_does_not_truncate(tmp_path):
+    cache = CachedEmbeddings(FakeEmbeddings(), "model", cache_dir=str(tmp_path))
+    cache.embed_documents(["alpha"])
+    with open(cache.keys_path, "ab") as f:
+        f.write(b"\1" * 3)
+    size = (tmp_path / "model" / "keys.bin").stat().st_size
+
+    reader = CachedEmbeddings(FakeEmbeddings(), "model", cache_dir=str(tmp_path), read_only=True)
+    assert len(reader._row_index()) == 1
+    assert (tmp_path / "model" / "keys.bin").stat().st_size == size
+
+
+def test_query_lru_and_concurrent_encodes(tmp_path):
+    cache = CachedEmbeddings(CountingEmbeddings(), "model", cache_dir=str(tmp_path), read_only=True, lru_size=2)
+    vector = cache.embed_query("what is a cell")
+    assert cache.embed_query("what  is a cell ") == vector
+    assert cache.stats == {"hits": 0, "misses": 0, "query_hits": 1, "query_misses": 1}
+
+    results = {}
+    threads = [threading.Thread(target=lambda i=i: results.setdefault(i, cache.embed_query(f"q{i}"))) for i in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert all(results[i] == FakeEmbeddings().embed_query(f"q{i}") for i in range(8))
+    assert len(cache._lru) == 2
+
+
+def test_query_only_reader_does_not_build_the_key_map(tmp_path):
+    CachedEmbeddings(FakeEmbeddings(), "model", cache_dir=str(tmp_path)).embed_documents(["alpha", "beta"])
+
+    base = CountingEmbeddings()
+    reader = CachedEmbeddings(base, "model", cache_dir=str(tmp_path), read_only=True)
+    reader.embed_query("what is a cell")
+    assert reader._rows is None
+
+    reader.embed_documents(["beta", "alpha"])
+    assert len(reader._rows) == 2 and base.calls == 1
@@ -0,0 +1,32 @@
+from langchain_core.documents import Document
+from src.extractive import definition_term, extractive_answer
+
+
+def doc(text):
+    return Document(page_content=text, metadata={"source": "Class10_Science.pdf", "page": 3})
+
+
+def test_definition_terms():
+    assert definition_term("What is meant by power?") == "power"
+    assert definition_term("State Ohm's law.") == "Ohm's law"
+    assert definition_term("Define power and its unit") == "power"
+    assert definition_term("What is the difference between mass and weight?") is None
+    assert definition_term("Why is the sky blue?") is None
+
+
+def test_answers_from_a_defining_sentence_in_the_top_chunk():
+    docs = [doc("Power is defined as the rate of doing work. Its SI unit is the watt. Engines differ in power.")]
+    result = extractive_answer("Define power", docs)
+    assert result["answer"].startswith("**Power** is defined as the rate of doing work. Its SI unit is the watt.")
+    assert result["term"] == "power"
+
+
+def test_plain_is_a_sentence_is_not_a_definition():
+    docs = [doc("Power is the reason the motor in the fan keeps turning on a hot day.")]
+    assert extractive_answer("What is power?", docs) is None
+
+
+def test_definitions_outside_the_top_chunks_are_ignored():
+    docs = [doc("Work and energy are related."), doc("Energy can be stored."),
+            doc("Power is defined as the rate of doing work.")]
+    assert extractive_answer("Define power", docs) is None
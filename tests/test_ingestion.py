@@ -0,0 +1,16 @@
+from langchain_core.documents import Document
+from src.ingestion import IngestionPipeline
+
+PAGES = [Document(page_content="Light travels in straight lines. " * 60, metadata={"source": "Class6_Science.pdf", "page": 0})]
+
+
+def test_chunk_ids_are_stable_and_unique_per_path():
+    pipeline = IngestionPipeline()
+    _, ids = pipeline.split_documents(PAGES, "Class6_Science.pdf", "ab" * 32)
+    _, again = pipeline.split_documents(PAGES, "Class6_Science.pdf", "ab" * 32)
+    _, mirror = pipeline.split_documents(PAGES, "mirror/Class6_Science.pdf", "ab" * 32)
+    _, changed = pipeline.split_documents(PAGES, "Class6_Science.pdf", "cd" * 32)
+    assert len(ids) > 1 and len(set(ids)) == len(ids)
+    assert ids == again
+    assert not set(ids) & set(mirror)
+    assert not set(ids) & set(changed)
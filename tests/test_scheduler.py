@@ -0,0 +1,84 @@
+import time
+import pytest
+import config
+from langchain_core.documents import Document
+from src.scheduler import GenerationScheduler, SchedulerBusy
+
+DOCS = [Document(page_content="Magnets attract iron. Like poles repel and unlike poles attract each other.",
+                 metadata={"source": "Class6_Science.pdf", "page": 7})]
+
+
+@pytest.fixture
+def scheduler(monkeypatch):
+    """One worker on the fake LLM, decoding a 40-token answer at 10 ms per token, with room for one queued request."""
+    monkeypatch.setattr(config, "FAKE_LLM_DECODE_MS", 10)
+    monkeypatch.setattr(config, "FAKE_LLM_ANSWER_TOKENS", 40)
+    monkeypatch.setattr(config, "PROMPT_PREFIX_CACHE", False)
+    return GenerationScheduler(workers=1, queue_size=1, n_threads=1)
+
+
+def wait_until(condition, timeout=5.0):
+    deadline = time.time() + timeout
+    while not condition():
+        assert time.time() < deadline, "timed out"
+        time.sleep(0.005)
+
+
+def test_completes_a_request(scheduler):
+    request = scheduler.submit("What do magnets attract?", DOCS)
+    answer = "".join(request.stream())
+    assert "Magnets attract iron" in answer and "**Source:**" in answer
+    assert request.stats["completion_tokens"] > 0 and not request.truncated
+    wait_until(lambda: scheduler.stats()["active"] == 0)
+    assert scheduler.stats()["completed"] == 1
+
+
+def test_rejects_when_the_queue_is_full(scheduler):
+    running = scheduler.submit("first", DOCS)
+    wait_until(lambda: running.started is not None)
+    queued = scheduler.submit("second", DOCS)
+    with pytest.raises(SchedulerBusy):
+        scheduler.submit("third", DOCS)
+    assert scheduler.stats()["rejected"] == 1
+    running.cancel()
+    queued.cancel()
+
+
+def test_fails_a_request_queued_past_its_deadline(scheduler):
+    running = scheduler.submit("first", DOCS)
+    wait_until(lambda: running.started is not None)
+    late = scheduler.submit("second", DOCS, timeout=0.05)
+    time.sleep(0.1)
+    running.cancel()
+    with pytest.raises(TimeoutError):
+        list(late.stream())
+    wait_until(lambda: scheduler.stats()["expired"] == 1)
+    assert late.stats == {}
+
+
+def test_cuts_off_a_generation_past_its_deadline(scheduler):
+    request = scheduler.submit("What do magnets attract?", DOCS, timeout=0.1)
+    list(request.stream())
+    assert request.truncated
+    wait_until(lambda: scheduler.stats()["expired"] == 1)
+
+
+def test_closing_the_stream_cancels_the_request(scheduler):
+    request = scheduler.submit("What do magnets attract?", DOCS)
+    stream = request.stream()
+    next(stream)
+    stream.close()
+    assert request.cancelled
+    wait_until(lambda: scheduler.stats()["cancelled"] == 1)
+    assert request.truncated
+
+
+def test_a_cancelled_queued_request_never_runs(scheduler):
+    running = scheduler.submit("first", DOCS)
+    wait_until(lambda: running.started is not None)
+    queued = scheduler.submit("second", DOCS)
+    queued.cancel()
+    running.cancel()
+    assert list(queued.stream()) == []
+    wait_until(lambda: scheduler.stats()["cancelled"] == 2)
+    assert queued.stats == {}
@@ -0,0 +1,55 @@
+import pytest
+from src.session import SessionStore, Turn, follow_up_kind
+
+
+def turn(n_tokens=0):
+    return Turn("Define power", "Define power", ["doc"], tokens=list(range(n_tokens)),
+                state={"input_ids": list(range(n_tokens))} if n_tokens else None)
+
+
+def test_follow_up_kinds():
+    assert follow_up_kind("Explain it more simply", "Define power") == "reuse"
+    assert follow_up_kind("Can you explain this again?", "Define power") == "reuse"
+    assert follow_up_kind("What about its unit?", "Define power") == "extend"
+    assert follow_up_kind("इसका उदाहरण दीजिए", "शक्ति क्या है") == "reuse"
+
+
+@pytest.mark.parametrize("query", [
+    "What is photosynthesis?",
+    "State Newton's first law and its significance",
+    "Why do leaves change their colour?",
+    "So what is mitosis?",
+    "And how do plants breathe?",
+    "But why is the sky blue?",
+    "What did he discover about gravity?",
+    "What about the structure of an atom and its nucleus?",
+])
+def test_self_contained_questions_are_not_follow_ups(query):
+    assert follow_up_kind(query, "Define power") is None
+
+
+def test_states_are_evicted_oldest_first_within_the_budget():
+    sessions = SessionStore(max_sessions=10, budget_bytes=8 * 250, ttl=60)
+    sessions.put("a", turn(100))
+    sessions.put("b", turn(100))
+    sessions.put("c", turn(100))
+    assert sessions.get("a").state is None and sessions.get("a").docs == ["doc"]
+    assert sessions.get("c").state is not None
+    assert sessions.state_total == 8 * 200
+    assert sessions.summary()["states_evicted"] == 1
+
+
+def test_state_over_the_whole_budget_is_not_kept():
+    sessions = SessionStore(max_sessions=10, budget_bytes=8 * 50, ttl=60)
+    sessions.put("a", turn(100))
+    assert sessions.get("a").state is None and sessions.state_total == 0
+
+
+def test_sessions_expire_and_are_capped():
+    sessions = SessionStore(max_sessions=2, budget_bytes=10**6, ttl=60)
+    for name in "abc":
+        sessions.put(name, turn(10))
+    assert sessions.get("a") is None and sessions.get("c") is not None
+    sessions.ttl = -1
+    assert sessions.get("c") is None
+    assert sessions.summary()["sessions_expired"] == 1
@@ -0,0 +1,44 @@
+import numpy as np
+from src.sparse_index import SparseIndex, reciprocal_rank_fusion, tokenize
+
+TEXTS = [
+    "Photosynthesis takes place in the leaves of green plants.",
+    "The heart pumps blood through the body.",
+    "Chlorophyll in the leaves absorbs light for photosynthesis. Photosynthesis makes food.",
+    "प्रकाश संश्लेषण पौधों की पत्तियों में होता है।",
+]
+
+
+def test_tokenize_keeps_hindi_words_whole():
+    assert tokenize("Left-Hand H2O") == ["left", "hand", "h2o"]
+    assert tokenize("प्रकाश संश्लेषण।") == ["प्रकाश", "संश्लेषण"]
+
+
+def test_search_ranks_by_bm25():
+    index = SparseIndex.build(iter(TEXTS))
+    assert index.ntotal == 4
+    results = index.search("photosynthesis leaves", top_k=3)
+    assert [row for row, _ in results] == [2, 0]
+    assert results[0][1] > results[1][1] > 0
+    assert index.search("प्रकाश", top_k=3)[0][0] == 3
+    assert index.search("unknown words", top_k=3) == []
+
+
+def test_search_within_candidates():
+    index = SparseIndex.build(TEXTS)
+    assert [row for row, _ in index.search("photosynthesis", 5, candidates=np.array([0, 1]))] == [0]
+    assert index.search("photosynthesis", 5, candidates=np.array([1, 3])) == []
+
+
+def test_save_and_load(tmp_path):
+    index = SparseIndex.build(TEXTS)
+    path = str(tmp_path / "sparse.npz")
+    index.save(path)
+    loaded = SparseIndex.load(path)
+    assert loaded.ntotal == index.ntotal
+    assert loaded.search("blood heart", 2) == index.search("blood heart", 2)
+    assert SparseIndex.load(str(tmp_path / "missing.npz")) is None
+
+
+def test_reciprocal_rank_fusion():
+    assert reciprocal_rank_fusion([[1, 2, 3], [3, 1]]) == [1, 3, 2]
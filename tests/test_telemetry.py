@@ -0,0 +1,64 @@
+import pytest
+import config
+from src import telemetry
+
+
+@pytest.fixture(autouse=True)
+def telemetry_on(monkeypatch):
+    monkeypatch.setattr(config, "TELEMETRY_ENABLED", True)
+    monkeypatch.setattr(config, "TELEMETRY_TRACE_LOG", None)
+    monkeypatch.setattr(config, "TELEMETRY_PROFILE_SLOWEST", 0)
+
+
+def events(n):
+    for i in range(n):
+        with telemetry.span("stage"):
+            pass
+        yield i
+
+
+def by_name(trace):
+    return {span.name: span for span in trace.spans}
+
+
+def test_traced_span_is_not_current_between_events():
+    with telemetry.span("request") as request:
+        query = telemetry.span("query")
+        for _ in telemetry.traced(query, events(2)):
+            assert telemetry.current() is request
+            with telemetry.span("render"):
+                pass
+        assert telemetry.current() is request
+
+    spans = by_name(request.trace)
+    assert spans["query"].parent is request
+    assert spans["render"].parent is request
+    assert all(span.parent is query for span in request.trace.spans if span.name == "stage")
+    assert query.end is not None and query.end <= request.end
+
+
+def test_closing_early_finishes_the_span():
+    query = telemetry.span("query")
+    stream = telemetry.traced(query, events(5))
+    assert next(stream) == 0
+    stream.close()
+    assert query.end is not None
+    assert telemetry.current() is telemetry.NULL_SPAN
+    assert query in query.trace.spans
+
+
+def test_errors_are_recorded_and_raised():
+    def failing():
+        yield 1
+        raise KeyError("missing")
+
+    query = telemetry.span("query")
+    with pytest.raises(KeyError):
+        list(telemetry.traced(query, failing()))
+    assert query.attrs["error"] == "KeyError"
+    assert telemetry.current() is telemetry.NULL_SPAN
+
+
+def test_disabled_telemetry_passes_events_through(monkeypatch):
+    monkeypatch.setattr(config, "TELEMETRY_ENABLED", False)
+    assert list(telemetry.traced(telemetry.span("query"), events(3))) == [0, 1, 2]